@@ -1,21 +1,91 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from .models import FoodItem, LogItem, Profile
+from .static.foodSearch import search_local_foods
 
 # Register your models here.
 
+# Below this many rows the planner's estimate is not worth using.
+ESTIMATE_COUNT_ABOVE = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips COUNT(*) on large unfiltered Postgres tables.
+
+    An unfiltered changelist counts the whole table on every page load,
+    which takes seconds at millions of rows. Postgres keeps a row
+    estimate in pg_class from its last ANALYZE; past
+    ESTIMATE_COUNT_ABOVE rows that is used instead. Filtered and
+    searched lists, and other databases, count as usual.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                               [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+            # reltuples is -1 until the table is first analyzed.
+            if row and row[0] > ESTIMATE_COUNT_ABOVE:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count on every request."""
+
+    paginator = EstimatedCountPaginator
+    # Filtered lists would otherwise count the whole table as well.
+    show_full_result_count = False
+
 
 @admin.register(FoodItem)
-class FoodItemAdmin(admin.ModelAdmin):
+class FoodItemAdmin(LargeTableAdmin):
     list_display = ('foodName', 'fdcId')
+    search_fields = ('foodName',)
+    search_help_text = 'An fdcId, or words from the food name.'
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search the FoodItem full-text index instead of foodName LIKE.
+
+        The default icontains search scans every row. search_local_foods()
+        uses the same index as the site's search; an all-digit term looks
+        up the unique fdcId. The matches are applied as a pk subquery:
+        combining the querysets with & would turn the FTS5 join into a
+        LEFT JOIN, where SQLite cannot use MATCH.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(fdcId=int(search_term)), False
+        return queryset.filter(pk__in=search_local_foods(search_term).values('pk')), False
 
 
 @admin.register(LogItem)
-class LogItemAdmin(admin.ModelAdmin):
-    list_display = ('profile', 'date')
+class LogItemAdmin(LargeTableAdmin):
+    list_display = ('profile', 'foodItem', 'date', 'percentConsumed')
+    # Profile.__str__ reads its user and foodItem is shown by name.
+    list_select_related = ('profile__user', 'foodItem')
+    # Select widgets would list every profile and food on the change form.
+    raw_id_fields = ('profile', 'foodItem')
+    date_hierarchy = 'date'  # logitem_date_idx
+    search_fields = ('profile__user__username__exact',)
+    search_help_text = 'Exact username.'
 
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
-    list_display = ('age', 'user',"id")
+class ProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'birthdate', 'height', 'weight', 'id')
-
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__username__exact',)
+    search_help_text = 'Exact username.'
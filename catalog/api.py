@@ -0,0 +1,344 @@
+"""
+Versioned JSON API used by the mobile client.
+
+Every endpoint uses the normal session login. Write requests need the
+CSRF token like any other form post. Log lists and summaries carry an
+ETag and Last-Modified taken from Profile.dataChangedAt, so a client
+revalidating an unchanged dashboard gets a 304 before any nutrient
+totals are computed.
+"""
+import hashlib
+import json
+from datetime import date, timedelta
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_http_methods
+
+from .forms import LogItemForm, MealEntryForm, save_meal
+from .models import FoodItem, LogItem
+from .static.foodSearch import food_fields
+from .static import dashboard_cache, metrics
+from .static.nutrient_functions import (
+    day_bounds,
+    decode_log_cursor,
+    get_dv_avg,
+    get_log_page,
+    nutrient_fields,
+)
+from .static.trends import get_trends
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+API_MAX_SUMMARY_DAYS = 366
+API_MAX_TREND_WINDOW = 90
+
+
+def api_error(message, status, **extra):
+    return JsonResponse({"error": message, **extra}, status=status)
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 instead of redirecting."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return api_error("Authentication required.", 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def food_json(foodItem):
+    data = {"fdcId": foodItem.fdcId}
+    data.update({field: getattr(foodItem, field) for field in food_fields})
+    return data
+
+
+def log_item_json(logItem):
+    return {
+        "id": logItem.id,
+        "date": logItem.date.isoformat(),
+        "percentConsumed": logItem.percentConsumed,
+        "food": food_json(logItem.foodItem),
+    }
+
+
+def parse_day(value, default=None):
+    """Parse a YYYY-MM-DD query parameter; raises ValueError if malformed."""
+    return date.fromisoformat(value) if value else default
+
+
+def summary_window(request):
+    """
+    Resolve the inclusive [start, end] days of a summary request.
+
+    Defaults to the 7 days ending today. Raises ValueError for a
+    malformed or reversed window, one longer than API_MAX_SUMMARY_DAYS,
+    or one whose day bounds would fall outside date.min/date.max.
+    """
+    today = timezone.localdate()
+    end = parse_day(request.GET.get("end"), today)
+    # day_bounds(end) needs the day after end.
+    if end == date.max:
+        raise ValueError("Bad summary window.")
+    start = parse_day(request.GET.get("start"))
+    if start is None:
+        if (end - date.min).days < 6:
+            raise ValueError("Bad summary window.")
+        start = end - timedelta(days=6)
+    if start > end or (end - start).days >= API_MAX_SUMMARY_DAYS:
+        raise ValueError("Bad summary window.")
+    return start, end
+
+
+def profile_etag(request, *args, **kwargs):
+    """
+    ETag for anything derived from the profile's logs and targets.
+
+    The request's query string is folded in so each window or page has
+    its own tag; "today" is too, so a defaulted window expires at midnight.
+    """
+    profile = request.user.profile
+    version = profile.dataChangedAt.isoformat() if profile.dataChangedAt else ""
+    key = f"{profile.id}|{version}|{request.get_full_path()}|{timezone.localdate()}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def profile_last_modified(request, *args, **kwargs):
+    """
+    Last-Modified for the same responses as profile_etag().
+
+    Never earlier than today's midnight, so a client revalidating with
+    If-Modified-Since alone still sees a window that rolled over a day.
+    """
+    midnight = day_bounds(timezone.localdate())[0]
+    changed = request.user.profile.dataChangedAt
+    return max(changed, midnight) if changed else midnight
+
+
+conditional_on_profile = condition(etag_func=profile_etag, last_modified_func=profile_last_modified)
+
+
+def read_json(request):
+    """Decode a JSON object request body; raises ValueError otherwise."""
+    data = json.loads(request.body or b"{}")
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object.")
+    return data
+
+
+@api_login_required
+@require_http_methods(["GET", "POST"])
+def log_items(request):
+    if request.method == "POST":
+        return create_log_item(request)
+    return list_log_items(request)
+
+
+@conditional_on_profile
+def list_log_items(request):
+    """
+    Newest-first log history, keyset paginated like the edit page.
+
+    Query parameters: start and end days (inclusive), cursor, limit.
+    """
+    try:
+        startDay = parse_day(request.GET.get("start"))
+        endDay = parse_day(request.GET.get("end"))
+        limit = min(int(request.GET.get("limit", API_PAGE_SIZE)), API_MAX_PAGE_SIZE)
+        cursor = request.GET.get("cursor")
+        if cursor:
+            decode_log_cursor(cursor)
+        start = day_bounds(startDay)[0] if startDay else None
+        end = day_bounds(endDay)[1] if endDay else None
+    except (ValueError, OverflowError):
+        # OverflowError: ?end=9999-12-31 has no following midnight.
+        return api_error("Invalid start, end, cursor or limit.", 400)
+    if limit < 1:
+        return api_error("Invalid start, end, cursor or limit.", 400)
+
+    items, nextCursor = get_log_page(
+        request.user.profile.id,
+        start=start,
+        end=end,
+        cursor=cursor,
+        limit=limit,
+    )
+    nextUrl = None
+    if nextCursor:
+        params = request.GET.copy()
+        params["cursor"] = nextCursor
+        nextUrl = f"{reverse('api_log_items')}?{urlencode(sorted(params.items()))}"
+
+    return JsonResponse({"results": [log_item_json(item) for item in items], "next": nextUrl})
+
+
+def create_log_item(request):
+    """Log a stored FoodItem: {"fdcId": ..., "date": ..., "percentConsumed": ...}."""
+    try:
+        data = read_json(request)
+    except ValueError:
+        return api_error("Request body must be a JSON object.", 400)
+
+    # Same rules as a log_meal entry, so a non-integer fdcId is a 400.
+    form = MealEntryForm({"fdcId": data.get("fdcId"), "date": data.get("date"),
+                          "percentConsumed": data.get("percentConsumed", 1)})
+    if form.is_valid():
+        foodItem = FoodItem.objects.filter(fdcId=form.cleaned_data["fdcId"]).first()
+        if foodItem is None:
+            form.add_error("fdcId", "No food with this fdcId.")
+    if not form.is_valid():
+        return api_error("Invalid log item.", 400, errors=form.errors.get_json_data())
+
+    logItem = form.save(commit=False)
+    logItem.profile = request.user.profile
+    logItem.foodItem = foodItem
+    logItem.save()
+    metrics.log_items_created.inc(via="api")
+    return JsonResponse(log_item_json(logItem), status=201)
+
+
+@api_login_required
+@require_http_methods(["POST"])
+def log_meal(request):
+    """
+    Log several foods at once: {"entries": [{"fdcId", "date", "percentConsumed"}, ...]}.
+
+    All entries are saved or none are; on a 400 "errors" lines up with
+    "entries", holding {} for the entries that were valid.
+    """
+    try:
+        entries = read_json(request).get("entries")
+    except ValueError:
+        return api_error("Request body must be a JSON object.", 400)
+    if not isinstance(entries, list):
+        return api_error("entries must be a list.", 400)
+
+    logItems, errors = save_meal(request.user.profile, entries)
+    if errors:
+        return api_error("Invalid entries.", 400, errors=errors)
+    return JsonResponse({"results": [log_item_json(item) for item in logItems]}, status=201)
+
+
+@api_login_required
+@require_http_methods(["GET", "PATCH", "DELETE"])
+def log_item(request, log_id):
+    logItem = (
+        LogItem.objects.select_related("foodItem")
+        .filter(id=log_id, profile=request.user.profile)
+        .first()
+    )
+    if logItem is None:
+        return api_error("Log item not found.", 404)
+
+    if request.method == "DELETE":
+        logItem.delete()
+        return HttpResponse(status=204)
+
+    if request.method == "PATCH":
+        try:
+            data = read_json(request)
+        except ValueError:
+            return api_error("Request body must be a JSON object.", 400)
+        form = LogItemForm({
+            "date": data.get("date", logItem.date),
+            "percentConsumed": data.get("percentConsumed", logItem.percentConsumed),
+        }, instance=logItem)
+        if not form.is_valid():
+            return api_error("Invalid log item.", 400, errors=form.errors.get_json_data())
+        logItem = form.save()
+
+    return JsonResponse(log_item_json(logItem))
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def food(request, fdcId):
+    foodItem = FoodItem.objects.filter(fdcId=fdcId).first()
+    if foodItem is None:
+        return api_error("Food not found.", 404)
+    return JsonResponse(food_json(foodItem))
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def gauges(request):
+    """
+    The dashboard's gauge payload: ranges once, then each window's
+    values in nutrient order. Not conditional, since the windows
+    slide with the clock.
+    """
+    return JsonResponse(dashboard_cache.get_gauges(request.user.profile))
+
+
+@api_login_required
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """Hit counts of the per-profile dashboard cache; staff only."""
+    if not request.user.is_staff:
+        return api_error("Staff only.", 403)
+    return JsonResponse({"dashboard": dashboard_cache.cache_stats()})
+
+
+@api_login_required
+@require_http_methods(["GET"])
+@conditional_on_profile
+def summary(request):
+    """
+    Daily average of each nutrient over a window of whole days, with
+    the profile's targets; the same numbers the dashboard gauges show.
+
+    Query parameters: start and end days (inclusive).
+    """
+    try:
+        startDay, endDay = summary_window(request)
+    except ValueError:
+        return api_error("Invalid start or end.", 400)
+
+    start = day_bounds(startDay)[0]
+    end = day_bounds(endDay)[1]
+    return JsonResponse({
+        "start": startDay.isoformat(),
+        "end": endDay.isoformat(),
+        "nutrients": get_dv_avg(start, end, request.user.profile.id),
+    })
+
+
+@api_login_required
+@require_http_methods(["GET"])
+@conditional_on_profile
+def trends(request):
+    """
+    Per-day totals, rolling averages, percent of target and in-range
+    streaks for each nutrient over a window of whole days.
+
+    Query parameters: start and end days (inclusive), window (days per
+    rolling average, default 7) and nutrients (comma separated, default
+    all).
+    """
+    try:
+        startDay, endDay = summary_window(request)
+    except ValueError:
+        return api_error("Invalid start or end.", 400)
+    try:
+        window = int(request.GET.get("window", 7))
+    except ValueError:
+        window = 0
+    if not 1 <= window <= API_MAX_TREND_WINDOW:
+        return api_error(f"window must be between 1 and {API_MAX_TREND_WINDOW}.", 400)
+    fields = nutrient_fields
+    if request.GET.get("nutrients"):
+        fields = request.GET["nutrients"].split(",")
+        unknown = [field for field in fields if field not in nutrient_fields]
+        if unknown:
+            return api_error("Unknown nutrients.", 400, nutrients=unknown)
+
+    return JsonResponse({
+        "start": startDay.isoformat(),
+        "end": endDay.isoformat(),
+        "window": window,
+        **get_trends(request.user.profile, startDay, endDay, window, fields),
+    })
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        # Keep DailyNutrientTotal in step with LogItem writes
+        from . import signals  # noqa: F401
+        # Register the background job handlers
+        from . import tasks  # noqa: F401
+        # pg_trgm's % operator for the search fallback. Registered once
+        # here: register_lookup() swaps a shared registry and is not
+        # safe to call while other threads run queries.
+        from django.db import connection
+        if connection.vendor == 'postgresql':
+            from django.contrib.postgres.lookups import TrigramSimilar
+            from .models import FoodItem
+            FoodItem._meta.get_field('foodName').register_lookup(TrigramSimilar)
+        # Count every query towards the Server-Timing "db" span
+        from django.db.backends.signals import connection_created
+        from .static.timing import install_query_timer
+        connection_created.connect(install_query_timer, dispatch_uid='catalog.install_query_timer')
@@ -1,6 +1,10 @@
 from django import forms
-from .models import LogItem, Profile
+from django.db import transaction
+from .models import FoodItem, LogImport, LogItem, Profile
+from .static import metrics
+from .static.nutrient_functions import forget_personal_ranges, log_day, refresh_daily_totals
 from datetime import datetime
+from django.utils import timezone
 
 
 class PercentConsumedForm(forms.ModelForm):
@@ -54,6 +58,84 @@ class LogItemForm(forms.ModelForm):
         return cleaned_data  
 
 
+class MealEntryForm(LogItemForm):
+    """One entry of a batch log: a LogItemForm naming its food by fdcId."""
+    fdcId = forms.IntegerField(min_value=1)
+
+    class Meta(LogItemForm.Meta):
+        fields = ['fdcId', 'date', 'percentConsumed']
+
+
+MAX_MEAL_ENTRIES = 100
+
+
+def save_meal(profile, entries):
+    """
+    Validate and log a list of foods for one profile in one transaction.
+
+    Every entry is checked with MealEntryForm, so the rules match a
+    single save_logItem post. The foods are loaded with one fdcId__in
+    query and the LogItems written with one bulk_create(). bulk_create
+    skips the rollup signals, so each touched day is refreshed here.
+
+    Args:
+        profile (Profile): Profile to log for.
+        entries (list): Dicts with fdcId, date and percentConsumed.
+
+    Returns:
+        Tuple: (list of created LogItems, None) when every entry is
+        valid, else ([], list of per-entry error dicts, {} for valid
+        entries). Nothing is saved unless all entries are valid.
+    """
+    if not entries or len(entries) > MAX_MEAL_ENTRIES:
+        return [], [{"__all__": [f"Send between 1 and {MAX_MEAL_ENTRIES} entries."]}]
+
+    entryForms = [
+        MealEntryForm({'percentConsumed': 1, **entry} if isinstance(entry, dict) else {})
+        for entry in entries
+    ]
+    fdcIds = {form.cleaned_data['fdcId'] for form in entryForms if form.is_valid()}
+    foods = FoodItem.objects.in_bulk(fdcIds, field_name='fdcId')
+
+    errors = []
+    for form in entryForms:
+        if form.is_valid() and form.cleaned_data['fdcId'] not in foods:
+            form.add_error('fdcId', 'No food with this fdcId.')
+        errors.append(form.errors.get_json_data())
+    if any(errors):
+        return [], errors
+
+    logItems = [
+        LogItem(
+            profile=profile,
+            foodItem=foods[form.cleaned_data['fdcId']],
+            date=form.cleaned_data['date'],
+            percentConsumed=form.cleaned_data['percentConsumed'],
+        )
+        for form in entryForms
+    ]
+    with transaction.atomic():
+        LogItem.objects.bulk_create(logItems)
+        refresh_daily_totals(profile.id, {log_day(logItem.date) for logItem in logItems})
+    metrics.log_items_created.inc(len(logItems), via="meal")
+    return logItems, None
+
+
+class LogImportForm(forms.ModelForm):
+    class Meta:
+        model = LogImport
+        fields = ['upload']
+        widgets = {
+            'upload': forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+        }
+
+    def clean_upload(self):
+        upload = self.cleaned_data['upload']
+        if not upload.name.lower().endswith('.csv'):
+            raise forms.ValidationError("Upload a .csv file.")
+        return upload
+
+
 class SignUpForm(forms.Form):
     email = forms.EmailField(max_length=254, required=True,
                              widget=forms.EmailInput(attrs={'class': 'form-control'}))
@@ -100,4 +182,11 @@ class ProfileForm(forms.ModelForm):
             'weight': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.1'}),
             'gender': forms.Select(attrs={'class': 'form-select'}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+    def save(self, commit=True):
+        # New targets change every dashboard, so expire the API ETags too.
+        self.instance.dataChangedAt = timezone.now()
+        profile = super().save(commit=commit)
+        forget_personal_ranges(profile.id)
+        return profile
@@ -0,0 +1,266 @@
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.static import metrics, synthetic_data
+from catalog.static.benchmarking import percentile, scratch_database
+from catalog.static.fdc_client import reset_client
+
+BENCH_PREFIX = 'bench_journeys_'
+ENDPOINTS = ['index', 'search', 'save_logItem', 'edit']
+QUERIES = ['chicken', 'grilled chicken', 'organic yogurt', 'spicy tuna', 'pasta', 'apple', 'whole bread',
+           'smoked salmon', 'rice', 'xyzzy']
+
+
+class StubFDCServer:
+    """
+    FoodData Central stand-in answering /foods/search from the synthetic
+    catalog, after `latency` seconds, so searches never leave the machine.
+    """
+
+    def __init__(self, foods, latency):
+        self.foods = foods
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlsplit(self.path).query).get('query', [''])[0]
+                time.sleep(latency)
+                payload = json.dumps(synthetic_data.fdc_search_payload(stub.search(query))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def search(self, query):
+        """Up to 30 catalog foods whose name contains every query word."""
+        words = query.lower().split()
+        return [food for food in self.foods if all(word in food.foodName.lower() for word in words)][:30]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def summarize(samples, seconds):
+    """Request count, throughput and latency percentiles of (ms, ok) samples."""
+    latencies = [ms for ms, ok in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(not ok for ms, ok in samples),
+        'perSecond': round(len(samples) / seconds, 2),
+        'meanMs': round(statistics.fmean(latencies), 2),
+        'p50Ms': round(percentile(latencies, 50), 2),
+        'p95Ms': round(percentile(latencies, 95), 2),
+        'p99Ms': round(percentile(latencies, 99), 2),
+        'maxMs': round(max(latencies), 2),
+    }
+
+
+class Command(BaseCommand):
+    """
+    Django command to load test the main user journey offline.
+
+    Seeds synthetic users with years of log history (synthetic_data.seed),
+    points FDC_API_URL at a local stub serving the same food catalog, and
+    has --concurrency virtual users each run --journeys journeys of:
+    dashboard (index), a search, logging a food from the results
+    (save_logItem) and the log history (edit). Requests go through the
+    full middleware stack with the test Client, one thread and database
+    connection per user.
+
+    Prints per-endpoint throughput and p50/p95/p99 latency as JSON;
+    pass an earlier report as --baseline to see the change. Runs on a
+    scratch copy of the database (benchmarking.scratch_database), never
+    the configured one; the search cache and METRICS_DIR point at
+    temporary directories during the run.
+    """
+
+    help = 'Run concurrent user journeys against synthetic data and report latency per endpoint as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--foods', type=int, default=500)
+        parser.add_argument('--days', type=int, default=730, help='Days of log history per user.')
+        parser.add_argument('--items-per-day', type=int, default=4)
+        parser.add_argument('--concurrency', type=int, default=4, help='Virtual users running at once.')
+        parser.add_argument('--journeys', type=int, default=25, help='Journeys per virtual user.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed journeys before the run.')
+        parser.add_argument('--fdc-latency', type=float, default=50, help='Stub FDC response delay in ms.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+        parser.add_argument('--baseline', help='Earlier JSON report to compare against.')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the scratch database and its rows afterwards.')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['concurrency'], options['journeys']) < 1:
+            raise CommandError('--users, --concurrency and --journeys must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        with scratch_database(keep=options['keep']):
+            self.stderr.write(f"Using scratch database {connection.settings_dict['NAME']}.")
+            data, seedSeconds, report = self.benchmark(options)
+
+        report['config'] = {
+            'users': options['users'], 'foods': options['foods'], 'days': options['days'],
+            'itemsPerDay': options['items_per_day'], 'concurrency': options['concurrency'],
+            'journeys': options['journeys'], 'warmup': options['warmup'],
+            'fdcLatencyMs': options['fdc_latency'], 'seed': options['seed'],
+            'database': connection.vendor, 'debug': settings.DEBUG,
+        }
+        report['data'] = {'users': len(data.profiles), 'foodItems': len(data.foods),
+                          'logItems': data.logItems, 'seedSeconds': round(seedSeconds, 2)}
+        text = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        self.print_summary(report, baseline)
+
+    def benchmark(self, options):
+        synthetic_data.cleanup(BENCH_PREFIX)
+        started = time.perf_counter()
+        data = synthetic_data.seed(
+            random.Random(options['seed']), BENCH_PREFIX, users=options['users'], foods=options['foods'],
+            days=options['days'], itemsPerDay=options['items_per_day'],
+        )
+        seedSeconds = time.perf_counter() - started
+        stub = StubFDCServer(data.foods, options['fdc_latency'] / 1000)
+        metricsDir = tempfile.TemporaryDirectory()
+        cacheDir = tempfile.TemporaryDirectory()
+        overrides = override_settings(
+            FDC_API_URL=stub.url,
+            FOOD_SEARCH_LOCAL=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            METRICS_DIR=metricsDir.name,
+            CACHES={**settings.CACHES, settings.SEARCH_CACHE_ALIAS: {
+                **settings.CACHES[settings.SEARCH_CACHE_ALIAS], 'LOCATION': cacheDir.name,
+            }},
+        )
+        overrides.enable()
+        reset_client()
+        try:
+            report = self.run(data, stub, options)
+            metrics.reset()
+        finally:
+            reset_client()
+            overrides.disable()
+            stub.close()
+            metricsDir.cleanup()
+            cacheDir.cleanup()
+        return data, seedSeconds, report
+
+    def run(self, data, stub, options):
+        profiles = data.profiles
+        rng = random.Random(options['seed'])
+        warmup = []
+        for i in range(options['warmup']):
+            self.run_user(profiles[i % len(profiles)], stub, rng, 1, warmup)
+
+        # Each virtual user has its own profile (while there are enough)
+        # and its own seeded random choices.
+        users = [(profiles[i % len(profiles)], random.Random(f"{options['seed']}:{i}"))
+                 for i in range(options['concurrency'])]
+        samples = [[] for _ in users]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(users)) as pool:
+            for future in [
+                pool.submit(self.run_user, profile, stub, userRng, options['journeys'], userSamples)
+                for (profile, userRng), userSamples in zip(users, samples)
+            ]:
+                future.result()
+        seconds = time.perf_counter() - started
+
+        byEndpoint = {endpoint: [] for endpoint in [*ENDPOINTS, 'journey']}
+        errors = {}
+        for endpoint, ms, error in (sample for userSamples in samples for sample in userSamples):
+            byEndpoint[endpoint].append((ms, error is None))
+            if error is not None and endpoint != 'journey':
+                errors.setdefault(endpoint, error)
+        journeys = byEndpoint.pop('journey')
+        return {
+            'seconds': round(seconds, 3),
+            'journeys': summarize(journeys, seconds),
+            'endpoints': {endpoint: summarize(endpointSamples, seconds)
+                          for endpoint, endpointSamples in byEndpoint.items()},
+            'firstErrors': errors,
+        }
+
+    def run_user(self, profile, stub, rng, journeys, samples):
+        """Run one virtual user's journeys, appending (endpoint, ms, error) samples."""
+        client = Client()
+        client.force_login(profile.user)
+        try:
+            for _ in range(journeys):
+                started = time.perf_counter()
+                ok = self.journey(client, stub, rng, samples)
+                samples.append(('journey', (time.perf_counter() - started) * 1000, None if ok else 'failed step'))
+        finally:
+            client.logout()
+            connections.close_all()
+
+    def journey(self, client, stub, rng, samples):
+        query = rng.choice(QUERIES)
+        # Log one of the foods on the first results page, as a user would.
+        food = rng.choice(stub.search(query)[:6] or stub.foods)
+        logged = {'date': (timezone.localtime() - timedelta(minutes=rng.randrange(60))).strftime('%Y-%m-%d %H:%M:%S'),
+                  'percentConsumed': rng.choice([0.5, 1, 1.5, 2])}
+        steps = [
+            ('index', 200, lambda: client.get(reverse('index'))),
+            ('search', 200, lambda: client.get(reverse('search'), {'q': query})),
+            ('save_logItem', 302, lambda: client.post(reverse('save_logItem', args=[food.fdcId]), logged)),
+            ('edit', 200, lambda: client.get(reverse('edit'))),
+        ]
+        ok = True
+        for endpoint, expected, request in steps:
+            started = time.perf_counter()
+            try:
+                status = request().status_code
+                error = None if status == expected else f'HTTP {status}, expected {expected}'
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            samples.append((endpoint, (time.perf_counter() - started) * 1000, error))
+            ok = ok and error is None
+        return ok
+
+    def print_summary(self, report, baseline):
+        self.stderr.write(f"{report['journeys']['requests']} journeys in {report['seconds']} s, "
+                          f"{report['journeys']['perSecond']}/s")
+        self.stderr.write(f"{'endpoint':<14}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for endpoint, stats in report['endpoints'].items():
+            line = (f"{endpoint:<14}{stats['perSecond']:>8}{stats['p50Ms']:>9}{stats['p95Ms']:>9}"
+                    f"{stats['p99Ms']:>9}{stats['errors']:>8}")
+            before = (baseline or {}).get('endpoints', {}).get(endpoint)
+            if before:
+                line += '   p50 {:+.0%}  p95 {:+.0%}'.format(stats['p50Ms'] / before['p50Ms'] - 1,
+                                                          stats['p95Ms'] / before['p95Ms'] - 1)
+            self.stderr.write(line)
+        for endpoint, error in report['firstErrors'].items():
+            self.stderr.write(self.style.ERROR(f'{endpoint}: {error}'))
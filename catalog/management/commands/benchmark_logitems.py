@@ -0,0 +1,123 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from catalog.models import FoodItem, LogItem, Profile
+from catalog.static.benchmarking import percentile, scratch_database
+from catalog.static.nutrient_functions import get_nutrient_totals
+
+BENCH_PREFIX = 'bench_'
+INDEX_NAME = 'logitem_profile_date_idx'
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark the LogItem read paths.
+
+    Seeds N users with M log items each, then times the queries behind
+    get_dv_avg, get_log_items and the edit view with the
+    (profile, date) index dropped and again with it in place. Runs on a
+    scratch copy of the database (benchmarking.scratch_database), never
+    the configured one.
+    """
+
+    help = 'Seed synthetic LogItems and report EXPLAIN plans and latency with and without the (profile, date) index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--items', type=int, default=2000, help='Log items per user.')
+        parser.add_argument('--repeat', type=int, default=50, help='Timed runs per query.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the scratch database and its rows afterwards.')
+
+    def handle(self, *args, **options):
+        with scratch_database(keep=options['keep']):
+            self.stdout.write(f"Using scratch database {connection.settings_dict['NAME']}.")
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        self.cleanup()
+        profiles = self.seed(rng, options['users'], options['items'])
+        try:
+            index = next(i for i in LogItem._meta.indexes if i.name == INDEX_NAME)
+            with connection.schema_editor() as editor:
+                editor.remove_index(LogItem, index)
+            try:
+                self.report('without index', rng, profiles, options['repeat'])
+            finally:
+                with connection.schema_editor() as editor:
+                    editor.add_index(LogItem, index)
+            self.report('with index', rng, profiles, options['repeat'])
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+    def seed(self, rng, users, items):
+        now = timezone.now()
+        with transaction.atomic():
+            FoodItem.objects.bulk_create([
+                FoodItem(foodName=f'{BENCH_PREFIX}food {i}', calories=rng.uniform(0, 800),
+                         protein=rng.uniform(0, 40), fat=rng.uniform(0, 40))
+                for i in range(200)
+            ])
+            foods = list(FoodItem.objects.filter(foodName__startswith=BENCH_PREFIX))
+            User.objects.bulk_create([
+                User(username=f'{BENCH_PREFIX}{i}', password='!') for i in range(users)
+            ])
+            Profile.objects.bulk_create([
+                Profile(user=user, age=30, height=175, weight=75)
+                for user in User.objects.filter(username__startswith=BENCH_PREFIX)
+            ])
+            profiles = list(Profile.objects.filter(user__username__startswith=BENCH_PREFIX))
+            for profile in profiles:
+                LogItem.objects.bulk_create([
+                    LogItem(profile=profile, foodItem=rng.choice(foods),
+                            percentConsumed=rng.choice([0.5, 1, 1.5, 2]),
+                            date=now - timedelta(minutes=rng.randrange(0, 3 * 365 * 24 * 60)))
+                    for _ in range(items)
+                ], batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {LogItem._meta.db_table}')
+        self.stdout.write(f'Seeded {len(profiles)} users x {items} log items.')
+        return profiles
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+        FoodItem.objects.filter(foodName__startswith=BENCH_PREFIX, fdcId=None).delete()
+
+    def queries(self, profile):
+        now = timezone.now()
+        logQuery = LogItem.objects.filter(profile=profile)
+        return {
+            'weekly totals': lambda: get_nutrient_totals(
+                logQuery.filter(date__gte=now - timedelta(days=7), date__lte=now)),
+            'edit history': lambda: list(
+                logQuery.filter(date__gte=now - timedelta(days=730),
+                                date__lte=now + timedelta(days=730)).order_by('-date')),
+        }
+
+    def explain(self, profile):
+        now = timezone.now()
+        logQuery = LogItem.objects.filter(profile=profile, date__gte=now - timedelta(days=7), date__lte=now)
+        return logQuery.explain()
+
+    def report(self, label, rng, profiles, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {label} =='))
+        self.stdout.write(self.explain(profiles[0]))
+        timings = {}
+        for _ in range(repeat):
+            for name, query in self.queries(rng.choice(profiles)).items():
+                started = time.perf_counter()
+                query()
+                timings.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        for name, samples in timings.items():
+            self.stdout.write(
+                f'{name:<14} p50 {percentile(samples, 50):8.2f} ms   p99 {percentile(samples, 99):8.2f} ms'
+            )
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+
+from catalog.models import FoodItem
+from catalog.static.benchmarking import percentile, scratch_database
+from catalog.static.foodSearch import search_local_foods
+
+BENCH_PREFIX = 'bench_'
+BRANDS = ['Acme', 'Farmhouse', 'Golden', 'Harvest', 'Kirkland', 'Nature', 'Ocean', 'Prairie', 'Sunny', 'Valley']
+ADJECTIVES = ['baked', 'breaded', 'creamy', 'crunchy', 'dried', 'frozen', 'grilled', 'honey', 'light',
+              'organic', 'roasted', 'salted', 'smoked', 'spicy', 'sweet', 'whole']
+FOODS = ['almonds', 'apple', 'bagel', 'banana', 'beans', 'bread', 'broccoli', 'burrito', 'cereal', 'cheese',
+         'chicken', 'chips', 'cookies', 'crackers', 'granola', 'ham', 'lasagna', 'milk', 'noodles', 'oatmeal',
+         'pasta', 'peanut', 'pizza', 'potato', 'rice', 'salmon', 'sausage', 'soup', 'spinach', 'tofu',
+         'tomato', 'tuna', 'turkey', 'waffles', 'yogurt']
+QUERIES = ['chicken', 'chick', 'grilled chicken', 'org yog', 'spicy tuna', 'acme ham', 'pizza', 'xyzzy']
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark search_local_foods() on a large catalog.
+
+    Seeds synthetic FoodItems (500k by default) and times the first
+    search results page, i.e. the COUNT plus LIMIT/OFFSET queries the
+    search view issues. Runs on a scratch copy of the database
+    (benchmarking.scratch_database), never the configured one.
+    """
+
+    help = 'Seed synthetic FoodItems and report local search latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--foods', type=int, default=500_000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the scratch database and its rows afterwards.')
+
+    def handle(self, *args, **options):
+        with scratch_database(keep=options['keep']):
+            self.stdout.write(f"Using scratch database {connection.settings_dict['NAME']}.")
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        rng = random.Random(options['seed'])
+        self.cleanup()
+        self.seed(rng, options['foods'])
+        try:
+            self.stdout.write(f'{connection.vendor}, {FoodItem.objects.count()} food rows')
+            for query in QUERIES:
+                samples = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    page = Paginator(search_local_foods(query), 6).get_page(1)
+                    list(page.object_list)
+                    samples.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'{query!r:<18} {page.paginator.count:>7} hits   '
+                    f'p50 {percentile(samples, 50):8.2f} ms   p99 {percentile(samples, 99):8.2f} ms'
+                )
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+    def seed(self, rng, count):
+        batch = []
+        with transaction.atomic():
+            for i in range(count):
+                name = f'{BENCH_PREFIX}{rng.choice(BRANDS)}: {rng.choice(ADJECTIVES)} {rng.choice(FOODS)} {i}'
+                batch.append(FoodItem(foodName=name, calories=rng.uniform(0, 800)))
+                if len(batch) >= 5000:
+                    FoodItem.objects.bulk_create(batch)
+                    batch = []
+            FoodItem.objects.bulk_create(batch)
+        self.stdout.write(f'Seeded {count} food rows.')
+
+    def cleanup(self):
+        FoodItem.objects.filter(foodName__startswith=BENCH_PREFIX, fdcId=None).delete()
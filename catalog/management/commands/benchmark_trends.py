@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.models import FoodItem, LogItem, Profile
+from catalog.static.nutrient_functions import day_bounds, get_dv_avg, log_day, nutrient_fields, refresh_daily_totals
+from catalog.static.trends import day_range, get_trends
+
+BENCH_PREFIX = 'bench_trends_'
+
+
+class Command(BaseCommand):
+    """
+    Django command to benchmark a year of nutrient trends.
+
+    For each size, seeds one profile with that many LogItems spread
+    over two years and times three ways of building 365 daily totals:
+    get_dv_avg() once per day, pulling every LogItem row with its food's
+    nutrients and bucketing in Python (the input a NumPy array would
+    need), and get_trends() over DailyNutrientTotal. Everything runs in
+    one transaction that is rolled back.
+
+    SQLite, --repeat 5, median:
+        log items  get_dv_avg/day   LogItem rows   get_trends
+        10k             2862 ms         51 ms         15 ms
+        100k            2343 ms        584 ms         15 ms
+        1M              4155 ms       5765 ms         14 ms
+    """
+
+    help = 'Time 365-day nutrient trends at several LogItem volumes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--days', type=int, default=730, help='Days the log items are spread over.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{'log items':>10} {'get_dv_avg/day':>15} {'LogItem rows':>13} {'get_trends':>11}")
+        with transaction.atomic():
+            foods = FoodItem.objects.bulk_create([
+                FoodItem(foodName=f'{BENCH_PREFIX}food {i}',
+                         **{field: rng.uniform(0, 100) for field in nutrient_fields})
+                for i in range(200)
+            ])
+            for size in options['sizes']:
+                profile = self.seed(rng, foods, size, options['days'])
+                timings = self.measure(profile, options['repeat'])
+                self.stdout.write(f'{size:>10} ' + ' '.join(
+                    f'{statistics.median(samples):{width}.0f} ms'
+                    for samples, width in zip(timings, (12, 10, 8))
+                ))
+            transaction.set_rollback(True)
+
+    def seed(self, rng, foods, size, days):
+        user = User.objects.create(username=f'{BENCH_PREFIX}{size}', password='!')
+        profile = Profile.objects.create(user=user, age=30, height=175, weight=75)
+        now = timezone.now()
+        minutes = days * 24 * 60
+        for offset in range(0, size, 10_000):
+            LogItem.objects.bulk_create([
+                LogItem(profile=profile, foodItem=rng.choice(foods),
+                        percentConsumed=rng.choice([0.5, 1, 1.5, 2]),
+                        date=now - timedelta(minutes=rng.randrange(0, minutes)))
+                for _ in range(min(10_000, size - offset))
+            ])
+        refresh_daily_totals(profile.id, day_range(log_day(now) - timedelta(days=days), log_day(now)))
+        return profile
+
+    def measure(self, profile, repeat):
+        endDay = timezone.localdate()
+        startDay = endDay - timedelta(days=364)
+        start = day_bounds(startDay)[0]
+        end = day_bounds(endDay)[1]
+
+        def per_day():
+            return [get_dv_avg(*day_bounds(day), profile.id) for day in day_range(startDay, endDay)]
+
+        def log_rows():
+            totals = {}
+            rows = LogItem.objects.filter(profile=profile, date__gte=start, date__lt=end).values_list(
+                'date', 'percentConsumed', *(f'foodItem__{field}' for field in nutrient_fields)
+            )
+            for date, percent, *values in rows.iterator(chunk_size=10_000):
+                dayTotals = totals.setdefault(log_day(date), [0.0] * len(nutrient_fields))
+                for i, value in enumerate(values):
+                    dayTotals[i] += value * percent
+            return totals
+
+        def trends():
+            return get_trends(profile, startDay, endDay)
+
+        timings = ([], [], [])
+        for _ in range(repeat):
+            for samples, run in zip(timings, (per_day, log_rows, trends)):
+                started = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - started) * 1000)
+        return timings
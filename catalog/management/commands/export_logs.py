@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.static.log_export import EXPORT_FORMATS, encode_export, export_rows
+from catalog.static.nutrient_functions import day_bounds
+
+
+class Command(BaseCommand):
+    """Django command to stream LogItems with their nutrients to a file."""
+
+    help = 'Export LogItems joined with FoodItem nutrients as CSV or NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', type=int, action='append', dest='profiles',
+                            help='Only export this profile id (repeatable).')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--start', help='First day to export, YYYY-MM-DD.')
+        parser.add_argument('--end', help='Last day to export, YYYY-MM-DD (inclusive).')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            start = day_bounds(date.fromisoformat(options['start']))[0] if options['start'] else None
+            end = day_bounds(date.fromisoformat(options['end']))[1] if options['end'] else None
+        except (ValueError, OverflowError) as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        rows = export_rows(options['profiles'], start, end, chunk_size=options['chunk_size'])
+        chunks = encode_export(rows, options['format'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                out.writelines(chunks)
+            self.stderr.write(self.style.SUCCESS(f"Exported to {options['output']}."))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,184 @@
+import csv
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.models import FoodItem
+from catalog.static.foodSearch import (
+    is_calories,
+    json_food_item,
+    nutrient_names,
+    upsert_food_items,
+)
+
+
+def open_text(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Yield the items of the first JSON array in a stream one at a time.
+
+    FDC ships each dataset as {"BrandedFoods": [...]} (or FoundationFoods,
+    SRLegacyFoods, ...). Only the item being decoded is held in memory,
+    so multi-gigabyte dumps load in constant space.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while '[' not in buffer:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+    buffer = buffer[buffer.index('[') + 1:]
+
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,')
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                if buffer:
+                    raise
+                return
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+class Command(BaseCommand):
+    """
+    Django command to load a FoodData Central bulk download into FoodItem.
+
+    Accepts either a JSON dump (optionally .gz) or the directory of an
+    unzipped CSV download (food.csv, nutrient.csv, food_nutrient.csv and
+    optionally food_category.csv). Rows are streamed and written in
+    batches, each in its own transaction, and progress is checkpointed
+    after every batch so an interrupted import resumes where it stopped.
+    """
+
+    help = 'Import a FoodData Central bulk JSON/CSV download into the local FoodItem mirror.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='FDC .json/.json.gz file or unzipped CSV directory.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: <source>.checkpoint).')
+        parser.add_argument('--restart', action='store_true', help='Ignore any existing checkpoint.')
+
+    def handle(self, *args, **options):
+        source = Path(options['source'])
+        if not source.exists():
+            raise CommandError(f'{source} does not exist.')
+        self.source = str(source.resolve())
+        self.batch_size = options['batch_size']
+        self.checkpoint_path = Path(options['checkpoint'] or f'{source.resolve()}.checkpoint')
+        self.checkpoint = {} if options['restart'] else self.load_checkpoint()
+        self.totals = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+
+        if source.is_dir():
+            self.import_csv(source)
+        else:
+            with open_text(source) as stream:
+                self.run_phase('json', (json_food_item(item) for item in iter_json_array(stream)),
+                               upsert_food_items)
+
+        self.checkpoint_path.unlink(missing_ok=True)
+        self.stdout.write(self.style.SUCCESS(
+            'Imported FDC foods: {inserted} inserted, {updated} updated, {unchanged} unchanged.'.format(**self.totals)
+        ))
+
+    def load_checkpoint(self):
+        if not self.checkpoint_path.exists():
+            return {}
+        checkpoint = json.loads(self.checkpoint_path.read_text())
+        if checkpoint.get('source') != self.source:
+            raise CommandError(f'{self.checkpoint_path} belongs to another import; use --restart.')
+        self.stdout.write(f"Resuming from checkpoint: {checkpoint['done']}")
+        return checkpoint
+
+    def save_checkpoint(self, done):
+        self.checkpoint = {'source': self.source, 'done': done}
+        temp = self.checkpoint_path.with_suffix('.tmp')
+        temp.write_text(json.dumps(self.checkpoint))
+        os.replace(temp, self.checkpoint_path)
+
+    def run_phase(self, phase, records, write_batch):
+        """Stream records through write_batch() in checkpointed batches."""
+        done = self.checkpoint.get('done', {})
+        skip = done.get(phase, 0)
+        count = 0
+        batch = []
+
+        def flush():
+            stats = write_batch(batch)
+            for key in self.totals:
+                self.totals[key] += stats.get(key, 0)
+            self.save_checkpoint({**done, phase: count})
+            self.stdout.write(f'{phase}: {count} records')
+            batch.clear()
+
+        for record in records:
+            count += 1
+            if count <= skip:
+                continue
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                flush()
+        if batch:
+            flush()
+
+    def import_csv(self, directory):
+        with open_text(directory / 'nutrient.csv') as stream:
+            fields = {
+                row['id']: nutrient_names[row['name']]
+                for row in csv.DictReader(stream)
+                if row['name'] in nutrient_names and is_calories(row['name'], row.get('unit_name'))
+            }
+        categories = {}
+        if (directory / 'food_category.csv').exists():
+            with open_text(directory / 'food_category.csv') as stream:
+                categories = {row['id']: row['description'] for row in csv.DictReader(stream)}
+
+        # Names first: creates the rows and keeps existing nutrients.
+        def foods():
+            with open_text(directory / 'food.csv') as stream:
+                for row in csv.DictReader(stream):
+                    category = categories.get(row.get('food_category_id'))
+                    foodName = f"{category}: {row['description']}" if category else row['description']
+                    yield FoodItem(foodName=foodName[:255], fdcId=int(row['fdc_id']))
+        self.run_phase('food.csv', foods(), self.write_names)
+
+        # Then nutrient amounts, grouped per food as they stream past.
+        def amounts():
+            with open_text(directory / 'food_nutrient.csv') as stream:
+                for row in csv.DictReader(stream):
+                    field = fields.get(row['nutrient_id'])
+                    if field and row.get('amount'):
+                        yield int(row['fdc_id']), field, float(row['amount'])
+        self.run_phase('food_nutrient.csv', amounts(), self.write_amounts)
+
+    def write_names(self, batch):
+        existing = set(FoodItem.objects.filter(fdcId__in=[food.fdcId for food in batch])
+                       .values_list('fdcId', flat=True))
+        FoodItem.objects.bulk_create(batch, update_conflicts=True, unique_fields=['fdcId'],
+                                     update_fields=['foodName'])
+        return {'inserted': len(batch) - len(existing)}
+
+    def write_amounts(self, batch):
+        foods = {food.fdcId: food
+                 for food in FoodItem.objects.filter(fdcId__in={fdcId for fdcId, _, _ in batch})}
+        for fdcId, field, amount in batch:
+            if fdcId in foods:
+                setattr(foods[fdcId], field, amount)
+        stats = upsert_food_items(list(foods.values()))
+        return {'updated': stats['updated']}
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from catalog.models import DailyNutrientTotal, LogItem
+from catalog.static.nutrient_functions import nutrient_fields, nutrient_sums
+
+
+class Command(BaseCommand):
+    """Django command to backfill or verify the DailyNutrientTotal rollups."""
+
+    help = 'Rebuild DailyNutrientTotal rows from LogItem, or report drift with --check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', type=int, action='append', dest='profiles',
+                            help='Only rebuild this profile id (repeatable).')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare the rollups against LogItem without writing.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def expected_totals(self, profiles):
+        logQuery = LogItem.objects.all()
+        if profiles:
+            logQuery = logQuery.filter(profile_id__in=profiles)
+        return (
+            logQuery
+            .annotate(day=TruncDate('date', tzinfo=timezone.get_default_timezone()))
+            .values('profile_id', 'day')
+            .annotate(**nutrient_sums())
+            .order_by('profile_id', 'day')
+            .iterator(chunk_size=2000)
+        )
+
+    def handle(self, *args, **options):
+        profiles = options['profiles']
+        rollups = DailyNutrientTotal.objects.all()
+        if profiles:
+            rollups = rollups.filter(profile_id__in=profiles)
+
+        if options['check']:
+            self.check_rollups(rollups, profiles)
+        else:
+            self.rebuild(rollups, profiles, options['batch_size'])
+
+    def rebuild(self, rollups, profiles, batch_size):
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in self.expected_totals(profiles):
+                batch.append(DailyNutrientTotal(**row))
+                if len(batch) >= batch_size:
+                    DailyNutrientTotal.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            DailyNutrientTotal.objects.bulk_create(batch)
+            created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} daily rollup rows.'))
+
+    def check_rollups(self, rollups, profiles):
+        stored = {
+            (row['profile_id'], row['day']): row
+            for row in rollups.values('profile_id', 'day', *nutrient_fields)
+        }
+        missing = stale = 0
+        for row in self.expected_totals(profiles):
+            current = stored.pop((row['profile_id'], row['day']), None)
+            if current is None:
+                missing += 1
+            elif any(abs(current[field] - row[field]) > 1e-6 * max(1, abs(row[field]))
+                     for field in nutrient_fields):
+                stale += 1
+        orphaned = len(stored)
+
+        if missing or stale or orphaned:
+            raise CommandError(
+                f'Rollups out of date: {missing} missing, {stale} stale, {orphaned} orphaned.'
+            )
+        self.stdout.write(self.style.SUCCESS('Rollups are consistent.'))
@@ -0,0 +1,86 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from catalog.static.jobs import claim_jobs, extend_leases, purge_jobs, run_job
+
+
+class Command(BaseCommand):
+    """
+    Django command to run queued Jobs until stopped.
+
+    Runs up to --concurrency jobs at once on worker threads. Leases of
+    running jobs are renewed every third of --lease seconds, so only a
+    worker that has died loses its jobs to another. SIGINT/SIGTERM stop
+    claiming and let running jobs finish. Start as many of these as you
+    like, on any number of hosts; they coordinate through the Job table.
+    """
+
+    help = 'Run background jobs from the Job table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2)
+        parser.add_argument('--lease', type=int, default=None,
+                            help='Seconds a claimed job is reserved (default JOB_LEASE_SECONDS).')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no job is due instead of polling.')
+
+    def handle(self, *args, **options):
+        self.workerId = f'{socket.gethostname()}:{os.getpid()}'
+        self.lease = options['lease'] or settings.JOB_LEASE_SECONDS
+        self.stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        self.stdout.write(f'Worker {self.workerId} running {options["concurrency"]} at a time.')
+        running = {}
+        lastRenewal = lastPurge = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency'], thread_name_prefix='job') as pool:
+            while not self.stopping.is_set():
+                free = options['concurrency'] - len(running)
+                claimed = claim_jobs(self.workerId, free, self.lease) if free else []
+                for job in claimed:
+                    running[pool.submit(self.run, job)] = job
+
+                if not running:
+                    if options['once']:
+                        break
+                    self.stopping.wait(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    self.stdout.write(f'{job.name}#{job.id}: {future.result()}')
+
+                now = time.monotonic()
+                if now - lastRenewal >= self.lease / 3:
+                    extend_leases(self.workerId, [job.id for job in running.values()], self.lease)
+                    lastRenewal = now
+                if now - lastPurge >= 3600:
+                    purge_jobs()
+                    lastPurge = now
+
+            for future in running:
+                job = running[future]
+                self.stdout.write(f'{job.name}#{job.id}: {future.result()}')
+
+    def run(self, job):
+        close_old_connections()
+        try:
+            return run_job(job)
+        finally:
+            close_old_connections()
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the running jobs finish.')
+        self.stopping.set()
@@ -0,0 +1,125 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .static import metrics
+from .static.timing import end_request, start_request
+
+logger = logging.getLogger("catalog.timing")
+
+# Server-Timing metric names and their descriptions, in header order.
+timing_names = {
+    "db": "Database",
+    "fdc": "FoodData Central",
+    "agg": "Nutrient math",
+    "render": "Templates",
+}
+
+
+class ServerTimingMiddleware:
+    """
+    Time a sample of requests and report where the time went.
+
+    SERVER_TIMING_SAMPLE_RATE of requests (0 to 1) are timed. For
+    those, the total and the time spent in database queries, FDC calls,
+    nutrient aggregation and template rendering are sent in a
+    Server-Timing header (when SERVER_TIMING_HEADER is on) and logged as
+    one JSON line on the catalog.timing logger. Unsampled requests pay
+    one random() call. Spans can overlap: "agg" includes its queries.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        token = start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            timer = end_request(token)
+        self.report(request, response, timer)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        token = start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timer = end_request(token)
+        self.report(request, response, timer)
+        return response
+
+    def sampled(self):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate >= 1 or random.random() < rate
+
+    def report(self, request, response, timer):
+        total = timer.elapsed() * 1000
+        spans = {name: (seconds * 1000, count) for name, (seconds, count) in timer.spans.items()}
+        if settings.SERVER_TIMING_HEADER:
+            metrics = [
+                f'{name};dur={spans[name][0]:.1f};desc="{desc} ({spans[name][1]})"'
+                for name, desc in timing_names.items() if name in spans
+            ]
+            metrics.append(f'total;dur={total:.1f}')
+            response["Server-Timing"] = ", ".join(metrics)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total, 1),
+            **{f"{name}_ms": round(ms, 1) for name, (ms, count) in spans.items()},
+            **{f"{name}_count": count for name, (ms, count) in spans.items()},
+        }))
+
+
+class MetricsMiddleware:
+    """
+    Count every request and time it, labelled by URL name, for /metrics.
+
+    Requests that match no URL are labelled "unmatched" so that
+    scanners probing random paths cannot blow up the label set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started)
+        return response
+
+    def record(self, request, response, started):
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        metrics.http_request_seconds.observe(time.perf_counter() - started, view=view)
+        metrics.http_requests.inc(view=view, method=request.method, status=response.status_code)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0005_alter_fooditem_foodname'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyNutrientTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('fat', models.FloatField(default=0)),
+                ('saturatedFat', models.FloatField(default=0)),
+                ('transFat', models.FloatField(default=0)),
+                ('cholesterol', models.FloatField(default=0)),
+                ('sodium', models.FloatField(default=0)),
+                ('carbohydrates', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('sugars', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('calcium', models.FloatField(default=0)),
+                ('iron', models.FloatField(default=0)),
+                ('potassium', models.FloatField(default=0)),
+                ('magnesium', models.FloatField(default=0)),
+                ('phosphorus', models.FloatField(default=0)),
+                ('zinc', models.FloatField(default=0)),
+                ('calories', models.FloatField(default=0)),
+                ('vitaminC', models.FloatField(default=0)),
+                ('vitaminD', models.FloatField(default=0)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'day'), name='unique_profile_day_total')],
+            },
+        ),
+    ]
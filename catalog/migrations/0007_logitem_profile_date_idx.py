@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_dailynutrienttotal'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logitem',
+            index=models.Index(fields=['profile', 'date'], include=('foodItem', 'percentConsumed'), name='logitem_profile_date_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# Full-text index on FoodItem.foodName, used by search_local_foods().
+#
+# Postgres: a GIN index over the same SearchVector expression the query
+# uses, plus a pg_trgm GIN index for the fuzzy fallback.
+# SQLite: an external-content FTS5 table kept in sync by triggers. Note
+# that SQLite drops triggers when a migration rebuilds catalog_fooditem,
+# so any later AlterField on FoodItem must recreate them.
+
+SQLITE_FORWARD = [
+    'CREATE VIRTUAL TABLE catalog_fooditem_fts USING fts5('
+    '"foodName", content="catalog_fooditem", content_rowid="id")',
+    'CREATE TRIGGER catalog_fooditem_fts_ai AFTER INSERT ON catalog_fooditem BEGIN '
+    'INSERT INTO catalog_fooditem_fts(rowid, "foodName") VALUES (new.id, new."foodName"); END',
+    'CREATE TRIGGER catalog_fooditem_fts_ad AFTER DELETE ON catalog_fooditem BEGIN '
+    'INSERT INTO catalog_fooditem_fts(catalog_fooditem_fts, rowid, "foodName") '
+    'VALUES (\'delete\', old.id, old."foodName"); END',
+    'CREATE TRIGGER catalog_fooditem_fts_au AFTER UPDATE OF "foodName" ON catalog_fooditem BEGIN '
+    'INSERT INTO catalog_fooditem_fts(catalog_fooditem_fts, rowid, "foodName") '
+    'VALUES (\'delete\', old.id, old."foodName"); '
+    'INSERT INTO catalog_fooditem_fts(rowid, "foodName") VALUES (new.id, new."foodName"); END',
+    "INSERT INTO catalog_fooditem_fts(catalog_fooditem_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    'DROP TRIGGER IF EXISTS catalog_fooditem_fts_ai',
+    'DROP TRIGGER IF EXISTS catalog_fooditem_fts_ad',
+    'DROP TRIGGER IF EXISTS catalog_fooditem_fts_au',
+    'DROP TABLE IF EXISTS catalog_fooditem_fts',
+]
+
+
+def postgres_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(SearchVector('foodName', config='english'), name='fooditem_name_search_idx'),
+        GinIndex(fields=['foodName'], opclasses=['gin_trgm_ops'], name='fooditem_name_trgm_idx'),
+    ]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        FoodItem = apps.get_model('catalog', 'FoodItem')
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for index in postgres_indexes():
+            schema_editor.add_index(FoodItem, index)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_FORWARD:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        FoodItem = apps.get_model('catalog', 'FoodItem')
+        for index in postgres_indexes():
+            schema_editor.remove_index(FoodItem, index)
+    elif vendor == 'sqlite':
+        for statement in SQLITE_REVERSE:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_logitem_profile_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
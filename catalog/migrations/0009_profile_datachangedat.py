@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_fooditem_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='dataChangedAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_profile_datachangedat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload', models.FileField(upload_to='log_imports/')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('totalBytes', models.PositiveBigIntegerField(default=0)),
+                ('bytesRead', models.PositiveBigIntegerField(default=0)),
+                ('rowsRead', models.PositiveIntegerField(default=0)),
+                ('rowsImported', models.PositiveIntegerField(default=0)),
+                ('rowsSkipped', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, default=list)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('finishedAt', models.DateTimeField(blank=True, null=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='catalog.profile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_logimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='refreshedAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('kwargs', models.JSONField(blank=True, default=dict)),
+                ('key', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('runAt', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('maxAttempts', models.PositiveIntegerField(default=3)),
+                ('workerId', models.CharField(blank=True, max_length=100)),
+                ('leasedUntil', models.DateTimeField(blank=True, null=True)),
+                ('lastError', models.TextField(blank=True)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('finishedAt', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'runAt'], name='job_status_runat_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('key',), name='unique_pending_job_key')],
+            },
+        ),
+    ]
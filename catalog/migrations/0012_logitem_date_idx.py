@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_job'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logitem',
+            index=models.Index(fields=['date'], name='logitem_date_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:09
+
+import catalog.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0012_logitem_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoodItemSearch',
+            fields=[
+                ('foodItem', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='fts', serialize=False, to='catalog.fooditem')),
+                ('foodName', catalog.models.FullTextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'catalog_fooditem_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -20,6 +20,8 @@ class Profile(models.Model):
         ('O', 'Other'),
     )
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES, null=True, blank=True)
+    # Last time this profile's logs or targets changed; drives API ETags.
+    dataChangedAt = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.user.username
@@ -47,11 +49,45 @@ class FoodItem(models.Model):
     calories = models.FloatField(default=0)
     vitaminC = models.FloatField(default=0)
     vitaminD = models.FloatField(default=0)
+    # Set when the refresh_food job last re-read this food from FDC.
+    refreshedAt = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.foodName
 
 
+class FullTextMatch(models.Lookup):
+    """<column> MATCH <query> against an SQLite FTS5 table."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhsParams = self.process_lhs(compiler, connection)
+        rhs, rhsParams = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhsParams, *rhsParams]
+
+
+class FullTextField(models.TextField):
+    """A column of an FTS5 table, filterable with __match."""
+
+
+FullTextField.register_lookup(FullTextMatch)
+
+
+class FoodItemSearch(models.Model):
+    # The SQLite FTS5 index over FoodItem.foodName built by migration
+    # 0008; search_local_foods() joins it as FoodItem.fts. The table
+    # does not exist on Postgres, which indexes foodName directly.
+    foodItem = models.OneToOneField(FoodItem, primary_key=True, db_column='rowid',
+                                    on_delete=models.DO_NOTHING, related_name='fts')
+    foodName = FullTextField()
+    # bm25 score of the query's MATCH; lower ranks first.
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'catalog_fooditem_fts'
+
+
 class LogItem(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     date = models.DateTimeField(auto_now=False, auto_now_add=False)
@@ -59,5 +95,128 @@ class LogItem(models.Model):
     # I assume use a float from 0 to 1
     percentConsumed = models.FloatField(default=1)
 
+    class Meta:
+        indexes = [
+            # Every read path filters on profile plus a date range. On
+            # Postgres the included columns let the nutrient aggregate
+            # join FoodItem without visiting the LogItem heap.
+            models.Index(
+                fields=['profile', 'date'],
+                include=['foodItem', 'percentConsumed'],
+                name='logitem_profile_date_idx',
+            ),
+            # The admin's date_hierarchy filters and takes MIN/MAX over
+            # every profile's dates.
+            models.Index(fields=['date'], name='logitem_date_idx'),
+        ]
+
     def __str__(self):
         return (self.profile.user.username + ":" + self.foodItem.foodName + ":" + self.date.strftime("%B"))
+
+
+class DailyNutrientTotal(models.Model):
+    # Per-day rollup of foodItem.<nutrient> * percentConsumed for a profile.
+    # Kept in sync by catalog/signals.py; bulk writes that skip signals
+    # must call refresh_daily_total(), or run `manage.py rebuild_rollups`.
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    day = models.DateField()
+    fat = models.FloatField(default=0)
+    saturatedFat = models.FloatField(default=0)
+    transFat = models.FloatField(default=0)
+    cholesterol = models.FloatField(default=0)
+    sodium = models.FloatField(default=0)
+    carbohydrates = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+    sugars = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    calcium = models.FloatField(default=0)
+    iron = models.FloatField(default=0)
+    potassium = models.FloatField(default=0)
+    magnesium = models.FloatField(default=0)
+    phosphorus = models.FloatField(default=0)
+    zinc = models.FloatField(default=0)
+    calories = models.FloatField(default=0)
+    vitaminC = models.FloatField(default=0)
+    vitaminD = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'day'], name='unique_profile_day_total'),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id}:{self.day}"
+
+
+class LogImport(models.Model):
+    """An uploaded history file being turned into LogItems in the background."""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
+    upload = models.FileField(upload_to='log_imports/')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    totalBytes = models.PositiveBigIntegerField(default=0)
+    bytesRead = models.PositiveBigIntegerField(default=0)
+    rowsRead = models.PositiveIntegerField(default=0)
+    rowsImported = models.PositiveIntegerField(default=0)
+    rowsSkipped = models.PositiveIntegerField(default=0)
+    # The first few "line N: reason" messages for skipped rows.
+    errors = models.JSONField(default=list, blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    finishedAt = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        return int(100 * self.bytesRead / self.totalBytes) if self.totalBytes else 0
+
+    def __str__(self):
+        return f"{self.profile_id}:{self.upload.name}:{self.status}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work for the run_worker command.
+
+    Workers lease a job by setting leasedUntil; a job whose lease runs
+    out (the worker died) is picked up again by another worker. Jobs
+    sharing a key are not queued twice while one is still pending.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    runAt = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    maxAttempts = models.PositiveIntegerField(default=3)
+    workerId = models.CharField(max_length=100, blank=True)
+    leasedUntil = models.DateTimeField(null=True, blank=True)
+    lastError = models.TextField(blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    finishedAt = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'runAt'], name='job_status_runat_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_pending_job_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name}#{self.id}:{self.status}"
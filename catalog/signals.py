@@ -0,0 +1,36 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import FoodItem, LogItem
+from .static.nutrient_functions import log_day, refresh_daily_total
+
+
+@receiver(pre_save, sender=LogItem)
+def remember_rollup_day(sender, instance, **kwargs):
+    """Note the day a LogItem was filed under before it is changed."""
+    instance._rollup_old = None
+    if instance.pk:
+        old = LogItem.objects.filter(pk=instance.pk).values('profile_id', 'date').first()
+        if old:
+            instance._rollup_old = (old['profile_id'], log_day(old['date']))
+
+
+@receiver(post_save, sender=LogItem)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    new = (instance.profile_id, log_day(instance.date))
+    old = getattr(instance, '_rollup_old', None)
+    refresh_daily_total(*new)
+    if old and old != new:
+        refresh_daily_total(*old, create=False)
+
+
+@receiver(post_delete, sender=LogItem)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    originModel = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and originModel not in (LogItem, FoodItem):
+        # Cascading from a Profile/User delete; its rollups go with it.
+        return
+    refresh_daily_total(instance.profile_id, log_day(instance.date), create=False)
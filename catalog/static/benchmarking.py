@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+
+
+def percentile(samples, pct):
+    """The pct-th percentile of samples, by nearest rank."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def scratch_name(settingsDict):
+    """Name of the benchmark database next to the configured one."""
+    name = str(settingsDict['NAME'])
+    if connection.vendor == 'sqlite':
+        path = Path(name)
+        return str(path.with_name(f'bench_{path.name}'))
+    return f'bench_{name}'
+
+
+@contextmanager
+def scratch_database(keep=False):
+    """
+    Run the block against a new, migrated database, never the configured one.
+
+    Benchmarks seed rows and drop indexes; on the live database that
+    would compete with real traffic, and a killed run would leave the
+    damage behind. The scratch database is created like the test
+    database (so the user needs CREATEDB on Postgres), named bench_<NAME>
+    so it never collides with the test suite's, and dropped afterwards.
+
+    Args:
+        keep (bool): Leave the database (and its rows) behind, and
+            reuse it if it already exists.
+    """
+    testSettings = connection.settings_dict.setdefault('TEST', {})
+    previousName = testSettings.get('NAME')
+    testSettings['NAME'] = scratch_name(connection.settings_dict)
+    try:
+        old = setup_databases(verbosity=0, interactive=False, keepdb=keep, aliases={'default'},
+                              serialized_aliases=set())
+        try:
+            yield
+        finally:
+            connection.close()
+            teardown_databases(old, verbosity=0, keepdb=keep)
+    finally:
+        testSettings['NAME'] = previousName
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from catalog.static import metrics
+from catalog.static.nutrient_functions import get_dashboard_gauges
+
+
+def get_cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def cache_key(profile, bucket):
+    """
+    Key for a profile's gauges in one time bucket.
+
+    Profile.dataChangedAt is the version: every LogItem write moves it
+    (through refresh_daily_total) and so does saving the profile form,
+    so a write makes the old entry unreachable instead of deleting it.
+    """
+    version = profile.dataChangedAt.timestamp() if profile.dataChangedAt else 0
+    return f"dashboard:v1:{profile.id}:{version}:{bucket}"
+
+
+def get_gauges(profile, now=None):
+    """
+    get_dashboard_gauges() for profile, cached until its data changes.
+
+    The windows end at "now", so entries also expire at the end of a
+    DASHBOARD_CACHE_BUCKET second bucket: a cached dashboard is never
+    more than one bucket behind the clock. Writes outside the profile's
+    own data, such as a FoodItem's nutrients being refreshed, are
+    picked up the same way.
+    """
+    now = now or timezone.now()
+    bucketSize = settings.DASHBOARD_CACHE_BUCKET
+    stamp = now.timestamp()
+    bucket = int(stamp // bucketSize)
+    key = cache_key(profile, bucket)
+    dashboardCache = get_cache()
+    gauges = dashboardCache.get(key)
+    if gauges is not None:
+        metrics.dashboard_cache_requests.inc(result="hit")
+        return gauges
+
+    metrics.dashboard_cache_requests.inc(result="miss")
+    gauges = get_dashboard_gauges(profile, now)
+    dashboardCache.set(key, gauges, timeout=max(1, (bucket + 1) * bucketSize - stamp))
+    return gauges
+
+
+def cache_stats():
+    """Dashboard cache hits, misses and hit ratio across every process."""
+    counts = metrics.dashboard_cache_requests.values()
+    hits = counts.get(("hit",), 0)
+    misses = counts.get(("miss",), 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hitRatio": hits / (hits + misses) if hits + misses else None,
+    }
@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from catalog.static.timing import timed
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling FoodData Central while it is known to be down."""
+
+
+class AsyncFDCError(requests.exceptions.RequestException):
+    """Raised by afdc_get() for timeouts, connection and HTTP errors."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast after repeated upstream failures.
+
+    After `threshold` consecutive failures the circuit opens and calls
+    are refused for `reset_timeout` seconds. The first call after that
+    is let through as a trial: success closes the circuit again, failure
+    re-opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("FoodData Central circuit is open")
+            # Half-open: let this call through, hold the others back.
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("FoodData Central circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+_session = None
+_session_pid = None
+_breaker = None
+_async_clients = weakref.WeakKeyDictionary()
+_state_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Return this process's pooled requests.Session.
+
+    The session keeps TLS connections to FDC alive between searches.
+    Retries are left to fdc_get(), which keeps them within FDC_DEADLINE.
+    A new session is built after a fork so gunicorn workers never share
+    sockets.
+    """
+    global _session, _session_pid
+    with _state_lock:
+        if _session is None or _session_pid != os.getpid():
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=0)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+            _session_pid = os.getpid()
+        return _session
+
+
+def get_breaker():
+    global _breaker
+    with _state_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(settings.FDC_BREAKER_THRESHOLD, settings.FDC_BREAKER_RESET)
+        return _breaker
+
+
+def get_async_client():
+    """
+    Return the pooled httpx.AsyncClient for the running event loop.
+
+    An ASGI worker runs a single loop, so in practice this is one
+    keep-alive pool per process, mirroring get_session().
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.FDC_READ_TIMEOUT, connect=settings.FDC_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def reset_client():
+    """Forget the pooled session and breaker state (used by tests)."""
+    global _session, _breaker
+    with _state_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _breaker = None
+        _async_clients.clear()
+
+
+def is_retryable(status):
+    return status == 429 or status >= 500
+
+
+def retry_delays(deadline):
+    """
+    Yield the sleep before each attempt of one FDC call: 0, then the
+    exponential backoff, for at most FDC_RETRIES retries. Stops early
+    rather than sleep past `deadline`. Retry-After headers are ignored,
+    so a 429 cannot hold a worker longer than the deadline.
+    """
+    yield 0
+    for attempt in range(settings.FDC_RETRIES):
+        delay = settings.FDC_RETRY_BACKOFF * (2 ** attempt)
+        if time.monotonic() + delay >= deadline:
+            return
+        yield delay
+
+
+def attempt_timeouts(deadline):
+    """(connect, read) timeouts for one attempt, cut short by `deadline`."""
+    remaining = max(deadline - time.monotonic(), 0.01)
+    return min(settings.FDC_CONNECT_TIMEOUT, remaining), min(settings.FDC_READ_TIMEOUT, remaining)
+
+
+def fdc_get(path, params=None):
+    """
+    GET a FoodData Central endpoint and return the decoded JSON.
+
+    429/5xx responses, timeouts and connection errors are retried
+    FDC_RETRIES times with exponential backoff. The whole call, retries
+    included, gives up after about FDC_DEADLINE seconds.
+
+    Args:
+        path (str): Path below FDC_API_URL, e.g. "/foods/search".
+        params (dict): Query parameters; the API key is added here.
+
+    Raises:
+        requests.exceptions.RequestException: On timeouts, connection
+            errors, exhausted retries, HTTP errors or an open circuit.
+    """
+    breaker = get_breaker()
+    breaker.before_call()
+    params = dict(params or {}, api_key=settings.FDC_API_KEY)
+    url = settings.FDC_API_URL.rstrip("/") + path
+    deadline = time.monotonic() + settings.FDC_DEADLINE
+    for delay in retry_delays(deadline):
+        time.sleep(delay)
+        try:
+            with timed("fdc"):
+                response = get_session().get(url, params=params, timeout=attempt_timeouts(deadline))
+        except requests.exceptions.RequestException as e:
+            error = e
+            continue
+        if is_retryable(response.status_code):
+            error = requests.exceptions.HTTPError(
+                f"FoodData Central returned {response.status_code}", response=response)
+            continue
+        # Bad requests are our fault, not a sign FDC is down.
+        breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+    breaker.record_failure()
+    raise error
+
+
+async def afdc_get(path, params=None):
+    """
+    Async counterpart of fdc_get() for the ASGI search view.
+
+    Shares the circuit breaker, timeouts, retry policy and deadline
+    with fdc_get().
+
+    Raises:
+        requests.exceptions.RequestException: AsyncFDCError or
+            CircuitOpenError, so callers handle both clients alike.
+    """
+    breaker = get_breaker()
+    breaker.before_call()
+    params = dict(params or {}, api_key=settings.FDC_API_KEY)
+    url = settings.FDC_API_URL.rstrip("/") + path
+    client = get_async_client()
+
+    deadline = time.monotonic() + settings.FDC_DEADLINE
+    for delay in retry_delays(deadline):
+        await asyncio.sleep(delay)
+        connect, read = attempt_timeouts(deadline)
+        try:
+            with timed("fdc"):
+                response = await client.get(url, params=params, timeout=httpx.Timeout(read, connect=connect))
+        except httpx.TransportError as e:
+            error = AsyncFDCError(f"FoodData Central request failed: {e!r}")
+            continue
+        if is_retryable(response.status_code):
+            error = AsyncFDCError(f"FoodData Central returned {response.status_code}")
+            continue
+        if response.status_code >= 400:
+            breaker.record_success()
+            raise AsyncFDCError(f"FoodData Central returned {response.status_code}")
+        try:
+            data = response.json()
+        except ValueError as e:
+            # httpx raises json.JSONDecodeError, which is not a RequestException.
+            breaker.record_failure()
+            raise AsyncFDCError(f"FoodData Central returned invalid JSON: {e}") from e
+        breaker.record_success()
+        return data
+
+    breaker.record_failure()
+    raise error
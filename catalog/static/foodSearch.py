@@ -1,29 +1,42 @@
+import re
 import requests
 import logging
+import time
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
 from catalog.models import FoodItem
+from catalog.static import metrics
+from catalog.static.fdc_client import afdc_get, fdc_get
+from catalog.static.jobs import enqueue
+from catalog.static.nutrient_functions import nutrient_fields
 
 logger = logging.getLogger(__name__)
 
 
+# FDC nutrientName -> FoodItem field
+nutrient_names = {"Total lipid (fat)": "fat",
+                  'Fatty acids, total saturated': "saturatedFat",
+                  'Fatty acids, total trans': "transFat",
+                  'Cholesterol': "cholesterol",
+                  'Sodium, Na': "sodium",
+                  'Carbohydrate, by difference': "carbohydrates",
+                  'Fiber, total dietary': "fiber",
+                  'Total Sugars': "sugars",
+                  'Protein': "protein",  # 1003
+                  'Calcium, Ca': "calcium",
+                  'Iron, Fe': "iron",
+                  'Potassium, K': "potassium",
+                  'Magnesium, Mg': "magnesium",
+                  'Phosphorus, P': "phosphorus",
+                  'Zinc, Zn': "zinc",
+                  'Energy': "calories",
+                  'Vitamin C, total ascorbic acid': "vitaminC",
+                  'Vitamin D (D2 + D3), International Units': "vitaminD"}
+
+
 def get_nutrient_amounts(nutrientsList):
-    amounts = {"Total lipid (fat)": 0,
-               'Fatty acids, total saturated': 0,
-               'Fatty acids, total trans': 0,
-               'Cholesterol': 0,
-               'Sodium, Na': 0,
-               'Carbohydrate, by difference': 0,
-               'Fiber, total dietary': 0,
-               'Total Sugars': 0,
-               'Protein': 0,  # 1003
-               'Calcium, Ca': 0,
-               'Iron, Fe': 0,
-               'Potassium, K': 0,
-               'Magnesium, Mg': 0,
-               'Phosphorus, P': 0,
-               'Zinc, Zn': 0,
-               'Energy': 0,
-               'Vitamin C, total ascorbic acid': 0,
-               'Vitamin D (D2 + D3), International Units': 0}
+    amounts = dict.fromkeys(nutrient_names, 0)
     for i in range(len(nutrientsList)):
         currentNutrient = nutrientsList[i]
         if (currentNutrient['nutrientName'] in amounts):
@@ -31,57 +44,193 @@ def get_nutrient_amounts(nutrientsList):
     return amounts
 
 
+def make_food_item(foodName, fdcId, nutrientDict):
+    """Build an unsaved FoodItem from get_nutrient_amounts() output."""
+    return FoodItem(
+        foodName=foodName,
+        fdcId=fdcId,
+        **{field: nutrientDict[name] for name, field in nutrient_names.items()},
+    )
+
+
+def is_calories(name, unit):
+    # FDC reports Energy in both kcal and kJ; only kcal maps to calories.
+    return name != "Energy" or (unit or "KCAL").upper() == "KCAL"
+
+
+def json_food_item(item):
+    """Build a FoodItem from one food in an FDC bulk JSON dump or /food/{fdcId} response."""
+    category = item.get("foodCategory") or item.get("brandedFoodCategory") or ""
+    if isinstance(category, dict):
+        category = category.get("description", "")
+    brandName = item.get("brandName") or item.get("brandOwner") or category
+    foodName = f"{brandName}: {item['description']}" if brandName else item["description"]
+
+    nutrients = []
+    for entry in item.get("foodNutrients", []):
+        nutrient = entry.get("nutrient", {})
+        if "amount" in entry and is_calories(nutrient.get("name"), nutrient.get("unitName")):
+            nutrients.append({"nutrientName": nutrient.get("name"), "value": entry["amount"]})
+    return make_food_item(foodName[:255], item["fdcId"], get_nutrient_amounts(nutrients))
+
+
+food_fields = ["foodName", *nutrient_fields]
+
+
+def upsert_food_items(foodItems):
+    """
+    Insert new FoodItems and refresh changed ones in one write.
+
+    Existing rows are read with a single fdcId__in query so unchanged
+    foods are skipped entirely; everything else goes through one
+    bulk_create(update_conflicts=True) upsert. When upstream nutrient
+    values change, a refresh_food_rollups job is queued to recompute the
+    DailyNutrientTotal rows of every day that logged the food; a popular
+    food can touch thousands of days, too many to redo in a search.
+
+    Returns:
+        Dictionary: {'inserted': n, 'updated': n, 'unchanged': n}
+    """
+    byFdcId = {food.fdcId: food for food in foodItems}
+    existing = {
+        row["fdcId"]: row
+        for row in FoodItem.objects.filter(fdcId__in=byFdcId).values("id", "fdcId", *food_fields)
+    }
+    changed = [
+        food for fdcId, food in byFdcId.items()
+        if fdcId not in existing
+        or any(getattr(food, field) != existing[fdcId][field] for field in food_fields)
+    ]
+    updatedIds = [existing[food.fdcId]["id"] for food in changed if food.fdcId in existing]
+    stats = {
+        "inserted": len(changed) - len(updatedIds),
+        "updated": len(updatedIds),
+        "unchanged": len(byFdcId) - len(changed),
+    }
+
+    if changed:
+        with transaction.atomic():
+            FoodItem.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["fdcId"],
+                update_fields=food_fields,
+            )
+            if updatedIds:
+                enqueue("refresh_food_rollups", foodIds=updatedIds)
+
+    logger.info("FoodItem upsert: %(inserted)s inserted, %(updated)s updated, "
+                "%(unchanged)s unchanged", stats, extra={"food_upsert": stats})
+    return stats
+
+
+def parse_search_results(resp):
+    """Turn an FDC /foods/search response into up to 30 unsaved FoodItems."""
+    returnedFoods = resp["foods"]
+    maxListLength = 30
+    foodList = []
+    for i in range(len(returnedFoods)):
+        inFoodItem = returnedFoods[i]
+        brandName = inFoodItem["foodCategory"]
+        if "brandName" in inFoodItem:
+            brandName = inFoodItem['brandName']
+        inFoodName = brandName + ": " + inFoodItem['description']
+        inFoodfdcId = inFoodItem['fdcId']
+        nutrientDict = get_nutrient_amounts(inFoodItem['foodNutrients'])
+
+        foodItemInstance = make_food_item(inFoodName, inFoodfdcId, nutrientDict)
+        foodList.append(foodItemInstance)
+        maxListLength -= 1
+        if (maxListLength < 1):
+            break
+    return foodList
+
+
 def get_food_data(query):
+    started = time.perf_counter()
     try:
-        key = 'glb9XFdhGGdEZ1pnLb7Xoi06Xc2BvCuhK17UQwWr'
-        url = f"https://api.nal.usda.gov/fdc/v1/foods/search?api_key={key}&query={query}"
-        response = requests.get(url)
-        response.raise_for_status()
-        resp = response.json()
-        returnedFoods = resp["foods"]
-        maxListLength = 30
-        foodList = []
-        for i in range(len(returnedFoods)):
-            inFoodItem = returnedFoods[i]
-            brandName = inFoodItem["foodCategory"]
-            if "brandName" in inFoodItem:
-                brandName = inFoodItem['brandName']
-            inFoodName = brandName + ": " + inFoodItem['description']
-            inFoodfdcId = inFoodItem['fdcId']
-            nutrientDict = get_nutrient_amounts(inFoodItem['foodNutrients'])
-
-            foodItemInstance = FoodItem(
-                foodName=inFoodName,
-                fdcId=inFoodfdcId,
-                fat=nutrientDict["Total lipid (fat)"],
-                saturatedFat=nutrientDict["Fatty acids, total saturated"],
-                transFat=nutrientDict["Fatty acids, total trans"],
-                cholesterol=nutrientDict["Cholesterol"],
-                sodium=nutrientDict["Sodium, Na"],
-                carbohydrates=nutrientDict["Carbohydrate, by difference"],
-                fiber=nutrientDict["Fiber, total dietary"],
-                sugars=nutrientDict["Total Sugars"],
-                protein=nutrientDict["Protein"],
-                calcium=nutrientDict["Calcium, Ca"],
-                iron=nutrientDict["Iron, Fe"],
-                potassium=nutrientDict["Potassium, K"],
-                magnesium=nutrientDict["Magnesium, Mg"],
-                phosphorus=nutrientDict["Phosphorus, P"],
-                zinc=nutrientDict["Zinc, Zn"],
-                calories=nutrientDict["Energy"],
-                vitaminC=nutrientDict["Vitamin C, total ascorbic acid"],
-                vitaminD=nutrientDict["Vitamin D (D2 + D3), International Units"],
-            )
-            if not FoodItem.objects.filter(fdcId=inFoodfdcId).exists():
-                foodItemInstance.save()
-            foodList.append(foodItemInstance)
-            maxListLength -= 1
-            if (maxListLength < 1):
-                break
+        resp = fdc_get("/foods/search", {"query": query})
+        foodList = parse_search_results(resp)
+        upsert_food_items(foodList)
+        metrics.fdc_search_seconds.observe(time.perf_counter() - started, outcome="ok")
+        return foodList
+    except requests.exceptions.RequestException as e:
+        metrics.fdc_search_seconds.observe(time.perf_counter() - started, outcome="error")
+        logger.error(f"Failed to retrieve food data: {e}")
+        return None
+
+
+def _upsert_from_worker_thread(foodList):
+    # Runs on a plain thread-pool thread, which Django does not clean up
+    # after a request, so release its connection once it is stale.
+    try:
+        return upsert_food_items(foodList)
+    finally:
+        close_old_connections()
+
+
+async def aget_food_data(query):
+    """
+    Async get_food_data() for the ASGI search view.
+
+    The upsert is not tied to the request's thread so it still completes
+    when the search outlives its request (see views.search_async).
+    """
+    started = time.perf_counter()
+    try:
+        resp = await afdc_get("/foods/search", {"query": query})
+        foodList = parse_search_results(resp)
+        await sync_to_async(_upsert_from_worker_thread, thread_sensitive=False)(foodList)
+        metrics.fdc_search_seconds.observe(time.perf_counter() - started, outcome="ok")
         return foodList
     except requests.exceptions.RequestException as e:
+        metrics.fdc_search_seconds.observe(time.perf_counter() - started, outcome="error")
         logger.error(f"Failed to retrieve food data: {e}")
         return None
 
+def search_local_foods(query):
+    """
+    Rank FoodItems matching query using the database's full-text index.
+
+    Every word is prefix matched, so "chick bre" finds "Chicken breast".
+    Postgres uses the english SearchVector GIN index and falls back to
+    pg_trgm similarity when nothing matches (typos); SQLite uses the
+    catalog_fooditem_fts FTS5 table. The result is a lazy QuerySet, so
+    Paginator pushes COUNT and LIMIT/OFFSET into SQL.
+    """
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return FoodItem.objects.none()
+
+    vendor = connection.vendor
+    if vendor == "postgresql":
+        from django.contrib.postgres.search import (
+            SearchQuery, SearchRank, SearchVector, TrigramSimilarity,
+        )
+
+        vector = SearchVector("foodName", config="english")
+        tsquery = SearchQuery(" & ".join(f"{word}:*" for word in words),
+                              search_type="raw", config="english")
+        foods = (FoodItem.objects.annotate(search=vector).filter(search=tsquery)
+                 .annotate(rank=SearchRank(vector, tsquery)).order_by("-rank", "foodName"))
+        if foods.exists():
+            return foods
+        # trigram_similar is registered on foodName in CatalogConfig.ready().
+        return (FoodItem.objects.filter(foodName__trigram_similar=query)
+                .annotate(rank=TrigramSimilarity("foodName", query)).order_by("-rank", "foodName"))
+
+    if vendor == "sqlite":
+        match = " ".join('"%s"*' % word for word in words)
+        foods = (FoodItem.objects.filter(fts__foodName__match=match)
+                 .annotate(rank=F("fts__rank")).order_by("rank", "foodName"))
+        if foods.exists():
+            return foods
+
+    foods = FoodItem.objects.all()
+    for word in words:
+        foods = foods.filter(foodName__icontains=word)
+    return foods.order_by("foodName")
+
+
 def get_food_by_fdcId(fdcId):
     return FoodItem.objects.get(fdcId = fdcId)
\ No newline at end of file
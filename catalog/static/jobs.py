@@ -0,0 +1,150 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from catalog.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job name -> function, filled by @task in catalog/tasks.py.
+tasks = {}
+
+
+def task(name):
+    """Register a function as the job handler for name."""
+    def register(func):
+        tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(name, key=None, delay=0, maxAttempts=None, **kwargs):
+    """
+    Queue a job for the run_worker command.
+
+    Args:
+        name (str): Registered task name.
+        key (str): Optional de-duplication key. While a job with the
+            same key is queued or running no second one is added and
+            the pending job is returned instead.
+        delay (float): Seconds to wait before the job may run.
+        maxAttempts (int): Runs before the job is marked failed.
+        **kwargs: JSON-serializable arguments for the task.
+
+    Returns:
+        Job: The new job, or the pending job with the same key.
+    """
+    if name not in tasks:
+        raise KeyError(f"Unknown job {name!r}")
+    job = Job(
+        name=name,
+        kwargs=kwargs,
+        key=key,
+        runAt=timezone.now() + timedelta(seconds=delay),
+        maxAttempts=maxAttempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+        return job
+    except IntegrityError:
+        pending = Job.objects.filter(key=key, status__in=["queued", "running"]).first()
+        if pending is None:  # finished in between; try once more
+            job.pk = None
+            job.save()
+            return job
+        return pending
+
+
+def claim_jobs(workerId, limit=1, lease=None):
+    """
+    Lease up to limit due jobs for workerId.
+
+    Due jobs are queued jobs whose runAt has passed and running jobs
+    whose lease expired. On Postgres candidates are locked with
+    SELECT ... FOR UPDATE SKIP LOCKED so concurrent workers never wait
+    on each other; SQLite has no row locks, so there each claim is a
+    compare-and-set UPDATE and a job another worker got first is skipped.
+
+    Returns:
+        List: The claimed Jobs, attempts already incremented.
+    """
+    lease = lease or settings.JOB_LEASE_SECONDS
+    now = timezone.now()
+    due = (
+        Job.objects.filter(Q(status="queued", runAt__lte=now) | Q(status="running", leasedUntil__lt=now))
+        .order_by("runAt", "id")
+    )
+    claimed = []
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        for job in due[:limit]:
+            won = Job.objects.filter(id=job.id, status=job.status, leasedUntil=job.leasedUntil).update(
+                status="running",
+                workerId=workerId,
+                leasedUntil=now + timedelta(seconds=lease),
+                attempts=F("attempts") + 1,
+            )
+            if won:
+                claimed.append(job.id)
+    return list(Job.objects.filter(id__in=claimed).order_by("runAt", "id"))
+
+
+def extend_leases(workerId, jobIds, lease=None):
+    """Push back the lease of jobs this worker is still running."""
+    lease = lease or settings.JOB_LEASE_SECONDS
+    return Job.objects.filter(id__in=jobIds, workerId=workerId, status="running").update(
+        leasedUntil=timezone.now() + timedelta(seconds=lease)
+    )
+
+
+def run_job(job):
+    """
+    Run one claimed job and record the outcome.
+
+    Failures are retried with exponential backoff until maxAttempts.
+    The outcome is only written while this worker still holds the
+    lease, so a worker that stalled past its lease cannot overwrite
+    the result of the worker that took the job over.
+
+    Returns:
+        str: The job's new status.
+    """
+    mine = Job.objects.filter(id=job.id, workerId=job.workerId, status="running")
+    if job.attempts > job.maxAttempts:
+        # Its earlier worker died mid-run maxAttempts times.
+        mine.update(status="failed", finishedAt=timezone.now(), lastError="Lease expired too many times.")
+        return "failed"
+
+    try:
+        tasks[job.name](**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.maxAttempts:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            logger.warning("Job %s failed (attempt %s), retrying in %ss", job, job.attempts, delay)
+            mine.update(status="queued", runAt=timezone.now() + timedelta(seconds=delay),
+                        leasedUntil=None, lastError=error)
+            return "queued"
+        logger.error("Job %s failed permanently", job)
+        mine.update(status="failed", finishedAt=timezone.now(), leasedUntil=None, lastError=error)
+        return "failed"
+
+    mine.update(status="done", finishedAt=timezone.now(), leasedUntil=None)
+    return "done"
+
+
+def purge_jobs(days=None):
+    """Delete finished jobs older than days (JOB_KEEP_DAYS by default)."""
+    cutoff = timezone.now() - timedelta(days=days or settings.JOB_KEEP_DAYS)
+    deleted, _ = Job.objects.filter(status__in=["done", "failed"], finishedAt__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,66 @@
+// Draws every nutrient gauge on the page from the single #gauge-data
+// payload (see gauge_payload() in nutrient_functions.py). Gauges are
+// drawn as they scroll into view, so the first paint only pays for
+// the handful that are visible.
+(function () {
+    const payload = JSON.parse(document.getElementById('gauge-data').textContent);
+    const layout = {
+        width: 255,
+        height: 260,
+        margin: { t: 25, r: 35, l: 35, b: 25 },
+        paper_bgcolor: 'white',
+        font: { color: 'black', family: 'Arial' }
+    };
+
+    function draw(element, value, i) {
+        const minIn = payload.minIn[i];
+        const maxIn = payload.maxIn[i];
+        const maxRange = payload.maxRange[i];
+        const name = payload.names[i];
+        Plotly.newPlot(element, [{
+            type: 'indicator',
+            mode: 'gauge+number',
+            value: value,
+            title: { text: name.charAt(0).toUpperCase() + name.slice(1), font: { size: 24 } },
+            gauge: {
+                axis: { range: [0, maxRange], tickwidth: 1, tickcolor: 'black' },
+                bar: { color: 'grey' },
+                bgcolor: 'grey',
+                borderwidth: 2,
+                bordercolor: 'pink',
+                steps: [
+                    { range: [0, minIn], color: 'white' },
+                    { range: [minIn, maxIn], color: 'green' },
+                    { range: [maxIn, maxRange], color: 'red' }
+                ]
+            }
+        }], layout, { displayModeBar: false });
+    }
+
+    const observer = 'IntersectionObserver' in window ? new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                entry.target.drawGauge();
+            }
+        });
+    }, { rootMargin: '200px' }) : null;
+
+    document.querySelectorAll('[data-gauge-window]').forEach(function (container) {
+        const label = container.dataset.gaugeWindow;
+        const values = payload.windows[label];
+        payload.names.forEach(function (name, i) {
+            const element = document.createElement('div');
+            element.id = label + '-gauge-' + name;
+            element.style.minHeight = layout.height + 'px';
+            element.style.marginBottom = '20px';
+            element.drawGauge = function () { draw(element, values[i], i); };
+            container.appendChild(element);
+            if (observer) {
+                observer.observe(element);
+            } else {
+                element.drawGauge();
+            }
+        });
+    });
+})();
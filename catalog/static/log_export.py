@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+
+from catalog.models import LogItem
+from catalog.static.nutrient_functions import nutrient_fields
+
+export_fields = ["id", "profileId", "date", "percentConsumed", "fdcId", "foodName", *nutrient_fields]
+
+# export field -> LogItem lookup
+_export_lookups = {
+    "id": "id",
+    "profileId": "profile_id",
+    "date": "date",
+    "percentConsumed": "percentConsumed",
+    "fdcId": "foodItem__fdcId",
+    "foodName": "foodItem__foodName",
+    **{field: f"foodItem__{field}" for field in nutrient_fields},
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def export_rows(profiles=None, start=None, end=None, chunk_size=2000):
+    """
+    Yield every matching LogItem joined with its FoodItem as a tuple
+    ordered like export_fields, oldest first.
+
+    Rows are read as tuples with iterator(), so memory use does not grow
+    with the history: Postgres streams through a server-side cursor and
+    SQLite fetches chunk_size rows at a time.
+
+    Args:
+        profiles (list): Profile ids to export, or None for everyone.
+        start (DateTimeField): Optional earliest date to include.
+        end (DateTimeField): Optional date to stop before (exclusive).
+    """
+    logQuery = LogItem.objects.all()
+    if profiles:
+        logQuery = logQuery.filter(profile_id__in=profiles)
+    if start is not None:
+        logQuery = logQuery.filter(date__gte=start)
+    if end is not None:
+        logQuery = logQuery.filter(date__lt=end)
+    rows = (
+        logQuery.order_by("date", "id")
+        .values_list(*(_export_lookups[field] for field in export_fields))
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield (row[0], row[1], row[2].isoformat(), *row[3:])
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_csv(rows, batch_size=500):
+    """Encode rows as CSV text, header first, a few hundred rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_fields)
+    yield buffer.getvalue()
+    for batch in _batched(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows, batch_size=500):
+    """Encode rows as newline-delimited JSON objects."""
+    for batch in _batched(rows, batch_size):
+        yield "".join(json.dumps(dict(zip(export_fields, row))) + "\n" for row in batch)
+
+
+def encode_export(rows, exportFormat):
+    if exportFormat == "csv":
+        return iter_csv(rows)
+    if exportFormat == "ndjson":
+        return iter_ndjson(rows)
+    raise ValueError(f"Unknown export format {exportFormat!r}")
+
+
+async def aiter_chunks(chunks):
+    """
+    Drive a synchronous chunk generator from async code.
+
+    Django's ASGI handler buffers a synchronous streaming body into one
+    list before sending it. Pulling one chunk at a time through
+    sync_to_async keeps an export streaming, and every next() call runs
+    on the request's thread, where its database cursor lives.
+    """
+    getNext = sync_to_async(next)
+    while True:
+        chunk = await getNext(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,265 @@
+import csv
+import io
+import logging
+import re
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from catalog.models import FoodItem, LogImport, LogItem
+from catalog.static import metrics
+from catalog.static.nutrient_functions import log_day, refresh_daily_totals
+
+logger = logging.getLogger(__name__)
+
+MAX_IMPORT_ERRORS = 20
+
+# Normalized CSV header -> what it holds. Headers are compared
+# lowercased with everything but letters and digits removed, so
+# "Food Name", "food_name" and "foodName" are all "foodname".
+column_names = {
+    "date": "date",
+    "datetime": "date",
+    "time": "time",
+    "meal": "meal",
+    "fdcid": "fdcId",
+    "food": "foodName",
+    "foodname": "foodName",
+    "name": "foodName",
+    "description": "foodName",
+    "percentconsumed": "percentConsumed",
+    "servings": "percentConsumed",
+    "numberofservings": "percentConsumed",
+}
+
+# Rows with a day but no time are logged at their meal's usual time.
+meal_times = {
+    "breakfast": time(8, 0),
+    "lunch": time(12, 30),
+    "snacks": time(15, 0),
+    "snack": time(15, 0),
+    "dinner": time(18, 30),
+}
+default_meal_time = time(12, 0)
+
+
+class SkipRow(ValueError):
+    """A row that cannot be imported; the message says why."""
+
+
+def header_map(fieldnames):
+    """Map each known CSV column of a header row to its field name."""
+    mapping = {}
+    for name in fieldnames or []:
+        field = column_names.get(re.sub(r"[^a-z0-9]", "", name.lower()))
+        if field and field not in mapping.values():
+            mapping[name] = field
+    if "date" not in mapping.values():
+        raise ValueError("The file needs a Date column.")
+    if "fdcId" not in mapping.values() and "foodName" not in mapping.values():
+        raise ValueError("The file needs an fdcId or Food Name column.")
+    return mapping
+
+
+def parse_log_date(row, now):
+    value = (row.get("date") or "").strip()
+    try:
+        day = parse_date(value)
+        date = None if day else parse_datetime(value)
+        if date is None:
+            day = day or datetime.strptime(value, "%m/%d/%Y").date()
+            at = parse_time((row.get("time") or "").strip()) if row.get("time") else None
+            if at is None:
+                at = meal_times.get((row.get("meal") or "").strip().lower(), default_meal_time)
+            date = datetime.combine(day, at)
+    except ValueError:
+        raise SkipRow(f"unreadable date {value!r}")
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.get_default_timezone())
+    if date > now:
+        raise SkipRow("date is in the future")
+    return date
+
+
+def parse_percent(row):
+    value = (row.get("percentConsumed") or "").strip()
+    if not value:
+        return 1.0
+    try:
+        percent = float(value)
+    except ValueError:
+        raise SkipRow(f"unreadable servings {value!r}")
+    if not 0 <= percent <= 1000:
+        raise SkipRow("servings must be between 0 and 1000")
+    return percent
+
+
+class FoodResolver:
+    """
+    Look up FoodItem ids by fdcId or case-insensitive name, a batch at a time.
+
+    Answers, including misses, are remembered for the whole import:
+    history files name the same few hundred foods over and over.
+    """
+
+    def __init__(self):
+        self.byFdcId = {}
+        self.byName = {}
+
+    def load(self, rows):
+        fdcIds = set()
+        names = set()
+        for row in rows:
+            fdcId = (row.get("fdcId") or "").strip()
+            if fdcId.isdigit() and int(fdcId) not in self.byFdcId:
+                fdcIds.add(int(fdcId))
+            name = (row.get("foodName") or "").strip().lower()
+            if name and name not in self.byName:
+                names.add(name)
+        if fdcIds:
+            found = dict(FoodItem.objects.filter(fdcId__in=fdcIds).values_list("fdcId", "id"))
+            for fdcId in fdcIds:
+                self.byFdcId[fdcId] = found.get(fdcId)
+        if names:
+            found = {}
+            matches = (
+                FoodItem.objects.annotate(nameKey=Lower("foodName"))
+                .filter(nameKey__in=names)
+                .order_by("id")
+                .values_list("nameKey", "id")
+            )
+            for nameKey, foodId in matches:
+                found.setdefault(nameKey, foodId)
+            for name in names:
+                self.byName[name] = found.get(name)
+
+    def food_id(self, row):
+        fdcId = (row.get("fdcId") or "").strip()
+        if fdcId.isdigit() and self.byFdcId.get(int(fdcId)):
+            return self.byFdcId[int(fdcId)]
+        name = (row.get("foodName") or "").strip()
+        if name and self.byName.get(name.lower()):
+            return self.byName[name.lower()]
+        raise SkipRow(f"no food matches {name or fdcId!r}")
+
+
+def import_logs(profile, stream, batch_size=5000, on_progress=None, resume=None):
+    """
+    Stream a CSV history file into LogItems for one profile.
+
+    The file is read row by row. Each batch resolves its foods with at
+    most two queries, is written with one bulk_create() and has its
+    DailyNutrientTotal days refreshed in the same transaction, so
+    rollups match the imported rows at every step. Rows that cannot be
+    matched or parsed are skipped and counted.
+
+    on_progress runs inside each batch's transaction, so progress it
+    saves always matches the committed rows and an interrupted import
+    can continue from it with `resume`.
+
+    Args:
+        profile (Profile): Profile the LogItems belong to.
+        stream: Binary file object positioned at the start of the CSV.
+        batch_size (int): Rows per transaction.
+        on_progress: Optional callable given the stats dict after
+            every batch.
+        resume (dict): Stats saved by an earlier, interrupted run of
+            this file; its first rowsRead rows are skipped and counting
+            continues from there.
+
+    Returns:
+        Dictionary: rowsRead, rowsImported, rowsSkipped, bytesRead and
+        errors (the first MAX_IMPORT_ERRORS skip reasons).
+
+    Raises:
+        ValueError: If the header row lacks the required columns.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    fieldnames = next(reader, None)
+    mapping = header_map(fieldnames)
+    header = [mapping.get(name) for name in fieldnames]
+    resolver = FoodResolver()
+    now = timezone.now()
+    stats = {"rowsRead": 0, "rowsImported": 0, "rowsSkipped": 0, "bytesRead": 0, "errors": []}
+    if resume:
+        stats.update({key: resume[key] for key in stats})
+    done = stats["rowsRead"]
+
+    def flush(batch):
+        resolver.load(row for _, row in batch)
+        logItems = []
+        for line, row in batch:
+            try:
+                logItems.append(LogItem(
+                    profile_id=profile.id,
+                    foodItem_id=resolver.food_id(row),
+                    date=parse_log_date(row, now),
+                    percentConsumed=parse_percent(row),
+                ))
+            except SkipRow as e:
+                stats["rowsSkipped"] += 1
+                if len(stats["errors"]) < MAX_IMPORT_ERRORS:
+                    stats["errors"].append(f"line {line}: {e}")
+        stats["rowsImported"] += len(logItems)
+        stats["bytesRead"] = stream.tell() if stream.seekable() else 0
+        with transaction.atomic():
+            LogItem.objects.bulk_create(logItems)
+            refresh_daily_totals(profile.id, {log_day(logItem.date) for logItem in logItems})
+            if on_progress:
+                on_progress(stats)
+        metrics.log_items_created.inc(len(logItems), via="import")
+
+    batch = []
+    seen = 0
+    for values in reader:
+        if not any(values):
+            continue
+        seen += 1
+        if seen <= done:
+            continue  # imported by the interrupted run
+        stats["rowsRead"] += 1
+        row = {field: value for field, value in zip(header, values) if field}
+        batch.append((reader.line_num, row))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+    text.detach()  # leave the caller's stream open
+    return stats
+
+
+def run_log_import(importId, batch_size=5000):
+    """
+    Process a LogImport upload, recording progress on the row.
+
+    The job is run again when its worker dies mid-import. Batches are
+    committed together with the progress row, so the rerun skips the
+    rows already imported instead of logging them twice; a finished
+    import is left alone.
+    """
+    logImport = LogImport.objects.select_related("profile").get(id=importId)
+    if logImport.status in ("done", "failed"):
+        return
+    resume = None
+    if logImport.status == "running":
+        logger.warning("Log import %s resuming after row %s", importId, logImport.rowsRead)
+        resume = {field: getattr(logImport, field)
+                  for field in ("rowsRead", "rowsImported", "rowsSkipped", "bytesRead", "errors")}
+    imports = LogImport.objects.filter(id=importId)
+    imports.update(status="running", totalBytes=logImport.upload.size)
+
+    def save_progress(stats):
+        imports.update(**stats)
+
+    try:
+        with logImport.upload.open("rb") as stream:
+            stats = import_logs(logImport.profile, stream, batch_size, save_progress, resume)
+    except Exception as e:
+        logger.exception("Log import %s failed", importId)
+        imports.update(status="failed", errors=[str(e)], finishedAt=timezone.now())
+        return
+    imports.update(status="done", finishedAt=timezone.now(), **stats)
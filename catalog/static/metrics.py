@@ -0,0 +1,241 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Metric name -> Counter/Histogram, in the order they are rendered.
+registry = {}
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ProcessStore:
+    """
+    This process's metric values, mirrored to a file in METRICS_DIR.
+
+    Every gunicorn worker writes only its own file, from a daemon
+    thread every METRICS_FLUSH_INTERVAL seconds while values change and
+    once more when it exits, and /metrics adds up all of them. Files of
+    exited workers are kept so counters never go backwards until the
+    server restarts (clear_files()). A forked child starts from zero in
+    a file of its own.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.values = {}
+        # Chosen up front so collect() can skip this process's file even
+        # before its first flush.
+        self.filename = f"{self.pid}-{uuid.uuid4().hex[:8]}.json"
+        self.dirty = False
+        self.flusher = None
+
+    def update(self, key, apply):
+        with self.lock:
+            if os.getpid() != self.pid:
+                self.reset()
+            apply(self.values, key)
+            self.dirty = True
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.flush_forever, name="metrics-flush", daemon=True)
+                self.flusher.start()
+
+    def flush_forever(self):
+        pid = self.pid
+        while os.getpid() == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if os.getpid() != self.pid or not self.dirty:
+                return
+            directory = Path(settings.METRICS_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / self.filename
+            partial = path.with_suffix(".tmp")
+            partial.write_text(json.dumps([
+                [name, labels, value] for (name, labels), value in self.values.items()
+            ]))
+            os.replace(partial, path)  # readers see the old file or the new one
+            self.dirty = False
+
+    def snapshot(self):
+        with self.lock:
+            if os.getpid() != self.pid:
+                return None, {}
+            return self.filename, {key: (list(value) if isinstance(value, list) else value)
+                               for key, value in self.values.items()}
+
+
+store = ProcessStore()
+atexit.register(store.flush)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        registry[name] = self
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labelnames)
+
+    def values(self):
+        """{label values: value} summed over every process."""
+        return {labels: value for (name, labels), value in collect().items() if name == self.name}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        def apply(values, key):
+            values[key] = values.get(key, 0) + amount
+        store.update(self.key(labels), apply)
+
+
+class Histogram(Metric):
+    """Values are [count per bucket..., count above the last, sum]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        def apply(values, key):
+            counts = values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[len(self.buckets)] += 1
+            counts[-1] += value
+        store.update(self.key(labels), apply)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the block's duration in seconds; also a decorator."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+def merge(total, value):
+    if isinstance(value, list):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+    return (total or 0) + value
+
+
+def collect():
+    """Every process's values added together, this one's read live."""
+    ownFile, merged = store.snapshot()
+    directory = Path(settings.METRICS_DIR)
+    for path in directory.glob("*.json") if directory.is_dir() else ():
+        if path.name == ownFile:
+            continue
+        try:
+            rows = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # replaced or half written; caught on the next scrape
+        for name, labels, value in rows:
+            key = (name, tuple(labels))
+            merged[key] = merge(merged.get(key), value)
+    return merged
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    values = collect()
+    lines = []
+    for metric in registry.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for (name, labels), value in sorted(values.items()):
+            if name != metric.name:
+                continue
+            if metric.kind == "counter":
+                lines.append(f"{name}{format_labels(metric.labelnames, labels)} {format_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, math.inf), value):
+                cumulative += count
+                le = (("le", format_number(bound)),)
+                lines.append(f"{name}_bucket{format_labels(metric.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(metric.labelnames, labels)} {format_number(value[-1])}")
+            lines.append(f"{name}_count{format_labels(metric.labelnames, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+def clear_files():
+    """Delete every process's metric file; run as the server starts."""
+    directory = Path(settings.METRICS_DIR)
+    for pattern in ("*.json", "*.tmp"):
+        for path in directory.glob(pattern) if directory.is_dir() else ():
+            path.unlink(missing_ok=True)
+
+
+def reset():
+    """Forget every value, this process's and the files'; for tests."""
+    with store.lock:
+        store.reset()
+    clear_files()
+
+
+http_requests = Counter(
+    "healthtracker_http_requests_total", "Requests handled, by view.", ["view", "method", "status"])
+http_request_seconds = Histogram(
+    "healthtracker_http_request_duration_seconds", "Time to produce a response, by view.", ["view"])
+food_searches = Counter(
+    "healthtracker_food_searches_total", "Food searches, by backend.", ["backend"])
+search_cache_requests = Counter(
+    "healthtracker_search_cache_requests_total",
+    "Search cache lookups: hit, shared (answered by a concurrent fetch) or miss.", ["result"])
+fdc_search_seconds = Histogram(
+    "healthtracker_fdc_search_duration_seconds",
+    "FoodData Central searches including the FoodItem upsert, by outcome.", ["outcome"])
+aggregation_seconds = Histogram(
+    "healthtracker_nutrient_aggregation_duration_seconds",
+    "Time spent computing nutrient averages and trends.", ["function"])
+dashboard_cache_requests = Counter(
+    "healthtracker_dashboard_cache_requests_total", "Dashboard cache lookups, by result.", ["result"])
+log_items_created = Counter(
+    "healthtracker_log_items_created_total", "LogItems created, by entry point.", ["via"])
@@ -1,4 +1,17 @@
-from catalog.models import FoodItem, LogItem, Profile
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from catalog.models import DailyNutrientTotal, LogItem, Profile
+from catalog.static import metrics
+from catalog.static.timing import timed
 
 nutrient_fields = [
     "fat",
@@ -52,7 +65,24 @@ def make_min(value):
 def make_max(value):
     return (value + (value * spread))
 
+NutrientRange = namedtuple("NutrientRange", ["min", "max", "target"])
+
+
 def personalize(ranges, profile):
+    """
+    Build the personalized target table for a profile.
+
+    ranges is left untouched; the adjustments are made on a copy, so
+    one user's targets can never leak into another request.
+
+    Args:
+        ranges (dict): Base ranges, normally nutrient_ranges.
+        profile (Profile): Profile to personalize for.
+
+    Returns:
+        MappingProxyType: {'name': NutrientRange(min, max, target)}
+    """
+    ranges = {name: dict(values) for name, values in ranges.items()}
     age = profile.age
     height = profile.height / 100
     weight = profile.weight
@@ -109,8 +139,236 @@ def personalize(ranges, profile):
     ranges['protein']['target'] = proTarget
     ranges['protein']['min'] = make_min(proTarget)
     ranges['protein']['max'] = make_max(proTarget)
+    return MappingProxyType({
+        name: NutrientRange(values["min"], values["max"], values["target"])
+        for name, values in ranges.items()
+    })
+
+
+# profile id -> ((age, height, weight, gender), personalized ranges),
+# least recently used first.
+_personal_ranges_cache = OrderedDict()
+_personal_ranges_lock = threading.Lock()
+
+
+def get_personal_ranges(profile):
+    """
+    Memoized personalize(nutrient_ranges, profile).
+
+    Entries are keyed by profile id and only reused while the profile's
+    age, height, weight and gender are unchanged. Each process keeps at
+    most settings.PERSONAL_RANGES_CACHE_SIZE profiles and evicts the
+    least recently used first. The cached tables are immutable, so
+    sharing them between threads is safe.
+    """
+    signature = (profile.age, profile.height, profile.weight, profile.gender)
+    with _personal_ranges_lock:
+        cached = _personal_ranges_cache.get(profile.id)
+        if cached is not None and cached[0] == signature:
+            _personal_ranges_cache.move_to_end(profile.id)
+            return cached[1]
+    ranges = personalize(nutrient_ranges, profile)
+    with _personal_ranges_lock:
+        _personal_ranges_cache[profile.id] = (signature, ranges)
+        _personal_ranges_cache.move_to_end(profile.id)
+        while len(_personal_ranges_cache) > settings.PERSONAL_RANGES_CACHE_SIZE:
+            _personal_ranges_cache.popitem(last=False)
     return ranges
 
+
+def forget_personal_ranges(profileId):
+    """Drop a profile's memoized targets, e.g. after its details change."""
+    with _personal_ranges_lock:
+        _personal_ranges_cache.pop(profileId, None)
+
+def nutrient_sums(prefix="foodItem__"):
+    """
+    Build one Sum() expression per nutrient for aggregate()/annotate().
+
+    With the default prefix each LogItem contributes
+    foodItem.<field> * percentConsumed. With an empty prefix the
+    nutrient columns of the queried model are summed directly, which
+    is how DailyNutrientTotal rows are combined.
+    """
+    sums = {}
+    for field in nutrient_fields:
+        value = F(f"{prefix}{field}")
+        if prefix:
+            value = value * F("percentConsumed")
+        sums[field] = Sum(value, default=0.0, output_field=FloatField())
+    return sums
+
+
+def get_nutrient_totals(logQuery):
+    """
+    Sum every nutrient consumed across a LogItem queryset.
+
+    Each log item contributes foodItem.<field> * percentConsumed. All
+    of the sums are computed by the database in a single aggregate()
+    query, so the cost does not grow with the number of nutrients or
+    log items.
+
+    Args:
+        logQuery (QuerySet): LogItem rows to total.
+
+    Returns:
+        Dictionary: {'name': total} for every field in nutrient_fields.
+    """
+    return logQuery.aggregate(**nutrient_sums())
+
+
+def log_day(value):
+    """Calendar day a LogItem date is rolled up under."""
+    return timezone.localtime(value, timezone.get_default_timezone()).date()
+
+
+def day_bounds(day):
+    """Return the [start, end) datetimes covering a rollup day."""
+    start = datetime.combine(day, time.min, tzinfo=timezone.get_default_timezone())
+    return start, start + timedelta(days=1)
+
+
+def refresh_daily_total(profileId, day, create=True):
+    """
+    Recompute the DailyNutrientTotal row for one profile and day.
+
+    The row is rebuilt from that day's LogItems rather than adjusted by
+    a delta, so calling it twice, or concurrently, leaves it correct.
+    Days without any LogItems have their row removed.
+
+    Args:
+        profileId (int): Id number of the profile to refresh.
+        day (date): Day to refresh.
+        create (bool): Insert the row when it is missing. Deletes pass
+            False so a cascading Profile delete never re-creates rows.
+    """
+    start, end = day_bounds(day)
+    totals = LogItem.objects.filter(
+        profile_id=profileId, date__gte=start, date__lt=end
+    ).aggregate(itemCount=Count("id"), **nutrient_sums())
+    itemCount = totals.pop("itemCount")
+
+    rollups = DailyNutrientTotal.objects.filter(profile_id=profileId, day=day)
+    if not itemCount:
+        rollups.delete()
+    elif create:
+        DailyNutrientTotal.objects.update_or_create(
+            profile_id=profileId, day=day, defaults=totals
+        )
+    else:
+        rollups.update(**totals)
+    touch_profile(profileId)
+
+
+def refresh_daily_totals(profileId, days):
+    """
+    Recompute the DailyNutrientTotal rows of many days at once.
+
+    Same result as calling refresh_daily_total() for each day, but the
+    days are summed in one grouped query and written with one upsert,
+    which is what bulk writers such as imports need.
+
+    Args:
+        profileId (int): Id number of the profile to refresh.
+        days (iterable): Days to refresh.
+    """
+    days = set(days)
+    if not days:
+        return
+    start = day_bounds(min(days))[0]
+    end = day_bounds(max(days))[1]
+    rows = (
+        LogItem.objects.filter(profile_id=profileId, date__gte=start, date__lt=end)
+        .annotate(day=TruncDate("date", tzinfo=timezone.get_default_timezone()))
+        .values("day")
+        .annotate(**nutrient_sums())
+        .order_by()
+    )
+    rollups = [
+        DailyNutrientTotal(profile_id=profileId, **row)
+        for row in rows
+        if row["day"] in days
+    ]
+    DailyNutrientTotal.objects.filter(profile_id=profileId, day__in=days).exclude(
+        day__in=[rollup.day for rollup in rollups]
+    ).delete()
+    DailyNutrientTotal.objects.bulk_create(
+        rollups,
+        update_conflicts=True,
+        unique_fields=["profile", "day"],
+        update_fields=nutrient_fields,
+    )
+    touch_profile(profileId)
+
+
+def refresh_food_rollups(foodIds):
+    """
+    Recompute the DailyNutrientTotal rows of every day that logged these foods.
+
+    Used after FoodData Central changes a food's nutrients. The affected
+    days are read in one query and refreshed with one
+    refresh_daily_totals() per profile.
+
+    Args:
+        foodIds (list): FoodItem ids whose nutrients changed.
+    """
+    days = (
+        LogItem.objects.filter(foodItem_id__in=foodIds)
+        .annotate(day=TruncDate("date", tzinfo=timezone.get_default_timezone()))
+        .values_list("profile_id", "day")
+        .distinct()
+        .order_by()
+    )
+    byProfile = {}
+    for profileId, day in days:
+        byProfile.setdefault(profileId, set()).add(day)
+    for profileId, profileDays in byProfile.items():
+        with transaction.atomic():
+            refresh_daily_totals(profileId, profileDays)
+
+
+def touch_profile(profileId):
+    """Record that a profile's logged data changed, invalidating its ETags."""
+    Profile.objects.filter(id=profileId).update(dataChangedAt=timezone.now())
+
+
+def get_window_totals(profile, start, end):
+    """
+    Sum every nutrient consumed by a profile from start to end.
+
+    Whole days inside the window are read from DailyNutrientTotal, so
+    a 7 day window touches at most 5 rollup rows. Only the partial
+    days at either edge are summed from LogItem, which keeps the result
+    identical to totalling the LogItems directly.
+
+    Args:
+        profile (Profile): Profile to total.
+        start (DateTimeField): Beginning of the window.
+        end (DateTimeField): End of the window.
+
+    Returns:
+        Dictionary: {'name': total} for every field in nutrient_fields.
+    """
+    logQuery = LogItem.objects.filter(profile=profile)
+    firstDay = log_day(start)
+    lastDay = log_day(end)
+    if (lastDay - firstDay).days < 2:
+        return get_nutrient_totals(logQuery.filter(date__gte=start, date__lte=end))
+
+    innerStart = day_bounds(firstDay)[1]
+    innerEnd = day_bounds(lastDay)[0]
+    totals = get_nutrient_totals(logQuery.filter(
+        Q(date__gte=start, date__lt=innerStart)
+        | Q(date__gte=innerEnd, date__lte=end)
+    ))
+    innerTotals = DailyNutrientTotal.objects.filter(
+        profile=profile, day__gt=firstDay, day__lt=lastDay
+    ).aggregate(**nutrient_sums(prefix=""))
+    return {field: totals[field] + innerTotals[field] for field in nutrient_fields}
+
+
+@timed("agg")
+@metrics.aggregation_seconds.time(function="get_dv_avg")
 def get_dv_avg(start, end, profileId):
     """
     For generating an average of the nutrients consumed.
@@ -138,41 +396,190 @@ def get_dv_avg(start, end, profileId):
     """
 
     searchProfile = Profile.objects.get(id=profileId)
-    gender = searchProfile.gender
-    logQuery = LogItem.objects.filter(
-        profile=searchProfile, date__gte=start, date__lte=end
-    )
-    tempFoodItem = FoodItem()
+    totals = get_window_totals(searchProfile, start, end)
 
     logLen = (end - start).total_seconds() / 86400
 
+    return dv_results(searchProfile, totals, logLen)
+
+
+def dv_results(profile, totals, logLen):
+    """Turn a window's nutrient totals into get_dv_avg()'s result."""
+    averages = {}
     for field in nutrient_fields:  # For Each nutrient
-        values = [  # Go through all of the returned log items.
-            (getattr(item.foodItem, field, 0) or 0) * (item.percentConsumed or 0)
-            for item in logQuery
-        ]
-        total = sum(values)
-        avg = total / logLen if logLen else 0 # Average the value
-        setattr(tempFoodItem, field, avg)
+        averages[field] = totals[field] / logLen if logLen else 0 # Average the value
 
-    personal_ranges = personalize(nutrient_ranges, searchProfile)
+    personal_ranges = get_personal_ranges(profile)
 
     results = {}
     for field in nutrient_fields:
-        avg_value = getattr(tempFoodItem, field, 0)
+        avg_value = averages[field]
 
         results[field] = {
-            "minIn": personal_ranges[field]["min"],
-            "maxIn": personal_ranges[field]["max"],
-            "maxRange": int(personal_ranges[field]["max"] * 1.2),
+            "minIn": personal_ranges[field].min,
+            "maxIn": personal_ranges[field].max,
+            "maxRange": int(personal_ranges[field].max * 1.2),
             "value": avg_value,
         }
     return results
 
 
+@timed("agg")
+@metrics.aggregation_seconds.time(function="get_dv_windows")
+def get_dv_windows(profile, windows=(1, 7, 30, 90), now=None):
+    """
+    get_dv_avg() for several windows ending now, in one pass.
+
+    Each window is split the way get_window_totals() splits one: whole
+    days from DailyNutrientTotal, the partial days at its edges from
+    LogItem. The rollup rows of the widest window and the LogItems of
+    every edge are fetched once and each window sums its share, so
+    asking for more windows adds no queries.
+
+    Args:
+        profile (Profile): Profile to average.
+        windows (iterable): Window lengths in days.
+        now (DateTimeField): End of every window; defaults to now.
+
+    Returns:
+        Dictionary: {days: get_dv_avg() result} for every window.
+    """
+    windows = list(windows)
+    end = now or timezone.now()
+    lastDay = log_day(end)
+    innerEnd = day_bounds(lastDay)[0]
+
+    starts = {days: end - timedelta(days=days) for days in windows}
+    firstDays = {days: log_day(start) for days, start in starts.items()}
+    edges = Q(date__gte=innerEnd, date__lte=end)
+    for days, start in starts.items():
+        edges |= Q(date__gte=start, date__lt=day_bounds(firstDays[days])[1])
+    logRows = LogItem.objects.filter(edges, profile=profile, date__lte=end).values_list(
+        "date", "percentConsumed", *(f"foodItem__{field}" for field in nutrient_fields)
+    )
+    rollupRows = DailyNutrientTotal.objects.filter(
+        profile=profile, day__gt=min(firstDays.values()), day__lt=lastDay
+    ).values_list("day", *nutrient_fields)
+
+    totals = {days: [0.0] * len(nutrient_fields) for days in windows}
+    for date, percent, *values in logRows:
+        day = log_day(date)
+        for days, start in starts.items():
+            if date >= start and (date >= innerEnd or day == firstDays[days]):
+                windowTotals = totals[days]
+                for i, value in enumerate(values):
+                    windowTotals[i] += (value or 0) * percent
+    for day, *values in rollupRows:
+        for days, firstDay in firstDays.items():
+            if day > firstDay:
+                windowTotals = totals[days]
+                for i, value in enumerate(values):
+                    windowTotals[i] += value
+
+    return {
+        days: dv_results(profile, dict(zip(nutrient_fields, totals[days])), days)
+        for days in windows
+    }
+
+
+def gauge_payload(windows):
+    """
+    Pack get_dv_avg() results into one compact, JSON-ready dict.
+
+    Every window shares the profile's ranges, so they are sent once and
+    each window only adds its list of values. Lists follow
+    nutrient_fields order.
+
+    Args:
+        windows (dict): {'label': get_dv_avg() result}, e.g. daily/weekly.
+
+    Returns:
+        Dictionary:
+        {
+        'names': [name, ...],
+        'minIn': [...], 'maxIn': [...], 'maxRange': [...],
+        'windows': {'label': [value, ...]},
+        }
+    """
+    first = next(iter(windows.values()))
+    return {
+        "names": nutrient_fields,
+        "minIn": [first[field]["minIn"] for field in nutrient_fields],
+        "maxIn": [first[field]["maxIn"] for field in nutrient_fields],
+        "maxRange": [first[field]["maxRange"] for field in nutrient_fields],
+        "windows": {
+            label: [round(results[field]["value"], 1) for field in nutrient_fields]
+            for label, results in windows.items()
+        },
+    }
+
+
+# Dashboard gauge window label -> length in days.
+dashboard_windows = {"daily": 1, "weekly": 7, "monthly": 30, "quarterly": 90}
+
+
+def get_dashboard_gauges(profile, now=None):
+    """Gauge payload for every window in dashboard_windows."""
+    averages = get_dv_windows(profile, dashboard_windows.values(), now)
+    return gauge_payload({
+        label: averages[days] for label, days in dashboard_windows.items()
+    })
+
+
 def get_log_items(start, end, profileId):
     searchProfile = Profile.objects.get(id=profileId)
     results = LogItem.objects.filter(
         profile=searchProfile, date__gte=start, date__lte=end
     )
     return results.order_by("-date")
+
+
+_epoch = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_log_cursor(logItem):
+    """Keyset cursor pointing just past logItem in (-date, -id) order."""
+    micros = (logItem.date - _epoch) // timedelta(microseconds=1)
+    return f"{micros}.{logItem.id}"
+
+
+def decode_log_cursor(cursor):
+    """Inverse of encode_log_cursor(); raises ValueError on bad input."""
+    micros, logId = cursor.split(".")
+    try:
+        return _epoch + timedelta(microseconds=int(micros)), int(logId)
+    except OverflowError as e:
+        raise ValueError("Cursor date out of range.") from e
+
+
+def get_log_page(profileId, start=None, end=None, cursor=None, limit=25):
+    """
+    One page of a profile's log history, newest first.
+
+    Pages are fetched by keyset on (date, id) rather than OFFSET, so
+    every page costs the same single indexed query however deep into
+    the history it is. FoodItems are joined in the same query.
+
+    Args:
+        profileId (int): Id number of the profile to list.
+        start (DateTimeField): Optional earliest date to include.
+        end (DateTimeField): Optional date to stop before (exclusive).
+        cursor (str): Value returned as next_cursor by the previous page.
+        limit (int): Log items per page.
+
+    Returns:
+        Tuple: (list of LogItems, next_cursor or None on the last page)
+    """
+    logQuery = LogItem.objects.filter(profile_id=profileId).select_related("foodItem")
+    if start is not None:
+        logQuery = logQuery.filter(date__gte=start)
+    if end is not None:
+        logQuery = logQuery.filter(date__lt=end)
+    if cursor:
+        date, logId = decode_log_cursor(cursor)
+        logQuery = logQuery.filter(Q(date__lt=date) | Q(date=date, id__lt=logId))
+
+    items = list(logQuery.order_by("-date", "-id")[:limit + 1])
+    if len(items) > limit:
+        return items[:limit], encode_log_cursor(items[limit - 1])
+    return items, None
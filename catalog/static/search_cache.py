@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from catalog.models import FoodItem
+from catalog.static import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query):
+    """Lowercase a search and reduce it to its words, so "Apple  Pie!" == "apple pie"."""
+    return " ".join(re.findall(r"\w+", query.lower()))
+
+
+def cache_key(query):
+    digest = hashlib.md5(normalize_query(query).encode()).hexdigest()
+    return f"search:v1:{digest}"
+
+
+def get_cache():
+    return caches[settings.SEARCH_CACHE_ALIAS]
+
+
+def hydrate(fdcIds):
+    """Load FoodItems for a cached fdcId list in one query, keeping its order."""
+    if not fdcIds:
+        return []
+    byFdcId = FoodItem.objects.in_bulk(fdcIds, field_name="fdcId")
+    return [byFdcId[fdcId] for fdcId in fdcIds if fdcId in byFdcId]
+
+
+def lookup(query):
+    """
+    Return the cached FoodItems for query, or None on a miss.
+
+    An empty list is a cached "no results" answer, not a miss.
+    """
+    fdcIds = get_cache().get(cache_key(query))
+    if fdcIds is None:
+        return None
+    return hydrate(fdcIds)
+
+
+def store(query, foods):
+    """Cache the fdcIds of a search result; empty results expire sooner."""
+    fdcIds = [food.fdcId for food in foods]
+    timeout = settings.SEARCH_CACHE_TIMEOUT if fdcIds else settings.SEARCH_CACHE_NEGATIVE_TIMEOUT
+    get_cache().set(cache_key(query), fdcIds, timeout=timeout)
+
+
+def lock_path(key):
+    """Lock file for key when the search cache is on disk, else None."""
+    searchCache = get_cache()
+    if not isinstance(searchCache, FileBasedCache):
+        return None
+    return os.path.join(searchCache._dir, "locks", hashlib.md5(key.encode()).hexdigest() + ".lock")
+
+
+def acquire_lock(key, token):
+    """
+    Take the single-flight lock for key; True if this caller got it.
+
+    FileBasedCache.add() is has_key() then set(), so two gunicorn
+    workers could both win it. On disk the lock is instead a file
+    created with O_CREAT | O_EXCL, which exactly one process creates.
+    Redis (SET NX) and LocMemCache make add() atomic already. A lock
+    file older than SEARCH_CACHE_LOCK_TIMEOUT was left by a dead worker
+    and is removed.
+    """
+    path = lock_path(key)
+    if path is None:
+        return get_cache().add(f"{key}:lock", token, timeout=settings.SEARCH_CACHE_LOCK_TIMEOUT)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < settings.SEARCH_CACHE_LOCK_TIMEOUT:
+                    return False
+                # Two callers removing the same stale lock can at worst
+                # both fetch, as they would have without it.
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # released meanwhile
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        return True
+    return False
+
+
+def release_lock(key, token):
+    """Release the lock for key if token still holds it."""
+    path = lock_path(key)
+    if path is None:
+        searchCache = get_cache()
+        if searchCache.get(f"{key}:lock") == token:
+            searchCache.delete(f"{key}:lock")
+        return
+    try:
+        with open(path) as f:
+            if f.read() != token:
+                return
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def cached_search(query, fetch):
+    """
+    Return FoodItems for query, calling fetch(query) at most once per key.
+
+    Concurrent misses for the same normalized query are single-flighted:
+    the first caller takes the lock (acquire_lock()) and fetches, the
+    others poll for its answer, backing off to twice a second. The lock
+    outlives the slowest fetch (FDC_DEADLINE), so waiters are released
+    as soon as it finishes; if the holder fails a waiter takes the lock
+    and fetches for itself rather than returning nothing. fetch()
+    returns a list of FoodItems, or None when the upstream call failed;
+    failures are not cached.
+    """
+    foods = lookup(query)
+    if foods is not None:
+        metrics.search_cache_requests.inc(result="hit")
+        return foods
+
+    key = cache_key(query)
+    token = uuid.uuid4().hex
+    if not acquire_lock(key, token):
+        deadline = time.monotonic() + settings.SEARCH_CACHE_LOCK_TIMEOUT
+        pause = 0.05
+        while time.monotonic() < deadline:
+            time.sleep(pause)
+            pause = min(pause * 2, 0.5)
+            foods = lookup(query)
+            if foods is not None:
+                metrics.search_cache_requests.inc(result="shared")
+                return foods
+            if acquire_lock(key, token):
+                break  # the holder gave up; fetch ourselves
+        else:
+            logger.warning("Search cache lock wait timed out for %r", normalize_query(query))
+
+    try:
+        foods = lookup(query)  # filled while we waited for the lock
+        if foods is not None:
+            metrics.search_cache_requests.inc(result="shared")
+            return foods
+        metrics.search_cache_requests.inc(result="miss")
+        foods = fetch(query)
+        if foods is None:
+            return []
+        store(query, foods)
+        return foods
+    finally:
+        release_lock(key, token)
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.models import FoodItem, LogItem, Profile
+from catalog.static.foodSearch import nutrient_names
+from catalog.static.nutrient_functions import day_bounds, nutrient_fields, refresh_daily_totals
+
+# Synthetic foods get fdcIds from here up, well above real FDC ids.
+FDC_ID_BASE = 900_000_000
+
+ADJECTIVES = ['baked', 'creamy', 'crunchy', 'dried', 'frozen', 'grilled', 'honey', 'light',
+              'organic', 'roasted', 'salted', 'smoked', 'spicy', 'sweet', 'whole']
+FOODS = ['almonds', 'apple', 'bagel', 'banana', 'beans', 'bread', 'broccoli', 'cereal', 'cheese',
+         'chicken', 'crackers', 'granola', 'milk', 'noodles', 'oatmeal', 'pasta', 'pizza', 'potato',
+         'rice', 'salmon', 'soup', 'spinach', 'tofu', 'tuna', 'turkey', 'yogurt']
+
+
+@dataclass
+class SyntheticData:
+    profiles: list
+    foods: list
+    logItems: int
+
+
+def make_foods(rng, prefix, count):
+    """
+    Unsaved FoodItems named "<prefix>: <adjective> <food> <n>".
+
+    Names are built the way parse_search_results() builds them from an
+    FDC result whose foodCategory is prefix, so serving these foods back
+    from fdc_search_payload() leaves them unchanged on upsert.
+    """
+    return [
+        FoodItem(
+            foodName=f'{prefix}: {rng.choice(ADJECTIVES)} {rng.choice(FOODS)} {i}',
+            fdcId=FDC_ID_BASE + i,
+            **{field: round(rng.uniform(0, 100), 2) for field in nutrient_fields},
+        )
+        for i in range(count)
+    ]
+
+
+def fdc_search_payload(foods):
+    """A FoodData Central /foods/search response listing foods."""
+    return {
+        'foods': [
+            {
+                'fdcId': food.fdcId,
+                'foodCategory': food.foodName.split(': ', 1)[0],
+                'description': food.foodName.split(': ', 1)[1],
+                'foodNutrients': [
+                    {'nutrientName': name, 'value': getattr(food, field)}
+                    for name, field in nutrient_names.items()
+                ],
+            }
+            for food in foods
+        ]
+    }
+
+
+def seed(rng, prefix, users=20, foods=500, days=730, itemsPerDay=4):
+    """
+    Create users with profiles, a food catalog and their log history.
+
+    Everything is drawn from rng, so the same seed builds the same rows
+    (dates are relative to today). LogItems are bulk inserted and their
+    DailyNutrientTotal rows built afterwards with refresh_daily_totals().
+    Usernames start with prefix; remove the rows with cleanup().
+
+    Args:
+        rng (random.Random): Source of every value.
+        prefix (str): Username and foodCategory prefix.
+        users (int): Users, each with a Profile.
+        foods (int): FoodItems in the catalog.
+        days (int): Days of history, ending yesterday.
+        itemsPerDay (int): LogItems per profile per day.
+
+    Returns:
+        SyntheticData: The profiles, the foods and the LogItem count.
+    """
+    today = timezone.localdate()
+    with transaction.atomic():
+        FoodItem.objects.bulk_create(make_foods(rng, prefix, foods), batch_size=1000)
+        catalog = list(FoodItem.objects.filter(fdcId__gte=FDC_ID_BASE, foodName__startswith=prefix)
+                       .order_by('fdcId'))
+        FoodItem.objects.filter(id__in=[food.id for food in catalog]).update(refreshedAt=timezone.now())
+        User.objects.bulk_create([User(username=f'{prefix}{i}', password='!') for i in range(users)])
+        Profile.objects.bulk_create([
+            Profile(user=user, age=rng.randint(18, 80), height=rng.uniform(150, 200),
+                    weight=rng.uniform(50, 120), gender=rng.choice('MFO'))
+            for user in User.objects.filter(username__startswith=prefix).order_by('username')
+        ])
+        profiles = list(Profile.objects.filter(user__username__startswith=prefix)
+                        .select_related('user').order_by('user__username'))
+        history = [today - timedelta(days=d) for d in range(days, 0, -1)]
+        for profile in profiles:
+            LogItem.objects.bulk_create([
+                LogItem(profile=profile, foodItem=rng.choice(catalog),
+                        percentConsumed=rng.choice([0.5, 1, 1, 1.5, 2]),
+                        date=day_bounds(day)[0] + timedelta(minutes=rng.randrange(24 * 60)))
+                for day in history
+                for _ in range(itemsPerDay)
+            ], batch_size=1000)
+            refresh_daily_totals(profile.id, history)
+        Profile.objects.filter(id__in=[profile.id for profile in profiles]).update(dataChangedAt=timezone.now())
+    return SyntheticData(profiles, catalog, len(profiles) * len(history) * itemsPerDay)
+
+
+def cleanup(prefix):
+    """Delete the rows seed() created with prefix."""
+    User.objects.filter(username__startswith=prefix).delete()
+    FoodItem.objects.filter(fdcId__gte=FDC_ID_BASE, foodName__startswith=prefix).delete()
@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+
+from catalog.models import DailyNutrientTotal
+from catalog.static import metrics
+from catalog.static.nutrient_functions import get_personal_ranges, nutrient_fields
+from catalog.static.timing import timed
+
+
+def day_range(startDay, endDay):
+    """Every calendar day from startDay to endDay, inclusive."""
+    return [startDay + timedelta(days=i) for i in range((endDay - startDay).days + 1)]
+
+
+def daily_series(profile, startDay, endDay, fields=nutrient_fields):
+    """
+    Per-day nutrient totals for a profile, one list per nutrient.
+
+    Read from DailyNutrientTotal, so a year costs one query returning at
+    most 366 rows however many LogItems were logged. Days with nothing
+    logged are 0.
+
+    Args:
+        profile (Profile): Profile to read.
+        startDay (date): First day, inclusive.
+        endDay (date): Last day, inclusive.
+        fields (list): Nutrients to read, nutrient_fields by default.
+
+    Returns:
+        Tuple: (days, {'name': [total per day]}).
+    """
+    days = day_range(startDay, endDay)
+    position = {day: i for i, day in enumerate(days)}
+    series = {field: [0.0] * len(days) for field in fields}
+    rows = DailyNutrientTotal.objects.filter(
+        profile=profile, day__gte=startDay, day__lte=endDay
+    ).values_list("day", *fields)
+    for day, *values in rows:
+        i = position[day]
+        for field, value in zip(fields, values):
+            series[field][i] = value
+    return days, series
+
+
+def rolling_mean(values, window):
+    """
+    Trailing mean of each value and the window - 1 before it.
+
+    Kept as a running sum, so it is O(n) for any window. The first
+    window - 1 entries average over the days available so far.
+    """
+    means = []
+    total = 0.0
+    for i, value in enumerate(values):
+        total += value
+        if i >= window:
+            total -= values[i - window]
+        means.append(total / min(i + 1, window))
+    return means
+
+
+def percent_of_target(values, target):
+    """Each value as a percentage of target; None when there is no target."""
+    if not target:
+        return [None] * len(values)
+    return [100 * value / target for value in values]
+
+
+def streaks(values, low, high):
+    """
+    Runs of consecutive days with low <= value <= high.
+
+    Returns:
+        Tuple: (current, longest). current counts back from the last day.
+    """
+    current = longest = 0
+    for value in values:
+        current = current + 1 if low <= value <= high else 0
+        longest = max(longest, current)
+    return current, longest
+
+
+@timed("agg")
+@metrics.aggregation_seconds.time(function="get_trends")
+def get_trends(profile, startDay, endDay, window=7, fields=nutrient_fields):
+    """
+    Long-range nutrient trends for the trends API.
+
+    Daily totals, trailing rolling averages, the averages as a percent
+    of the profile's targets, and streaks of days spent inside the
+    target range, all from one daily_series() query.
+
+    Args:
+        profile (Profile): Profile to analyse.
+        startDay (date): First day, inclusive.
+        endDay (date): Last day, inclusive.
+        window (int): Days in each rolling average.
+        fields (list): Nutrients to include.
+
+    Returns:
+        Dictionary:
+        {
+        'days': ['YYYY-MM-DD', ...],
+        'nutrients': {
+            'name': {
+                'minIn': minIn, 'maxIn': maxIn, 'target': target,
+                'totals': [...], 'rolling': [...],
+                'percentOfTarget': [rolling as % of target, ...],
+                'currentStreak': days, 'longestStreak': days,
+                }
+            }
+        }
+    """
+    # Read window - 1 extra days so the first averages are full ones;
+    # the calendar's first days get as many as there are.
+    lead = min(window - 1, (startDay - date.min).days)
+    days, series = daily_series(profile, startDay - timedelta(days=lead), endDay, fields)
+    days = days[lead:]
+    ranges = get_personal_ranges(profile)
+    nutrients = {}
+    for field in fields:
+        rolling = rolling_mean(series[field], window)[lead:]
+        totals = series[field][lead:]
+        currentStreak, longestStreak = streaks(totals, ranges[field].min, ranges[field].max)
+        nutrients[field] = {
+            "minIn": ranges[field].min,
+            "maxIn": ranges[field].max,
+            "target": ranges[field].target,
+            "totals": [round(value, 2) for value in totals],
+            "rolling": [round(value, 2) for value in rolling],
+            "percentOfTarget": [
+                None if value is None else round(value, 1)
+                for value in percent_of_target(rolling, ranges[field].target)
+            ],
+            "currentStreak": currentStreak,
+            "longestStreak": longestStreak,
+        }
+    return {"days": [day.isoformat() for day in days], "nutrients": nutrients}
@@ -0,0 +1,46 @@
+"""Background jobs run by the run_worker command; queue them with jobs.enqueue()."""
+from io import StringIO
+
+from django.core.management import call_command
+from django.utils import timezone
+
+from .models import FoodItem
+from .static import nutrient_functions, search_cache
+from .static.fdc_client import fdc_get
+from .static.foodSearch import json_food_item, parse_search_results, upsert_food_items
+from .static.jobs import task
+from .static.log_import import run_log_import
+
+
+@task("refresh_food")
+def refresh_food(fdcId):
+    """Re-read one food's nutrients from FDC; rollups follow if they changed."""
+    upsert_food_items([json_food_item(fdc_get(f"/food/{fdcId}"))])
+    FoodItem.objects.filter(fdcId=fdcId).update(refreshedAt=timezone.now())
+
+
+@task("prefetch_search")
+def prefetch_search(query):
+    """Fill the search cache for query; FDC errors raise so the job is retried."""
+    def fetch(query):
+        foodList = parse_search_results(fdc_get("/foods/search", {"query": query}))
+        upsert_food_items(foodList)
+        return foodList
+
+    search_cache.cached_search(query, fetch)
+
+
+@task("import_logs")
+def import_logs(importId):
+    run_log_import(importId)
+
+
+@task("refresh_food_rollups")
+def refresh_food_rollups(foodIds):
+    nutrient_functions.refresh_food_rollups(foodIds)
+
+
+@task("rebuild_rollups")
+def rebuild_rollups(profiles=None):
+    args = [arg for profileId in profiles or [] for arg in ("--profile", str(profileId))]
+    call_command("rebuild_rollups", *args, stdout=StringIO())
@@ -0,0 +1,322 @@
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Callable
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import urls
+from .models import LogImport, LogItem
+from .static import synthetic_data
+from .static.fdc_client import reset_client
+from .tests import StubFDCServer, setUpModule, tearDownModule  # noqa: F401 (module fixtures)
+
+# Days of history behind each run of every view, ITEMS_PER_DAY LogItems
+# a day. Query counts must match across all of them.
+SIZES = (2, 20, 120)
+ITEMS_PER_DAY = 3
+PASSWORD = "password123"
+
+# Milliseconds a request may take at the largest size, several times
+# what they take today: they catch work that grows with the data, not
+# small slowdowns. Set PERF_BUDGET_SCALE to stretch them on a slow
+# machine.
+DEFAULT_BUDGET_MS = 100
+BUDGET_SCALE = float(os.getenv("PERF_BUDGET_SCALE", 1))
+
+
+@dataclass
+class Case:
+    """One request to a view; path, body and the rest read the size's fixture."""
+
+    name: str
+    method: str = "get"
+    path: Callable = None
+    body: Callable = None
+    json: bool = False
+    status: int = 200
+    anonymous: bool = False
+    budgetMs: int = DEFAULT_BUDGET_MS
+
+    def url(self, fixture):
+        return self.path(fixture) if self.path else reverse(self.name)
+
+    def label(self):
+        return f"{self.method.upper()} {self.name}"
+
+
+def days_ago(days):
+    return (timezone.localtime() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Read-only requests first so every size sees the same data in them,
+# then writes, then the ones that end the session.
+CASES = [
+    Case("index"),
+    Case("info"),
+    Case("profile"),
+    Case("edit_profile"),
+    Case("search", path=lambda f: reverse("search") + "?q=chicken"),
+    Case("search_async", path=lambda f: reverse("search_async") + "?q=chicken", budgetMs=250),
+    # A full page of log items, each with its food card.
+    Case("edit", budgetMs=250),
+    Case("edit_items", budgetMs=250),
+    Case("export_logs", path=lambda f: reverse("export_logs") + "?format=csv"),
+    Case("import_logs"),
+    Case("import_status", path=lambda f: reverse("import_status", args=[f.logImport.id])),
+    Case("api_log_items"),
+    Case("api_log_item", path=lambda f: reverse("api_log_item", args=[f.logItems[0].id])),
+    Case("api_food", path=lambda f: reverse("api_food", args=[f.food.fdcId])),
+    Case("api_summary"),
+    Case("api_gauges"),
+    Case("api_trends", path=lambda f: reverse("api_trends") + f"?start={timezone.localdate() - timedelta(days=89)}"),
+    Case("api_cache_stats"),
+    Case("metrics"),
+    Case("save_logItem", "post", path=lambda f: reverse("save_logItem", args=[f.food.fdcId]),
+         body=lambda f: {"date": days_ago(0), "percentConsumed": 1}, status=302),
+    Case("update_percent", "post", path=lambda f: reverse("update_percent", args=[f.logItems[1].id]),
+         body=lambda f: {"percentConsumed": 2}, status=302),
+    Case("update_date", "post", path=lambda f: reverse("update_date", args=[f.logItems[2].id]),
+         body=lambda f: {"date": days_ago(2)}, status=302),
+    Case("delete_logItem", "post", body=lambda f: {"logItem_id": f.logItems[3].id}, status=302),
+    Case("edit_profile", "post", body=lambda f: {"birthdate": "1990-01-01", "height": 180, "weight": 75},
+         status=302),
+    Case("import_logs", "post",
+         body=lambda f: {"upload": SimpleUploadedFile("history.csv", b"Date,Food Name,Servings\n")}, status=302),
+    Case("api_log_items", "post", json=True,
+         body=lambda f: {"fdcId": f.food.fdcId, "date": days_ago(1)}, status=201),
+    Case("api_log_meal", "post", json=True, status=201,
+         body=lambda f: {"entries": [{"fdcId": food.fdcId, "date": days_ago(1)} for food in f.foods[:3]]}),
+    Case("api_log_item", "patch", path=lambda f: reverse("api_log_item", args=[f.logItems[4].id]),
+         json=True, body=lambda f: {"percentConsumed": 0.5}),
+    Case("api_log_item", "delete", path=lambda f: reverse("api_log_item", args=[f.logItems[5].id]), status=204),
+    Case("signup", anonymous=True),
+    Case("signup", "post", anonymous=True, status=302, body=lambda f: {
+        "username": f"new{f.size}", "email": f"new{f.size}@example.com", "password": PASSWORD,
+        "birthdate": "1990-01-01", "height": 170, "weight": 70,
+    }),
+    Case("login", anonymous=True),
+    Case("login", "post", anonymous=True, status=302,
+         body=lambda f: {"username": f.user.username, "password": PASSWORD}),
+    Case("logout"),
+]
+
+# Literals and savepoint names vary between runs; the statement shape
+# is what gets counted.
+_literal = re.compile(r"'(?:[^']|'')*'|\"s\d+_x\d+\"|\b\d+(?:\.\d+)?(?:e[+-]?\d+)?\b")
+
+
+def normalize(sql):
+    return _literal.sub("?", sql)
+
+
+def growth_report(label, runs):
+    """
+    Describe how a view's queries changed between data sizes.
+
+    Args:
+        label (str): The request, e.g. "GET edit".
+        runs (dict): {size: [sql, ...]} captured at each size.
+
+    Returns:
+        String naming each statement that ran a different number of
+        times at the largest size than at the smallest.
+    """
+    smallest, largest = min(runs), max(runs)
+    before = Counter(normalize(sql) for sql in runs[smallest])
+    after = Counter(normalize(sql) for sql in runs[largest])
+    counts = ", ".join(f"{len(runs[size])} at {size} days" for size in sorted(runs))
+    lines = [f"{label}: query count changes with data ({counts}). Statements that changed:"]
+    for sql, count in (after - before).most_common():
+        lines.append(f"  {before[sql]} -> {before[sql] + count}x  {sql}")
+    for sql, count in (before - after).most_common():
+        lines.append(f"  {before[sql]} -> {before[sql] - count}x  {sql}")
+    return "\n".join(lines)
+
+
+@override_settings(
+    FOOD_SEARCH_LOCAL=True,
+    FDC_SEARCH_DEADLINE=0.5,
+    # The hash's fixed cost is not what the budgets are about.
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "search": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "perf-search"},
+    },
+)
+class QueryCountGuardTests(TestCase):
+    """
+    Every URL in catalog/urls.py, requested against profiles with
+    SIZES days of history. A view whose query count changes with the
+    size (an N+1) fails with the SQL that grew, and a view slower than
+    its budget at the largest size fails with its time.
+    """
+
+    def setUp(self):
+        self.fdc = StubFDCServer()
+        self.addCleanup(self.fdc.close)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(FDC_API_URL=self.fdc.url, MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+        self.anonymous = Client()
+
+    def seed(self, size):
+        # Same rng seed each size, so the food catalog is the same.
+        data = synthetic_data.seed(random.Random(0), f"perf{size}_", users=1, foods=30,
+                                   days=size, itemsPerDay=ITEMS_PER_DAY)
+        profile = data.profiles[0]
+        user = profile.user
+        user.set_password(PASSWORD)
+        user.is_staff = True  # for api_cache_stats
+        user.save()
+        return SimpleNamespace(
+            size=size,
+            user=user,
+            foods=data.foods,
+            food=data.foods[0],
+            logItems=list(LogItem.objects.filter(profile=profile).order_by("-date")[:6]),
+            logImport=LogImport.objects.create(profile=profile, upload="log_imports/perf.csv"),
+        )
+
+    def request(self, case, fixture):
+        """Run one case; returns (response, [sql], milliseconds)."""
+        # Reusing clients matters: a new one builds the middleware stack
+        # again, and WhiteNoise re-indexes every static file.
+        if case.anonymous:
+            client = self.anonymous
+            client.cookies.clear()
+        else:
+            client = self.client
+            client.force_login(fixture.user)
+        kwargs = {}
+        if case.body and case.json:
+            kwargs = {"data": json.dumps(case.body(fixture)), "content_type": "application/json"}
+        elif case.body:
+            kwargs = {"data": case.body(fixture)}
+        for alias in ("default", "search"):
+            caches[alias].clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, case.method)(case.url(fixture), **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        return response, [query["sql"] for query in queries.captured_queries], elapsed
+
+    def test_every_url_is_covered(self):
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        self.assertEqual(names - {case.name for case in CASES}, set())
+
+    def test_query_counts_and_budgets(self):
+        runs = {}  # case index -> {size: [sql]}
+        timings = {}  # case index -> ms at the largest size
+        for size in SIZES:
+            fixture = self.seed(size)
+            for i, case in enumerate(CASES):
+                response, queries, elapsed = self.request(case, fixture)
+                self.assertEqual(response.status_code, case.status, f"{case.label()} at {size} days")
+                runs.setdefault(i, {})[size] = queries
+                timings[i] = elapsed
+            synthetic_data.cleanup(f"perf{size}_")
+
+        for i, case in enumerate(CASES):
+            with self.subTest(case.label()):
+                counts = {len(queries) for queries in runs[i].values()}
+                self.assertEqual(len(counts), 1, growth_report(case.label(), runs[i]))
+                budget = case.budgetMs * BUDGET_SCALE
+                self.assertLess(timings[i], budget,
+                                f"{case.label()} took {timings[i]:.0f} ms at {max(SIZES)} days, "
+                                f"budget {budget:.0f} ms")
+
+
+# Admin pages and query strings (given the size's fixture) whose query
+# counts must not change with the number of rows.
+ADMIN_CASES = [
+    ("logitem changelist", lambda f: reverse("admin:catalog_logitem_changelist")),
+    ("logitem by year", lambda f: reverse("admin:catalog_logitem_changelist")
+     + f"?date__year={timezone.localdate().year}"),
+    ("logitem by username", lambda f: reverse("admin:catalog_logitem_changelist")
+     + f"?q={f.profile.user.username}"),
+    ("logitem change", lambda f: reverse("admin:catalog_logitem_change", args=[f.logItem.id])),
+    ("profile changelist", lambda f: reverse("admin:catalog_profile_changelist")),
+    ("profile by username", lambda f: reverse("admin:catalog_profile_changelist")
+     + f"?q={f.profile.user.username}"),
+    ("profile change", lambda f: reverse("admin:catalog_profile_change", args=[f.profile.id])),
+    ("fooditem changelist", lambda f: reverse("admin:catalog_fooditem_changelist")),
+    ("fooditem by name", lambda f: reverse("admin:catalog_fooditem_changelist") + "?q=chicken"),
+    ("fooditem by fdcId", lambda f: reverse("admin:catalog_fooditem_changelist")
+     + f"?q={f.food.fdcId}"),
+]
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class AdminQueryCountTests(TestCase):
+    """
+    The LogItem, Profile and FoodItem admin pages at growing row counts,
+    past a full changelist page at the largest. A page whose query count
+    changes with the size fails with the SQL that grew.
+    """
+
+    SIZES = ((2, 5, 3), (6, 60, 20))  # (users, foods, days)
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser("perf_admin", "admin@example.com", PASSWORD)
+        self.client.force_login(self.admin)
+
+    def seed(self, size):
+        users, foods, days = size
+        data = synthetic_data.seed(random.Random(0), f"admin{users}_", users=users, foods=foods,
+                                   days=days, itemsPerDay=ITEMS_PER_DAY)
+        return SimpleNamespace(profile=data.profiles[-1], food=data.foods[-1],
+                               logItem=LogItem.objects.filter(profile=data.profiles[-1]).first())
+
+    def test_changelist_query_counts(self):
+        runs = {}  # label -> {logItems: [sql]}
+        for size in self.SIZES:
+            fixture = self.seed(size)
+            rows = LogItem.objects.count()
+            for label, path in ADMIN_CASES:
+                ContentType.objects.clear_cache()  # warmed by the first run otherwise
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path(fixture))
+                self.assertEqual(response.status_code, 200, f"{label} at {rows} log items")
+                runs.setdefault(label, {})[rows] = [query["sql"] for query in queries.captured_queries]
+            synthetic_data.cleanup(f"admin{size[0]}_")
+        self.assertGreater(max(runs[ADMIN_CASES[0][0]]), 100)  # more than one page
+
+        for label, _ in ADMIN_CASES:
+            with self.subTest(label):
+                counts = {len(queries) for queries in runs[label].values()}
+                self.assertEqual(len(counts), 1, growth_report(label, runs[label]).replace("days", "log items"))
+
+    def test_searches_filter(self):
+        fixture = self.seed(self.SIZES[0])
+        response = self.client.get(reverse("admin:catalog_logitem_changelist"),
+                                   {"q": fixture.profile.user.username})
+        self.assertEqual({item.profile for item in response.context["cl"].result_list}, {fixture.profile})
+        response = self.client.get(reverse("admin:catalog_fooditem_changelist"), {"q": fixture.food.fdcId})
+        self.assertEqual(list(response.context["cl"].result_list), [fixture.food])
+        word = fixture.food.foodName.split()[-2]
+        response = self.client.get(reverse("admin:catalog_fooditem_changelist"), {"q": word})
+        names = [food.foodName for food in response.context["cl"].result_list]
+        self.assertIn(fixture.food.foodName, names)
+        self.assertTrue(all(word in name for name in names))
@@ -1,3 +1,1452 @@
-from django.test import TestCase
+import asyncio
+import copy
+import csv
+import json
+import multiprocessing
+import random
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DailyNutrientTotal, FoodItem, Job, LogImport, LogItem, Profile
+from . import views
+from .static import dashboard_cache, jobs, metrics, search_cache, synthetic_data, timing
+from .forms import ProfileForm
+from .static.fdc_client import get_breaker, reset_client
+from .static.foodSearch import get_food_data, parse_search_results, search_local_foods, upsert_food_items
+from .static.log_import import import_logs as import_history, run_log_import
+from .static.nutrient_functions import (
+    day_bounds,
+    decode_log_cursor,
+    encode_log_cursor,
+    get_dashboard_gauges,
+    get_dv_avg,
+    get_dv_windows,
+    get_log_page,
+    get_nutrient_totals,
+    get_personal_ranges,
+    log_day,
+    nutrient_fields,
+    nutrient_ranges,
+    personalize,
+    refresh_daily_totals,
+)
+from .static.trends import get_trends, rolling_mean, streaks
+
+
+def setUpModule():
+    # Requests made by any test count in metrics; keep them out of the
+    # real METRICS_DIR, which a running server may be serving.
+    metricsDir = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(metricsDir.cleanup)
+    overrides = override_settings(METRICS_DIR=metricsDir.name)
+    overrides.enable()
+    unittest.addModuleCleanup(overrides.disable)
+
+
+def tearDownModule():
+    metrics.reset()
+
+
+def make_profile(username="tester", **kwargs):
+    user = User.objects.create_user(username=username, password="password123")
+    defaults = {"age": 30, "height": 180, "weight": 80}
+    defaults.update(kwargs)
+    return Profile.objects.create(user=user, **defaults)
+
+
+def make_food(fdcId, **fields):
+    fields.setdefault("foodName", f"Food {fdcId}")
+    return FoodItem.objects.create(fdcId=fdcId, **fields)
+
+
+def fdc_food(fdcId, description="Apple", calories=52):
+    return {
+        "fdcId": fdcId,
+        "description": description,
+        "foodCategory": "Fruits",
+        "foodNutrients": [{"nutrientName": "Energy", "value": calories}],
+    }
+
+
+class StubFDCServer:
+    """Local stand-in for FoodData Central serving canned responses in order."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                status, body, delay, headers = stub.responses.pop(0) if stub.responses else (200, {"foods": []}, 0, {})
+                time.sleep(delay)
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up (timeout tests)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, status=200, body=None, delay=0, headers=None):
+        self.responses.append((status, body if body is not None else {"foods": []}, delay, headers or {}))
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubFDCMixin:
+    def setUp(self):
+        super().setUp()
+        self.fdc = StubFDCServer()
+        self.addCleanup(self.fdc.close)
+        overrides = override_settings(
+            FDC_API_URL=self.fdc.url,
+            FDC_RETRY_BACKOFF=0,
+            FDC_READ_TIMEOUT=0.5,
+            FDC_BREAKER_THRESHOLD=2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+
+
+class FDCClientTests(StubFDCMixin, TestCase):
+    def test_search_saves_food_items(self):
+        self.fdc.respond(body={"foods": [fdc_food(11), fdc_food(12, "Pear", 57)]})
+        foods = get_food_data("apple pie & cream")
+
+        self.assertEqual([food.fdcId for food in foods], [11, 12])
+        self.assertEqual(FoodItem.objects.get(fdcId=12).calories, 57)
+        self.assertIn("query=apple+pie+%26+cream", self.fdc.requests[0])
+
+    def test_retries_server_errors(self):
+        self.fdc.respond(status=503)
+        self.fdc.respond(body={"foods": [fdc_food(11)]})
+        self.assertEqual(len(get_food_data("apple")), 1)
+        self.assertEqual(len(self.fdc.requests), 2)
+
+    def test_retries_stop_at_deadline(self):
+        # Each attempt times out after FDC_READ_TIMEOUT=0.5; the second is cut short.
+        for _ in range(3):
+            self.fdc.respond(delay=1)
+        with override_settings(FDC_DEADLINE=0.7), self.assertLogs("catalog.static.foodSearch", "ERROR"):
+            started = time.monotonic()
+            self.assertIsNone(get_food_data("apple"))
+        self.assertLess(time.monotonic() - started, 0.95)
+        self.assertEqual(len(self.fdc.requests), 2)
+
+    def test_ignores_retry_after(self):
+        self.fdc.respond(status=429, headers={"Retry-After": "120"})
+        self.fdc.respond(body={"foods": [fdc_food(11)]})
+        started = time.monotonic()
+        self.assertEqual(len(get_food_data("apple")), 1)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_read_timeout(self):
+        self.fdc.respond(delay=1)
+        with override_settings(FDC_RETRIES=0), self.assertLogs("catalog.static.foodSearch", "ERROR"):
+            reset_client()
+            self.assertIsNone(get_food_data("apple"))
+
+    def test_circuit_opens_after_failures(self):
+        with override_settings(FDC_RETRIES=0), self.assertLogs("catalog.static", "WARNING"):
+            reset_client()
+            for _ in range(4):
+                self.fdc.respond(status=500)
+            self.assertIsNone(get_food_data("apple"))
+            self.assertIsNone(get_food_data("apple"))
+            self.assertIsNone(get_food_data("apple"))
+            self.assertEqual(len(self.fdc.requests), 2)
+
+            get_breaker().opened_at -= 60
+            self.fdc.responses.clear()
+            self.fdc.respond(body={"foods": [fdc_food(11)]})
+            self.assertEqual(len(get_food_data("apple")), 1)
+
+
+class ServerTimingTests(StubFDCMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches["default"].clear()
+        make_profile()
+        self.client.login(username="tester", password="password123")
+
+    def test_header_and_log_line(self):
+        with self.assertLogs("catalog.timing", "INFO") as logs:
+            response = self.client.get(reverse("index"))
+        metrics = dict(metric.split(";", 1)[0:2] for metric in response["Server-Timing"].split(", "))
+        self.assertEqual(set(metrics), {"db", "agg", "render", "total"})
+        self.assertIn('desc="Templates (1)"', metrics["render"])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["path"], "/")
+        self.assertGreater(line["db_count"], 2)
+        self.assertGreaterEqual(line["total_ms"], line["render_ms"])
+
+    def test_fdc_calls_are_timed(self):
+        self.fdc.respond(body={"foods": [fdc_food(11)]})
+        token = timing.start_request()
+        get_food_data("apple")
+        timer = timing.end_request(token)
+        self.assertEqual(timer.spans["fdc"][1], 1)
+        self.assertIn("db", timer.spans)
+
+    def test_sampling_and_header_switch(self):
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=0):
+            self.assertNotIn("Server-Timing", self.client.get(reverse("index")))
+        with override_settings(SERVER_TIMING_HEADER=False), self.assertLogs("catalog.timing", "INFO"):
+            self.assertNotIn("Server-Timing", self.client.get(reverse("index")))
+
+
+def with_temp_dir(test, overrides):
+    """
+    Apply overrides(path) to a TestCase class, where path is a temporary
+    directory removed once the class has run.
+    """
+    tempdir = tempfile.TemporaryDirectory()
+    test = overrides(tempdir.name)(test)
+    setUpClass = test.setUpClass.__func__
+
+    def setUpClassWithTempDir(cls):
+        cls.addClassCleanup(tempdir.cleanup)
+        setUpClass(cls)
+
+    test.setUpClass = classmethod(setUpClassWithTempDir)
+    return test
+
+
+def temp_search_cache(test):
+    """Point the search cache at a throwaway directory for these tests."""
+    return with_temp_dir(test, lambda location: override_settings(CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "search": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+    }))
+
+
+def temp_metrics_dir(test):
+    """Give these tests their own empty METRICS_DIR."""
+    return with_temp_dir(test, lambda location: override_settings(METRICS_DIR=location))
+
+
+@temp_search_cache
+@override_settings(FDC_SEARCH_DEADLINE=0.1)
+class SearchAsyncTests(StubFDCMixin, TransactionTestCase):
+    # Background upserts run on another thread, which must see committed rows.
+
+    def setUp(self):
+        super().setUp()
+        caches["search"].clear()
+        self.profile = make_profile()
+        make_food(500, foodName="Local: Apple crumble")
+
+    async def search(self, query):
+        await self.async_client.aforce_login(await sync_to_async(lambda: self.profile.user)())
+        response = await self.async_client.get("/search/async/", {"q": query})
+        return [food.fdcId for food in response.context["page_obj"].object_list]
+
+    async def test_merges_remote_and_local_hits(self):
+        self.fdc.respond(body={"foods": [fdc_food(11), fdc_food(12, "Apple pie")]})
+        with override_settings(FDC_SEARCH_DEADLINE=5):
+            self.assertEqual(await self.search("apple"), [11, 12, 500])
+
+    async def test_invalid_json_is_an_fdc_failure(self):
+        self.fdc.respond(body=b"<html>Service Unavailable</html>")
+        with override_settings(FDC_SEARCH_DEADLINE=5), self.assertLogs("catalog.static.foodSearch", "ERROR"):
+            self.assertEqual(await self.search("apple"), [500])
+        self.assertEqual(get_breaker().failures, 1)
+
+    async def test_serves_local_hits_past_deadline(self):
+        self.fdc.respond(body={"foods": [fdc_food(11)]}, delay=0.35)
+        started = time.monotonic()
+        self.assertEqual(await self.search("apple"), [500])
+        self.assertLess(time.monotonic() - started, 0.3)
+
+        # The remote search finishes in the background and fills the cache.
+        await asyncio.gather(*views._background_searches)
+        self.assertEqual(await self.search("apple"), [11])
+
+
+@temp_search_cache
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        caches["search"].clear()
+        self.calls = []
+
+    def fetch(self, result):
+        def fetch(query):
+            self.calls.append(query)
+            return result
+        return fetch
+
+    def test_normalized_keys_cache_fdc_ids(self):
+        foods = [make_food(2), make_food(1)]
+        self.assertEqual(search_cache.cached_search("Apple  Pie!", self.fetch(foods)), foods)
+        self.assertEqual(search_cache.cached_search("apple pie", self.fetch(foods)), foods)
+
+        self.assertEqual(self.calls, ["Apple  Pie!"])
+        self.assertEqual(caches["search"].get(search_cache.cache_key("APPLE pie")), [2, 1])
+
+    def test_negative_results_are_cached(self):
+        self.assertEqual(search_cache.cached_search("xyzzy", self.fetch([])), [])
+        self.assertEqual(search_cache.cached_search("xyzzy", self.fetch([])), [])
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failures_are_not_cached(self):
+        self.assertEqual(search_cache.cached_search("apple", self.fetch(None)), [])
+        self.assertEqual(search_cache.cached_search("apple", self.fetch(None)), [])
+        self.assertEqual(len(self.calls), 2)
+
+
+@temp_search_cache
+class SearchCacheSingleFlightTests(TransactionTestCase):
+    def test_concurrent_misses_fetch_once(self):
+        caches["search"].clear()
+        food = make_food(1)
+        calls = []
+
+        def slow_fetch(query):
+            calls.append(query)
+            time.sleep(0.3)
+            return [food]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(search_cache.cached_search("apple", slow_fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([[f.fdcId for f in result] for result in results], [[1]] * 5)
+
+
+@temp_search_cache
+class SearchCacheLockTests(TestCase):
+    def test_file_lock_is_exclusive(self):
+        key = search_cache.cache_key("apple")
+        self.assertTrue(search_cache.acquire_lock(key, "a"))
+        self.assertFalse(search_cache.acquire_lock(key, "b"))
+        search_cache.release_lock(key, "b")  # not the holder
+        self.assertFalse(search_cache.acquire_lock(key, "b"))
+        search_cache.release_lock(key, "a")
+        self.assertTrue(search_cache.acquire_lock(key, "b"))
+
+    def test_stale_file_lock_is_broken(self):
+        key = search_cache.cache_key("pear")
+        self.assertTrue(search_cache.acquire_lock(key, "a"))
+        stale = time.time() - settings.SEARCH_CACHE_LOCK_TIMEOUT - 1
+        os.utime(search_cache.lock_path(key), (stale, stale))
+        self.assertTrue(search_cache.acquire_lock(key, "b"))
+
+    def test_lock_outlives_slowest_fetch(self):
+        self.assertGreater(settings.SEARCH_CACHE_LOCK_TIMEOUT, settings.FDC_DEADLINE)
+
+
+class UpsertFoodItemsTests(TestCase):
+    def foods(self, calories=52):
+        return [
+            FoodItem(foodName=f"Food {i}", fdcId=i, calories=calories, protein=i)
+            for i in range(1, 31)
+        ]
+
+    def test_single_write_per_search(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = upsert_food_items(self.foods())
+        self.assertEqual(stats, {"inserted": 30, "updated": 0, "unchanged": 0})
+        self.assertEqual(FoodItem.objects.count(), 30)
+        writes = [q for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+        self.assertEqual(len(writes), 1)
+
+        with self.assertNumQueries(1):
+            stats = upsert_food_items(self.foods())
+        self.assertEqual(stats, {"inserted": 0, "updated": 0, "unchanged": 30})
+
+    def test_refreshes_changed_nutrients(self):
+        upsert_food_items(self.foods())
+        profile = make_profile()
+        date = timezone.now() - timedelta(days=2)
+        LogItem.objects.create(profile=profile, foodItem=FoodItem.objects.get(fdcId=1), date=date)
+        LogItem.objects.create(profile=profile, foodItem=FoodItem.objects.get(fdcId=1), date=date - timedelta(days=3))
+
+        foods = self.foods() + [FoodItem(foodName="New", fdcId=99)]
+        foods[0].calories = 80
+        stats = upsert_food_items(foods)
+
+        self.assertEqual(stats, {"inserted": 1, "updated": 1, "unchanged": 29})
+        self.assertEqual(FoodItem.objects.get(fdcId=1).calories, 80)
+        # The rollups are refreshed by a background job, not the search.
+        self.assertEqual(DailyNutrientTotal.objects.filter(profile=profile, calories=52).count(), 2)
+        [claimed] = jobs.claim_jobs("w1")
+        self.assertEqual(claimed.name, "refresh_food_rollups")
+        with self.assertNumQueries(8):  # one refresh_daily_totals() for both days
+            self.assertEqual(jobs.run_job(claimed), "done")
+        self.assertEqual(DailyNutrientTotal.objects.filter(profile=profile, calories=80).count(), 2)
+
+
+class ImportFDCTests(TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.dir = Path(tempdir.name)
+
+    def bulk_food(self, fdcId, kcal):
+        return {
+            "fdcId": fdcId,
+            "description": f"Cereal {fdcId}",
+            "brandOwner": "Acme",
+            "foodNutrients": [
+                {"nutrient": {"name": "Energy", "unitName": "kJ"}, "amount": kcal * 4.184},
+                {"nutrient": {"name": "Energy", "unitName": "kcal"}, "amount": kcal},
+                {"nutrient": {"name": "Protein", "unitName": "g"}, "amount": 3},
+            ],
+        }
+
+    def test_json_import_resumes_from_checkpoint(self):
+        source = self.dir / "branded.json"
+        source.write_text(json.dumps({"BrandedFoods": [self.bulk_food(i, 100 + i) for i in range(1, 8)]}))
+        checkpoint = Path(f"{source.resolve()}.checkpoint")
+        checkpoint.write_text(json.dumps({"source": str(source.resolve()), "done": {"json": 5}}))
+
+        call_command("import_fdc", str(source), "--batch-size", "2", stdout=StringIO())
+
+        self.assertEqual(sorted(FoodItem.objects.values_list("fdcId", flat=True)), [6, 7])
+        food = FoodItem.objects.get(fdcId=7)
+        self.assertEqual(food.foodName, "Acme: Cereal 7")
+        self.assertEqual(food.calories, 107)
+        self.assertEqual(food.protein, 3)
+        self.assertFalse(checkpoint.exists())
+
+    def test_csv_import(self):
+        (self.dir / "nutrient.csv").write_text(
+            'id,name,unit_name\n1008,Energy,KCAL\n1062,Energy,kJ\n1003,Protein,G\n')
+        (self.dir / "food_category.csv").write_text('id,code,description\n9,0900,Fruits\n')
+        (self.dir / "food.csv").write_text(
+            'fdc_id,data_type,description,food_category_id\n1,foundation,Apple,9\n2,foundation,Pear,9\n')
+        (self.dir / "food_nutrient.csv").write_text(
+            'id,fdc_id,nutrient_id,amount\n1,1,1008,52\n2,1,1062,218\n3,2,1003,0.4\n4,1,1003,0.3\n')
+
+        call_command("import_fdc", str(self.dir), "--batch-size", "1", stdout=StringIO())
+
+        apple = FoodItem.objects.get(fdcId=1)
+        self.assertEqual(apple.foodName, "Fruits: Apple")
+        self.assertEqual((apple.calories, apple.protein), (52, 0.3))
+        self.assertEqual(FoodItem.objects.get(fdcId=2).protein, 0.4)
+
+
+class SearchLocalFoodsTests(TestCase):
+    def setUp(self):
+        for i, name in enumerate([
+            "Acme: Chicken breast, grilled",
+            "Acme: Chicken noodle soup",
+            "Farm: Breaded chicken breast",
+            "Farm: Strawberry yogurt",
+        ], start=1):
+            make_food(i, foodName=name)
+
+    def names(self, query):
+        return [food.foodName for food in search_local_foods(query)]
+
+    def test_prefix_match_on_every_word(self):
+        self.assertEqual(
+            sorted(self.names("chick bre")),
+            ["Acme: Chicken breast, grilled", "Farm: Breaded chicken breast"],
+        )
+        self.assertEqual(self.names("yog"), ["Farm: Strawberry yogurt"])
+        self.assertEqual(self.names("?!"), [])
+
+    def test_substring_fallback(self):
+        self.assertEqual(self.names("berry"), ["Farm: Strawberry yogurt"])
+
+    @override_settings(FOOD_SEARCH_LOCAL=True)
+    def test_search_view_paginates_in_sql(self):
+        for i in range(10, 30):
+            make_food(i, foodName=f"Chicken wrap {i}")
+        make_profile()
+        self.client.login(username="tester", password="password123")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/search/", {"q": "chicken", "page": 2})
+
+        page = response.context["page_obj"]
+        self.assertEqual(page.paginator.count, 23)
+        self.assertEqual(len(page.object_list), 6)
+        self.assertTrue(any("LIMIT 6 OFFSET 6" in q["sql"] for q in queries))
+
+
+class GetDvAvgTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=7)
+
+    def log(self, food, percent=1, days_ago=1):
+        return LogItem.objects.create(
+            profile=self.profile,
+            foodItem=food,
+            percentConsumed=percent,
+            date=self.end - timedelta(days=days_ago),
+        )
+
+    def test_weighted_average(self):
+        bread = make_food(1, calories=200, protein=7, sodium=400)
+        milk = make_food(2, calories=100, protein=8, calcium=300)
+        self.log(bread, percent=2)
+        self.log(milk, percent=0.5)
+        self.log(bread, percent=1, days_ago=30)  # outside the window
+
+        results = get_dv_avg(self.start, self.end, self.profile.id)
+
+        self.assertEqual(set(results), set(nutrient_fields))
+        self.assertAlmostEqual(results["calories"]["value"], (400 + 50) / 7)
+        self.assertAlmostEqual(results["protein"]["value"], (14 + 4) / 7)
+        self.assertAlmostEqual(results["sodium"]["value"], 800 / 7)
+        self.assertAlmostEqual(results["calcium"]["value"], 150 / 7)
+        self.assertEqual(results["fat"]["value"], 0)
+
+    def test_no_log_items(self):
+        results = get_dv_avg(self.start, self.end, self.profile.id)
+        for field in nutrient_fields:
+            self.assertEqual(results[field]["value"], 0)
+
+    def test_query_count_is_constant(self):
+        food = make_food(1, calories=100)
+        self.log(food)
+        with self.assertNumQueries(3):
+            get_dv_avg(self.start, self.end, self.profile.id)
+
+        for i in range(2, 52):
+            self.log(make_food(i, calories=i), days_ago=i % 7)
+        with self.assertNumQueries(3):
+            get_dv_avg(self.start, self.end, self.profile.id)
+
+    def test_matches_log_item_totals(self):
+        for i in range(1, 40):
+            self.log(make_food(i, calories=10 * i, iron=i), percent=i % 3, days_ago=i / 4)
+
+        results = get_dv_avg(self.start, self.end, self.profile.id)
+        expected = get_nutrient_totals(LogItem.objects.filter(
+            profile=self.profile, date__gte=self.start, date__lte=self.end
+        ))
+        for field in nutrient_fields:
+            self.assertAlmostEqual(results[field]["value"], expected[field] / 7)
+
+
+class DashboardGaugesTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.profile = make_profile()
+        self.client.login(username="tester", password="password123")
+        food = make_food(1, calories=700, protein=14)
+        LogItem.objects.create(profile=self.profile, foodItem=food, date=timezone.now() - timedelta(hours=1))
+        LogItem.objects.create(profile=self.profile, foodItem=food, date=timezone.now() - timedelta(days=3))
+
+    def test_payload(self):
+        gauges = get_dashboard_gauges(self.profile)
+        calories = gauges["names"].index("calories")
+        self.assertEqual(gauges["names"], nutrient_fields)
+        self.assertEqual(set(gauges["windows"]), {"daily", "weekly", "monthly", "quarterly"})
+        self.assertEqual(gauges["windows"]["daily"][calories], 700)
+        self.assertEqual(gauges["windows"]["weekly"][calories], 200)
+        self.assertEqual(len(gauges["maxRange"]), len(nutrient_fields))
+
+    def test_index_embeds_one_payload(self):
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'id="gauge-data"', count=1)
+        self.assertNotContains(response, "Plotly.newPlot")
+        self.assertContains(response, "data-gauge-window", count=4)
+        self.assertEqual(response.context["gauges"], get_dashboard_gauges(self.profile))
+
+    def test_windows_match_get_dv_avg(self):
+        now = timezone.now()
+        for i in range(1, 60):
+            LogItem.objects.create(profile=self.profile, foodItem=make_food(100 + i, calories=i, iron=i / 3),
+                                   percentConsumed=i % 4, date=now - timedelta(hours=37 * i))
+
+        windows = get_dv_windows(self.profile, (1, 7, 30, 90), now)
+        for days, results in windows.items():
+            expected = get_dv_avg(now - timedelta(days=days), now, self.profile.id)
+            for field in nutrient_fields:
+                self.assertAlmostEqual(results[field]["value"], expected[field]["value"], msg=(days, field))
+                self.assertEqual(results[field]["maxIn"], expected[field]["maxIn"])
+
+    def test_more_windows_cost_no_queries(self):
+        get_dv_windows(self.profile, (1,))
+        with CaptureQueriesContext(connection) as one:
+            get_dv_windows(self.profile, (1,))
+        with CaptureQueriesContext(connection) as many:
+            get_dv_windows(self.profile, (1, 7, 30, 90, 365))
+        self.assertEqual(len(one), 2)
+        self.assertEqual(len(many), 2)
+
+    def test_api_matches_dashboard(self):
+        response = self.client.get(reverse("api_gauges"))
+        self.assertEqual(response.json(), get_dashboard_gauges(self.profile))
+
+
+@temp_metrics_dir
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        metrics.reset()
+        self.profile = make_profile()
+        self.client.login(username="tester", password="password123")
+        self.food = make_food(1, calories=700)
+        self.logItem = LogItem.objects.create(profile=self.profile, foodItem=self.food,
+                                              date=timezone.now() - timedelta(hours=1))
+        self.calories = nutrient_fields.index("calories")
+
+    def daily_calories(self):
+        response = self.client.get(reverse("index"))
+        return response.context["gauges"]["windows"]["daily"][self.calories]
+
+    def test_repeat_views_hit(self):
+        profile = Profile.objects.get(id=self.profile.id)
+        dashboard_cache.get_gauges(profile)
+        with self.assertNumQueries(0):
+            dashboard_cache.get_gauges(profile)
+        self.assertEqual(dashboard_cache.cache_stats(), {"hits": 1, "misses": 1, "hitRatio": 0.5})
+
+    def test_log_writes_invalidate(self):
+        self.assertEqual(self.daily_calories(), 700)
+        self.client.post(reverse("update_percent", args=[self.logItem.id]), {"percentConsumed": 2})
+        self.assertEqual(self.daily_calories(), 1400)
+        date = timezone.localtime(timezone.now() - timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M")
+        self.client.post(reverse("save_logItem", args=[1]), {"date": date, "percentConsumed": 1})
+        self.assertEqual(self.daily_calories(), 2100)
+        self.logItem.delete()
+        self.assertEqual(self.daily_calories(), 700)
+        self.assertEqual(dashboard_cache.cache_stats()["hits"], 0)
+
+    def test_entries_expire_with_their_bucket(self):
+        profile = Profile.objects.get(id=self.profile.id)
+        now = timezone.now()
+        bucketStart = now - timedelta(seconds=now.timestamp() % 300)
+        with override_settings(DASHBOARD_CACHE_BUCKET=300):
+            for seconds in (0, 299, 300):
+                dashboard_cache.get_gauges(profile, bucketStart + timedelta(seconds=seconds))
+        self.assertEqual(dashboard_cache.cache_stats()["misses"], 2)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse("api_cache_stats")).status_code, 403)
+        User.objects.filter(username="tester").update(is_staff=True)
+        self.client.get(reverse("index"))
+        self.assertEqual(self.client.get(reverse("api_cache_stats")).json()["dashboard"]["misses"], 1)
+
+
+@temp_search_cache
+@temp_metrics_dir
+class MetricsTests(TestCase):
+    def setUp(self):
+        caches["search"].clear()
+        metrics.reset()
+
+    def scrape(self, **headers):
+        response = self.client.get("/metrics", **headers)
+        return response.status_code, response.content.decode()
+
+    def test_requests_by_view(self):
+        make_profile()
+        self.client.login(username="tester", password="password123")
+        self.client.get(reverse("index"))
+        self.client.get(reverse("index"))
+        self.client.get("/no/such/page/")
+
+        status, text = self.scrape()
+        self.assertEqual(status, 200)
+        self.assertIn('healthtracker_http_requests_total{view="index",method="GET",status="200"} 2', text)
+        self.assertIn('healthtracker_http_requests_total{view="unmatched",method="GET",status="404"} 1', text)
+        self.assertIn('healthtracker_http_request_duration_seconds_bucket{view="index",le="+Inf"} 2', text)
+        self.assertIn('healthtracker_nutrient_aggregation_duration_seconds_count{function="get_dv_windows"} 1', text)
+        self.assertIn('healthtracker_dashboard_cache_requests_total{result="hit"} 1', text)
+        self.assertIn("# TYPE healthtracker_fdc_search_duration_seconds histogram", text)
+
+    def test_search_cache_results(self):
+        fetch = lambda query: [make_food(1)]  # noqa: E731
+        search_cache.cached_search("apple", fetch)
+        search_cache.cached_search("Apple!", fetch)
+        self.assertEqual(metrics.search_cache_requests.values(), {("miss",): 1, ("hit",): 1})
+
+    def test_adds_up_every_process(self):
+        metrics.log_items_created.inc(2, via="api")
+        context = multiprocessing.get_context("fork")
+        child = context.Process(target=fork_and_count)
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+
+        self.assertEqual(metrics.log_items_created.values(), {("api",): 7})
+        self.assertIn('healthtracker_log_items_created_total{via="api"} 7', self.scrape()[1])
+
+    def test_token(self):
+        with override_settings(METRICS_TOKEN="s3cret"):
+            self.assertEqual(self.scrape()[0], 401)
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer s3cret")[0], 200)
+        with override_settings(METRICS_TOKEN="", METRICS_REQUIRE_TOKEN=True):
+            self.assertEqual(self.scrape()[0], 404)
+
+    def test_clear_files(self):
+        metrics.log_items_created.inc(via="api")
+        metrics.store.flush()
+        self.assertTrue(list(Path(settings.METRICS_DIR).glob("*.json")))
+        metrics.clear_files()
+        self.assertEqual(list(Path(settings.METRICS_DIR).glob("*.json")), [])
+
+
+def fork_and_count():
+    # A forked worker starts from zero, not from its parent's counts.
+    metrics.log_items_created.inc(5, via="api")
+    metrics.store.flush()
+
+
+class TrendsTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.client.login(username="tester", password="password123")
+        self.today = timezone.localdate()
+        self.food = make_food(1, calories=1000, protein=10)
+
+    def log(self, days_ago, percent=1):
+        start = day_bounds(self.today - timedelta(days=days_ago))[0]
+        LogItem.objects.create(profile=self.profile, foodItem=self.food,
+                               percentConsumed=percent, date=start + timedelta(hours=10))
+
+    def test_rolling_mean_and_streaks(self):
+        self.assertEqual(rolling_mean([3, 6, 9, 0], 2), [3, 4.5, 7.5, 4.5])
+        self.assertEqual(streaks([1, 5, 5, 0, 5, 5, 5, 4], 4, 5), (4, 4))
+        self.assertEqual(streaks([5, 5, 9], 4, 5), (0, 2))
+
+    def test_trends(self):
+        self.log(3, percent=2)
+        self.log(1)
+        self.log(1)
+        self.log(0)
+        with self.assertNumQueries(1):
+            trends = get_trends(self.profile, self.today - timedelta(days=1), self.today, window=3)
+
+        calories = trends["nutrients"]["calories"]
+        self.assertEqual(trends["days"], [(self.today - timedelta(days=1)).isoformat(), self.today.isoformat()])
+        self.assertEqual(calories["totals"], [2000, 1000])
+        # Yesterday's average reaches back before start to the log 3 days ago.
+        self.assertEqual(calories["rolling"], [round(4000 / 3, 2), 1000])
+        target = get_personal_ranges(self.profile)["calories"].target
+        self.assertEqual(calories["percentOfTarget"][1], round(100 * 1000 / target, 1))
+        self.assertEqual(trends["nutrients"]["fat"]["totals"], [0, 0])
+
+    def test_api(self):
+        self.log(0)
+        response = self.client.get(reverse("api_trends"), {"nutrients": "calories,protein", "window": 2})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(len(body["days"]), 7)
+        self.assertEqual(set(body["nutrients"]), {"calories", "protein"})
+        self.assertEqual(body["nutrients"]["protein"]["totals"][-1], 10)
+
+        self.assertEqual(self.client.get(reverse("api_trends"), {"window": 0}).status_code, 400)
+        response = self.client.get(reverse("api_trends"), {"nutrients": "calories,gold"})
+        self.assertEqual(response.json()["nutrients"], ["gold"])
+
+    def test_lead_in_stops_at_first_day(self):
+        response = self.client.get(reverse("api_trends"), {"start": "0001-01-01", "end": "0001-01-05"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["days"][0], "0001-01-01")
+        self.assertEqual(len(response.json()["days"]), 5)
+
+
+class LogHistoryTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.food = make_food(1, calories=100)
+        self.now = timezone.now()
+        self.client.login(username="tester", password="password123")
+
+    def log(self, count, date=None):
+        return [
+            LogItem.objects.create(
+                profile=self.profile, foodItem=self.food,
+                date=date or self.now - timedelta(hours=i),
+            )
+            for i in range(count)
+        ]
+
+    def test_pages_cover_history_once(self):
+        items = self.log(12)
+        items += self.log(5, date=self.now - timedelta(days=1))  # same-date ties
+        LogItem.objects.create(profile=make_profile("other"), foodItem=self.food, date=self.now)
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = get_log_page(self.profile.id, cursor=cursor, limit=5)
+            seen += page
+            if cursor is None:
+                break
+
+        expected = sorted(items, key=lambda item: (item.date, item.id), reverse=True)
+        self.assertEqual([item.id for item in seen], [item.id for item in expected])
+
+    def test_page_is_one_query(self):
+        self.log(30)
+        _, cursor = get_log_page(self.profile.id, limit=10)
+        with self.assertNumQueries(1):
+            page, _ = get_log_page(self.profile.id, cursor=cursor, limit=10)
+            [item.foodItem.foodName for item in page]
+
+    def test_cursor_keeps_microseconds(self):
+        item = self.log(1, date=self.now.replace(microsecond=999999))[0]
+        page, _ = get_log_page(self.profile.id, cursor=encode_log_cursor(item))
+        self.assertEqual(page, [])
+
+    def test_date_filter(self):
+        self.log(3)
+        old = self.log(1, date=self.now - timedelta(days=40))[0]
+        day = log_day(old.date).isoformat()
+        response = self.client.get(reverse("edit"), {"start": day, "end": day})
+        self.assertEqual(list(response.context["LogItems"]), [old])
+
+    def test_edit_query_count_is_flat(self):
+        self.log(5)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse("edit"))
+        self.log(80)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse("edit"))
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.context["LogItems"]), views.EDIT_PAGE_SIZE)
+        self.assertTrue(response.context["next_url"].startswith(reverse("edit_items") + "?cursor="))
+        self.assertContains(response, f'href="{reverse("edit")}?cursor=')
+
+    def test_fragment_endpoint(self):
+        self.log(views.EDIT_PAGE_SIZE + 3)
+        first = self.client.get(reverse("edit"))
+        response = self.client.get(first.context["next_url"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["LogItems"]), 3)
+        self.assertIsNone(response.context["next_url"])
+        self.assertNotContains(response, "<html")
+
+        self.assertEqual(self.client.get(reverse("edit_items"), {"cursor": "bogus"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("edit"), {"start": "yesterday"}).status_code, 400)
+
+    def test_out_of_range_cursor_and_dates_are_rejected(self):
+        self.assertEqual(self.client.get(reverse("edit_items"),
+                                         {"cursor": "999999999999999999999999.1"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("edit"), {"end": "9999-12-31"}).status_code, 400)
+        with self.assertRaises(ValueError):
+            decode_log_cursor("-999999999999999999999999.1")
+
+
+class APITests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.food = make_food(1234, calories=100, protein=10)
+        self.client.login(username="tester", password="password123")
+
+    def post_json(self, url, data, method="post"):
+        return getattr(self.client, method)(url, json.dumps(data), content_type="application/json")
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("api_summary"))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"], "Authentication required.")
+
+    def test_log_item_lifecycle(self):
+        date = (timezone.now() - timedelta(hours=2)).isoformat()
+        response = self.post_json(reverse("api_log_items"), {"fdcId": 1234, "date": date, "percentConsumed": 2})
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created["food"]["calories"], 100)
+        url = reverse("api_log_item", args=[created["id"]])
+
+        response = self.post_json(url, {"percentConsumed": 0.5}, method="patch")
+        self.assertEqual(response.json()["percentConsumed"], 0.5)
+        self.assertEqual(response.json()["date"], created["date"])
+
+        response = self.post_json(url, {"date": (timezone.now() + timedelta(days=1)).isoformat()}, method="patch")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("date", response.json()["errors"])
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(LogItem.objects.exists())
+
+    def test_create_rejects_unknown_food(self):
+        response = self.post_json(reverse("api_log_items"), {"fdcId": 99, "date": timezone.now().isoformat()})
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_rejects_malformed_fdc_id(self):
+        for fdcId in ("abc", [1], {"id": 1}, None):
+            with self.subTest(fdcId=fdcId):
+                response = self.post_json(reverse("api_log_items"),
+                                          {"fdcId": fdcId, "date": timezone.now().isoformat()})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("fdcId", response.json()["errors"])
+        self.assertFalse(LogItem.objects.exists())
+
+    def test_other_profiles_items_are_hidden(self):
+        other = LogItem.objects.create(profile=make_profile("other"), foodItem=self.food, date=timezone.now())
+        self.assertEqual(self.client.get(reverse("api_log_item", args=[other.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse("api_log_items")).json()["results"], [])
+
+    def test_list_pages(self):
+        now = timezone.now()
+        for hours in range(5):
+            LogItem.objects.create(profile=self.profile, foodItem=self.food, date=now - timedelta(hours=hours))
+        first = self.client.get(reverse("api_log_items"), {"limit": 3}).json()
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(first["results"]), 3)
+        self.assertEqual(len(second["results"]), 2)
+        self.assertIsNone(second["next"])
+
+    def test_food(self):
+        self.assertEqual(self.client.get(reverse("api_food", args=[1234])).json()["protein"], 10)
+        self.assertEqual(self.client.get(reverse("api_food", args=[1])).status_code, 404)
+
+    def test_summary_conditional_get(self):
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=timezone.now() - timedelta(days=1))
+        response = self.client.get(reverse("api_summary"))
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()["nutrients"]["calories"]["value"], 100 / 7)
+        self.assertIn("Last-Modified", response)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(reverse("api_summary"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse([q for q in queries if "catalog_logitem" in q["sql"] or "dailynutrienttotal" in q["sql"]])
+
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=timezone.now() - timedelta(days=2))
+        changed = self.client.get(reverse("api_summary"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(changed.status_code, 200)
+        self.assertAlmostEqual(changed.json()["nutrients"]["calories"]["value"], 200 / 7)
+
+        ProfileForm({"height": 150, "weight": 60}, instance=Profile.objects.get(id=self.profile.id)).save()
+        self.assertEqual(
+            self.client.get(reverse("api_summary"), HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 200
+        )
+
+    def test_log_meal(self):
+        make_food(5678, calories=50)
+        date = (timezone.now() - timedelta(days=1)).isoformat()
+        entries = [{"fdcId": 1234, "date": date, "percentConsumed": 2}, {"fdcId": 5678, "date": date}]
+        self.post_json(reverse("api_log_meal"), {"entries": entries})  # creates the day's rollup
+        with CaptureQueriesContext(connection) as small:
+            self.post_json(reverse("api_log_meal"), {"entries": entries})
+        with CaptureQueriesContext(connection) as large:
+            response = self.post_json(reverse("api_log_meal"), {"entries": entries * 4})
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()["results"]), 8)
+        rollup = DailyNutrientTotal.objects.get(profile=self.profile)
+        self.assertEqual(rollup.calories, 6 * (200 + 50))
+
+    def test_log_meal_reports_each_entry(self):
+        date = timezone.now().isoformat()
+        entries = [
+            {"fdcId": 1234, "date": date},
+            {"fdcId": 99, "date": date},
+            {"fdcId": 1234, "date": date, "percentConsumed": -1},
+            "not an entry",
+        ]
+        response = self.post_json(reverse("api_log_meal"), {"entries": entries})
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()["errors"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("fdcId", errors[1])
+        self.assertIn("percentConsumed", errors[2])
+        self.assertIn("date", errors[3])
+        self.assertFalse(LogItem.objects.exists())
+
+    def test_summary_rejects_bad_window(self):
+        response = self.client.get(reverse("api_summary"), {"start": "2025-02-01", "end": "2025-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range_dates_and_cursor_are_rejected(self):
+        for name, params in [
+            ("api_log_items", {"cursor": "999999999999999999999999.1"}),
+            ("api_log_items", {"end": "9999-12-31"}),
+            ("api_summary", {"end": "0001-01-02"}),
+            ("api_summary", {"start": "9999-12-30", "end": "9999-12-31"}),
+        ]:
+            with self.subTest(name=name, **params):
+                self.assertEqual(self.client.get(reverse(name), params).status_code, 400)
+        response = self.client.get(reverse("api_summary"), {"start": "0001-01-01", "end": "0001-01-02"})
+        self.assertEqual(response.status_code, 200)
+
+
+class ExportLogsTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.food = make_food(1234, foodName="Apple, raw", calories=52)
+        self.now = timezone.now()
+        for days in range(3):
+            LogItem.objects.create(profile=self.profile, foodItem=self.food,
+                                   date=self.now - timedelta(days=days), percentConsumed=days + 1)
+        LogItem.objects.create(profile=make_profile("other"), foodItem=self.food, date=self.now)
+        self.client.login(username="tester", password="password123")
+
+    def test_csv_download(self):
+        response = self.client.get(reverse("export_logs"))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0][:6], ["id", "profileId", "date", "percentConsumed", "fdcId", "foodName"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][3:6], ["3.0", "1234", "Apple, raw"])  # oldest first
+
+    def test_ndjson_date_range(self):
+        day = log_day(self.now).isoformat()
+        response = self.client.get(reverse("export_logs"), {"format": "ndjson", "start": day, "end": day})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["calories"], 52)
+        self.assertEqual(rows[0]["profileId"], self.profile.id)
+
+    def test_bad_format(self):
+        self.assertEqual(self.client.get(reverse("export_logs"), {"format": "xml"}).status_code, 400)
+
+    def test_out_of_range_end(self):
+        self.assertEqual(self.client.get(reverse("export_logs"), {"end": "9999-12-31"}).status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("export_logs", "--format", "ndjson", "--chunk-size", "1", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        with self.assertRaises(CommandError):
+            call_command("export_logs", "--start", "soon", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("export_logs", "--end", "9999-12-31", stdout=StringIO())
+
+
+HISTORY_CSV = """Date,Time,Meal,Food Name,fdcId,Servings
+2024-03-01,,Breakfast,OATMEAL,,2
+2024-03-01,19:15,Dinner,,1234,1
+2024-03-02,,,Mystery stew,,1
+not a date,,,Oatmeal,,1
+2999-01-01,,,Oatmeal,,1
+2024-03-02,,Lunch,Oatmeal,,-3
+03/02/2024,,Lunch,oatmeal,,0.5
+"""
+
+
+class ImportLogsTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.oatmeal = make_food(1, foodName="Oatmeal", calories=150)
+        self.apple = make_food(1234, foodName="Apple", calories=50)
+
+    def run_import(self, text=HISTORY_CSV, **kwargs):
+        return import_history(self.profile, BytesIO(text.encode()), **kwargs)
+
+    def test_matches_foods_and_skips_bad_rows(self):
+        stats = self.run_import(batch_size=3)
+        self.assertEqual((stats["rowsRead"], stats["rowsImported"], stats["rowsSkipped"]), (7, 3, 4))
+        self.assertEqual(len(stats["errors"]), 4)
+        self.assertIn("line 4: no food matches 'Mystery stew'", stats["errors"])
+
+        breakfast, dinner, lunch = LogItem.objects.filter(profile=self.profile).order_by("date")
+        self.assertEqual((breakfast.foodItem, breakfast.percentConsumed), (self.oatmeal, 2))
+        self.assertEqual(timezone.localtime(breakfast.date).hour, 8)
+        self.assertEqual(dinner.foodItem, self.apple)
+        self.assertEqual(timezone.localtime(dinner.date).strftime("%H:%M"), "19:15")
+        self.assertEqual(log_day(lunch.date).isoformat(), "2024-03-02")
+
+        rollups = dict(DailyNutrientTotal.objects.values_list("day", "calories"))
+        self.assertEqual({day.isoformat(): value for day, value in rollups.items()},
+                         {"2024-03-01": 350, "2024-03-02": 75})
+
+    def test_query_count_does_not_grow_with_rows(self):
+        rows = "".join(f"2024-03-0{1 + i % 2},,,Oatmeal,,1\n" for i in range(50))
+        with CaptureQueriesContext(connection) as small:
+            self.run_import("Date,Time,Meal,Food Name,fdcId,Servings\n" + rows[:40])
+        with CaptureQueriesContext(connection) as large:
+            self.run_import("Date,Time,Meal,Food Name,fdcId,Servings\n" + rows * 4)
+        self.assertEqual(len(small), len(large))
+
+    def test_requires_date_and_food_columns(self):
+        with self.assertRaises(ValueError):
+            self.run_import("Food Name,Servings\nOatmeal,1\n")
+
+    def test_rerun_after_worker_death_resumes(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with override_settings(MEDIA_ROOT=media.name):
+            logImport = LogImport.objects.create(
+                profile=self.profile, upload=SimpleUploadedFile("history.csv", HISTORY_CSV.encode()))
+            imports = LogImport.objects.filter(id=logImport.id)
+            imports.update(status="running")
+            progress = []
+
+            def die_after_first_batch(stats):
+                imports.update(**stats)
+                progress.append(stats["rowsRead"])
+                if len(progress) == 2:
+                    raise SystemExit  # the worker is killed; this batch rolls back
+
+            with logImport.upload.open("rb") as stream, self.assertRaises(SystemExit):
+                import_history(self.profile, stream, batch_size=3, on_progress=die_after_first_batch)
+            self.assertEqual(LogImport.objects.get(id=logImport.id).rowsRead, 3)
+
+            with self.assertLogs("catalog.static.log_import", "WARNING"):
+                run_log_import(logImport.id, batch_size=3)
+
+        logImport.refresh_from_db()
+        self.assertEqual(logImport.status, "done")
+        self.assertEqual((logImport.rowsRead, logImport.rowsImported, logImport.rowsSkipped), (7, 3, 4))
+        self.assertEqual(LogItem.objects.filter(profile=self.profile).count(), 3)
+        rollups = dict(DailyNutrientTotal.objects.values_list("day", "calories"))
+        self.assertEqual({day.isoformat(): value for day, value in rollups.items()},
+                         {"2024-03-01": 350, "2024-03-02": 75})
+
+        run_log_import(logImport.id)  # a late retry of the finished job
+        self.assertEqual(LogItem.objects.filter(profile=self.profile).count(), 3)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(HISTORY_CSV)
+        self.addCleanup(Path(f.name).unlink)
+        out = StringIO()
+        call_command("import_logs", f.name, "--profile", self.profile.id, stdout=out, stderr=StringIO())
+        self.assertIn("Imported 3 of 7 rows", out.getvalue())
+
+
+class ImportLogsUploadTests(TransactionTestCase):
+    # The import runs on a worker thread, which must see committed rows.
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.profile = make_profile()
+        make_food(1, foodName="Oatmeal", calories=150)
+        self.client.login(username="tester", password="password123")
+
+    def test_upload_runs_in_background(self):
+        upload = SimpleUploadedFile("history.csv", HISTORY_CSV.encode(), content_type="text/csv")
+        response = self.client.post(reverse("import_logs"), {"upload": upload})
+        self.assertRedirects(response, reverse("import_logs"))
+
+        logImport = LogImport.objects.get(profile=self.profile)
+        self.assertEqual(self.client.get(reverse("import_status", args=[logImport.id])).json()["status"], "pending")
+        call_command("run_worker", "--once", stdout=StringIO())
+
+        status = self.client.get(reverse("import_status", args=[logImport.id])).json()
+        self.assertEqual(status["status"], "done")
+        self.assertEqual(status["percent"], 100)
+        self.assertEqual((status["rowsImported"], status["rowsSkipped"]), (2, 5))
+        self.assertEqual(LogItem.objects.filter(profile=self.profile).count(), 2)
+
+    def test_rejects_other_files(self):
+        upload = SimpleUploadedFile("history.xlsx", b"PK", content_type="application/octet-stream")
+        response = self.client.post(reverse("import_logs"), {"upload": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(LogImport.objects.exists())
+
+
+@jobs.task("test_flaky")
+def flaky_task(failures, marker):
+    """Fails its first `failures` runs (counted in the cache)."""
+    runs = caches["default"].get_or_set(marker, 0)
+    caches["default"].set(marker, runs + 1)
+    if runs < failures:
+        raise RuntimeError("flaky")
+
+
+@jobs.task("test_sleep")
+def sleep_task(seconds):
+    time.sleep(seconds)
+
+
+@override_settings(JOB_RETRY_BACKOFF=0)
+class JobTests(TestCase):
+    def test_enqueue_dedupes_pending_keys(self):
+        first = jobs.enqueue("test_sleep", key="k", seconds=0)
+        self.assertEqual(jobs.enqueue("test_sleep", key="k", seconds=0), first)
+        jobs.enqueue("test_sleep", seconds=0)
+        jobs.enqueue("test_sleep", seconds=0)
+        self.assertEqual(Job.objects.count(), 3)
+
+        [claimed] = jobs.claim_jobs("w1", limit=1)
+        jobs.run_job(claimed)
+        self.assertNotEqual(jobs.enqueue("test_sleep", key="k", seconds=0), first)
+
+    def test_leases(self):
+        later = jobs.enqueue("test_sleep", delay=60, seconds=0)
+        job = jobs.enqueue("test_sleep", seconds=0)
+        [claimed] = jobs.claim_jobs("w1", limit=5, lease=60)
+        self.assertEqual((claimed.id, claimed.attempts, claimed.workerId), (job.id, 1, "w1"))
+        self.assertEqual(jobs.claim_jobs("w2", limit=5), [])
+
+        # w1 dies; once its lease runs out w2 takes the job over.
+        Job.objects.filter(id=job.id).update(leasedUntil=timezone.now() - timedelta(seconds=1))
+        [retaken] = jobs.claim_jobs("w2", limit=5)
+        self.assertEqual((retaken.id, retaken.attempts), (job.id, 2))
+        self.assertEqual(jobs.run_job(claimed), "done")  # w1's late result is dropped
+        self.assertEqual(Job.objects.get(id=job.id).status, "running")
+        self.assertEqual(jobs.run_job(retaken), "done")
+        self.assertEqual(Job.objects.get(id=later.id).status, "queued")
+
+    def test_retries_then_fails(self):
+        job = jobs.enqueue("test_flaky", maxAttempts=2, failures=5, marker="retries")
+        with self.assertLogs("catalog.static.jobs", "WARNING"):
+            [claimed] = jobs.claim_jobs("w1")
+            self.assertEqual(jobs.run_job(claimed), "queued")
+            self.assertIn("RuntimeError: flaky", Job.objects.get(id=job.id).lastError)
+            [claimed] = jobs.claim_jobs("w1")
+            self.assertEqual(jobs.run_job(claimed), "failed")
+            self.assertEqual(jobs.claim_jobs("w1"), [])
+
+            jobs.enqueue("test_flaky", failures=1, marker="recovers")
+            for _ in range(2):
+                [claimed] = jobs.claim_jobs("w1")
+                status = jobs.run_job(claimed)
+        self.assertEqual(status, "done")
+
+    def test_purge(self):
+        job = jobs.enqueue("test_sleep", seconds=0)
+        Job.objects.filter(id=job.id).update(status="done", finishedAt=timezone.now() - timedelta(days=30))
+        self.assertEqual(jobs.purge_jobs(), 1)
+
+
+class RunWorkerTests(StubFDCMixin, TransactionTestCase):
+    def test_runs_jobs_concurrently(self):
+        for _ in range(4):
+            jobs.enqueue("test_sleep", seconds=0.3)
+        started = time.monotonic()
+        call_command("run_worker", "--once", "--concurrency", "4", "--poll-interval", "0.05", stdout=StringIO())
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {"done"})
+
+    def test_logging_a_stale_food_refreshes_it(self):
+        profile = make_profile()
+        make_food(1234, foodName="Old apple", calories=40)
+        self.client.login(username="tester", password="password123")
+        for _ in range(2):
+            self.client.post(reverse("save_logItem", args=[1234]),
+                             {"date": "2024-01-01T12:00", "percentConsumed": 1})
+        self.assertEqual(Job.objects.filter(name="refresh_food").count(), 1)
+
+        self.fdc.respond(body={
+            "fdcId": 1234, "description": "Apple", "foodCategory": {"description": "Fruits"},
+            "foodNutrients": [{"nutrient": {"name": "Energy", "unitName": "KCAL"}, "amount": 52}],
+        })
+        call_command("run_worker", "--once", stdout=StringIO())
+        food = FoodItem.objects.get(fdcId=1234)
+        self.assertEqual((food.calories, food.foodName), (52, "Fruits: Apple"))
+        self.assertIsNotNone(food.refreshedAt)
+        self.assertEqual(DailyNutrientTotal.objects.get(profile=profile).calories, 104)
+        self.assertEqual(self.fdc.requests[0].split("?")[0], "/food/1234")
+
+    def test_failed_search_is_retried_in_background(self):
+        make_profile()
+        self.client.login(username="tester", password="password123")
+        caches["search"].clear()
+        self.addCleanup(caches["search"].clear)
+        self.fdc.respond(status=404)
+        with self.assertLogs("catalog.static.foodSearch", "ERROR"):
+            self.client.get(reverse("search"), {"q": "apple"})
+        job = Job.objects.get(name="prefetch_search")
+        self.assertEqual(job.kwargs, {"query": "apple"})
+
+        Job.objects.update(runAt=timezone.now())
+        self.fdc.respond(body={"foods": [fdc_food(9, "Apple")]})
+        call_command("run_worker", "--once", stdout=StringIO())
+        self.assertEqual([food.fdcId for food in search_cache.lookup("apple")], [9])
+
+
+class DailyNutrientTotalTests(TestCase):
+    def setUp(self):
+        self.profile = make_profile()
+        self.food = make_food(1, calories=100, protein=10)
+        self.date = timezone.now() - timedelta(days=3)
+
+    def rollup(self, date):
+        return DailyNutrientTotal.objects.filter(profile=self.profile, day=log_day(date)).first()
+
+    def test_rollup_follows_log_item_writes(self):
+        item = LogItem.objects.create(profile=self.profile, foodItem=self.food, date=self.date)
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=self.date, percentConsumed=0.5)
+        self.assertEqual(self.rollup(self.date).calories, 150)
+
+        item.percentConsumed = 3
+        item.save()
+        self.assertEqual(self.rollup(self.date).calories, 350)
+
+        moved = self.date - timedelta(days=2)
+        item.date = moved
+        item.save()
+        self.assertEqual(self.rollup(self.date).calories, 50)
+        self.assertEqual(self.rollup(moved).protein, 30)
+
+        item.delete()
+        self.assertIsNone(self.rollup(moved))
+
+    def test_refresh_many_days(self):
+        emptied = self.date - timedelta(days=1)
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=self.date)
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=emptied)
+        LogItem.objects.filter(date=emptied).update(date=self.date)  # bypasses the signals
+        LogItem.objects.filter(profile=self.profile).update(percentConsumed=2)
+
+        refresh_daily_totals(self.profile.id, [log_day(self.date), log_day(emptied)])
+        self.assertEqual(self.rollup(self.date).calories, 400)
+        self.assertIsNone(self.rollup(emptied))
+
+    def test_profile_delete_cascades(self):
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=self.date)
+        self.profile.user.delete()
+        self.assertFalse(DailyNutrientTotal.objects.exists())
+
+    def test_rebuild_rollups_command(self):
+        LogItem.objects.create(profile=self.profile, foodItem=self.food, date=self.date)
+        LogItem.objects.filter(profile=self.profile).update(percentConsumed=2)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(self.rollup(self.date).calories, 200)
+        call_command("rebuild_rollups", "--check", stdout=StringIO())
+
+
+class PersonalizeTests(TestCase):
+    def test_does_not_mutate_base_ranges(self):
+        before = copy.deepcopy(nutrient_ranges)
+        woman = make_profile("woman", gender="F")
+        man = make_profile("man", gender="M")
+
+        womanRanges = personalize(nutrient_ranges, woman)
+        manRanges = personalize(nutrient_ranges, man)
+
+        self.assertEqual(nutrient_ranges, before)
+        self.assertEqual(womanRanges["iron"].target, 18)
+        self.assertEqual(manRanges["iron"].target, nutrient_ranges["iron"]["target"])
+        with self.assertRaises(TypeError):
+            manRanges["iron"] = None
+
+    def test_memoized_until_profile_changes(self):
+        profile = make_profile(weight=80)
+        ranges = get_personal_ranges(profile)
+        self.assertIs(get_personal_ranges(profile), ranges)
+
+        form = ProfileForm(
+            {"birthdate": "1990-01-01", "height": 180, "weight": 100, "gender": "M"},
+            instance=profile,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        updated = get_personal_ranges(profile)
+        self.assertIsNot(updated, ranges)
+        self.assertAlmostEqual(updated["protein"].target, 220)
+
+    def test_memo_evicts_least_recently_used(self):
+        first, second, third = (make_profile(f"lru{i}", weight=80) for i in range(3))
+        with override_settings(PERSONAL_RANGES_CACHE_SIZE=2):
+            ranges = get_personal_ranges(first)
+            secondRanges = get_personal_ranges(second)
+            self.assertIs(get_personal_ranges(first), ranges)
+            get_personal_ranges(third)
+
+            self.assertIs(get_personal_ranges(first), ranges)
+            self.assertIsNot(get_personal_ranges(second), secondRanges)
+
+
+class SyntheticDataTests(TestCase):
+    def rows(self):
+        return (
+            list(FoodItem.objects.filter(foodName__startswith="synth_").order_by("fdcId")
+                 .values_list("fdcId", "foodName", "calories")),
+            list(LogItem.objects.filter(profile__user__username__startswith="synth_")
+                 .order_by("profile__user__username", "date")
+                 .values_list("profile__user__username", "foodItem__fdcId", "date", "percentConsumed")),
+        )
+
+    def test_same_seed_same_rows(self):
+        data = synthetic_data.seed(random.Random(7), "synth_", users=2, foods=20, days=5, itemsPerDay=3)
+        self.assertEqual(data.logItems, 30)
+        self.assertEqual(DailyNutrientTotal.objects.filter(profile__in=data.profiles).count(), 10)
+        first = self.rows()
+        synthetic_data.cleanup("synth_")
+        self.assertEqual(self.rows(), ([], []))
+
+        synthetic_data.seed(random.Random(7), "synth_", users=2, foods=20, days=5, itemsPerDay=3)
+        self.assertEqual(self.rows(), first)
+
+    def test_stub_payload_round_trips(self):
+        data = synthetic_data.seed(random.Random(7), "synth_", users=1, foods=5, days=1, itemsPerDay=1)
+        foods = parse_search_results(synthetic_data.fdc_search_payload(data.foods))
+        self.assertEqual(upsert_food_items(foods), {"inserted": 0, "updated": 0, "unchanged": 5})
+
+
+class BenchmarkLogItemsTests(TransactionTestCase):
+    def test_runs_on_scratch_database(self):
+        name = connection.settings_dict["NAME"]
+        out = StringIO()
+        call_command("benchmark_logitems", "--users", "1", "--items", "20", "--repeat", "1", stdout=out)
+
+        self.assertIn("bench_", out.getvalue().splitlines()[0])
+        self.assertEqual(connection.settings_dict["NAME"], name)
+        self.assertFalse(User.objects.filter(username__startswith="bench_").exists())
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, LogItem._meta.db_table)
+        self.assertIn("logitem_profile_date_idx", indexes)
+
+
+class BenchmarkJourneysTests(TransactionTestCase):
+    # Virtual users run on their own threads and connections.
+
+    def test_report(self):
+        name = connection.settings_dict["NAME"]
+        out, err = StringIO(), StringIO()
+        call_command("benchmark_journeys", "--users", "2", "--foods", "30", "--days", "3",
+                     "--concurrency", "2", "--journeys", "2", "--warmup", "1", "--fdc-latency", "0",
+                     stdout=out, stderr=err)
+        report = json.loads(out.getvalue())
+
+        self.assertIn("bench_", err.getvalue().splitlines()[0])
+        self.assertEqual(connection.settings_dict["NAME"], name)
+
+        self.assertEqual(report["firstErrors"], {})
+        self.assertEqual(report["journeys"]["requests"], 4)
+        self.assertEqual(set(report["endpoints"]), {"index", "search", "save_logItem", "edit"})
+        for stats in report["endpoints"].values():
+            self.assertEqual((stats["requests"], stats["errors"]), (4, 0))
+            self.assertLessEqual(stats["p50Ms"], stats["p95Ms"])
+            self.assertLessEqual(stats["p95Ms"], stats["p99Ms"])
+        self.assertEqual(report["data"]["logItems"], 24)
+        self.assertFalse(User.objects.filter(username__startswith="bench_journeys_").exists())
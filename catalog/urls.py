@@ -1,11 +1,16 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('index/', views.index, name='index'),
     path('', views.index, name='index'),
     path('search/', views.search, name='search'),
+    path('search/async/', views.search_async, name='search_async'),
     path('edit/', views.edit, name='edit'),
+    path('edit/items/', views.edit_items, name='edit_items'),
+    path('edit/export/', views.export_logs, name='export_logs'),
+    path('edit/import/', views.import_logs, name='import_logs'),
+    path('edit/import/<int:import_id>/', views.import_status, name='import_status'),
     path('update_percent/<int:log_id>/', views.update_percent, name='update_percent'),
     path('update_date/<int:log_id>/', views.update_date, name='update_date'),
     path('save_logItem/<int:fdcId>/', views.save_logItem, name='save_logItem'),
@@ -16,4 +21,14 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('login/', views.user_login, name='login'),
     path('info/', views.info, name='info'),
+    path('api/v1/logitems/', api.log_items, name='api_log_items'),
+    path('api/v1/logitems/batch/', api.log_meal, name='api_log_meal'),
+    path('api/v1/logitems/<int:log_id>/', api.log_item, name='api_log_item'),
+    path('api/v1/foods/<int:fdcId>/', api.food, name='api_food'),
+    path('api/v1/summary/', api.summary, name='api_summary'),
+    path('api/v1/gauges/', api.gauges, name='api_gauges'),
+    path('api/v1/trends/', api.trends, name='api_trends'),
+    path('api/v1/stats/cache/', api.cache_stats, name='api_cache_stats'),
+    # Prometheus' default scrape path, without the trailing slash
+    path('metrics', views.metrics_view, name='metrics'),
 ]
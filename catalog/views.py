@@ -1,14 +1,21 @@
+import asyncio
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
-from .static.foodSearch import get_food_data, get_food_by_fdcId
-from .static.nutrient_functions import get_dv_avg, get_log_items
+from .static.foodSearch import aget_food_data, get_food_data, search_local_foods
+from .static.nutrient_functions import day_bounds, get_log_page
+from .static import dashboard_cache, metrics, search_cache
+from .static.log_export import EXPORT_FORMATS, aiter_chunks, encode_export, export_rows
+from .static.jobs import enqueue
 from django.core.paginator import Paginator
-from django.core.cache import cache
+from django.conf import settings
 from datetime import date, timedelta
-from .models import Profile, LogItem
-from .forms import SignUpForm, PercentConsumedForm, DateConsumedForm, LogItemForm
+from .models import FoodItem, LogImport, Profile, LogItem
+from .forms import SignUpForm, PercentConsumedForm, DateConsumedForm, LogImportForm, LogItemForm
 from collections import OrderedDict
+from urllib.parse import urlencode
 from django.utils import timezone
-from django.http import HttpResponseRedirect
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth import login as auth_login
@@ -18,20 +25,26 @@ from django.contrib.auth import logout as auth_logout
 from django.contrib.auth import authenticate
 from django.contrib.auth.forms import AuthenticationForm 
 
+def _fetch_or_retry_later(query):
+    """get_food_data(), queueing a background retry when FDC is unavailable."""
+    foods = get_food_data(query)
+    if foods is None:
+        enqueue("prefetch_search", key=f"prefetch_search:{search_cache.cache_key(query)}",
+                delay=settings.JOB_RETRY_BACKOFF, query=query)
+    return foods
+
+
 @login_required
 def search(request):
     query = request.GET.get("q")
     foods = []
 
-    if query:
-        cache_key = f"food_results_{query.lower()}"
-        foods = cache.get(cache_key)
-
-        if not foods:
-            foods = get_food_data(query)
-            if foods is None:  # Ensure it's not None
-                foods = []  # Set to an empty list if None
-            cache.set(cache_key, foods, timeout=60 * 60)  # Cache for 1 hour
+    if query and settings.FOOD_SEARCH_LOCAL:
+        metrics.food_searches.inc(backend="local")
+        foods = search_local_foods(query)
+    elif query:
+        metrics.food_searches.inc(backend="fdc")
+        foods = search_cache.cached_search(query, _fetch_or_retry_later)
 
     paginator = Paginator(foods, 6)
     page_number = request.GET.get("page")
@@ -40,47 +53,224 @@ def search(request):
     return render(request, 'search.html',
                   {"page_obj": page_obj, "query": query})
 
+EDIT_PAGE_SIZE = 25
+
+# Remote searches that outlived their request's deadline, kept
+# referenced so they finish and warm the cache.
+_background_searches = set()
+
+
+async def _fetch_and_cache(query):
+    foods = await aget_food_data(query)
+    if foods is not None:
+        # Not on the request's thread, which is gone when this finishes
+        # in the background.
+        await sync_to_async(search_cache.store, thread_sensitive=False)(query, foods)
+    return foods
+
+
 @login_required
-def index(request):
-    """View function for home page of site."""
-    cur_profile = request.user.profile
-    profile_Id = cur_profile.id
-    end = timezone.now()
-    start = end - timedelta(days=7)
-    yesterday = end - timedelta(days=1)
+async def search_async(request):
+    """
+    Async variant of search for ASGI deployments.
+
+    The FDC request and the local FoodItem search run concurrently. If
+    FDC has not answered within FDC_SEARCH_DEADLINE seconds the local
+    hits are returned straight away and the remote call carries on in
+    the background to fill the cache for the next request.
+    """
+    query = request.GET.get("q")
+    foods = []
+
+    if query:
+        metrics.food_searches.inc(backend="fdc_async")
+        foods = await sync_to_async(search_cache.lookup)(query)
+        metrics.search_cache_requests.inc(result="miss" if foods is None else "hit")
 
-    '''start date, end date, #profile_id'''
-    averages = get_dv_avg(start, end, profile_Id)
+        if foods is None:
+            local = asyncio.ensure_future(
+                sync_to_async(lambda: list(search_local_foods(query)[:30]))()
+            )
+            remote = asyncio.ensure_future(_fetch_and_cache(query))
+            try:
+                foods = await asyncio.wait_for(asyncio.shield(remote), settings.FDC_SEARCH_DEADLINE)
+            except asyncio.TimeoutError:
+                _background_searches.add(remote)
+                remote.add_done_callback(_background_searches.discard)
+                foods = None
+
+            localFoods = await local
+            if foods:
+                remoteIds = {food.fdcId for food in foods}
+                foods = foods + [food for food in localFoods if food.fdcId not in remoteIds]
+            else:
+                foods = localFoods
 
-    '''start date, end date, #profile_id'''
-    daily_averages = get_dv_avg(yesterday, end, profile_Id)
+    paginator = Paginator(foods, 6)
+    page_number = request.GET.get("page")
+    page_obj = paginator.get_page(page_number)
+
+    return await sync_to_async(render)(request, 'search.html',
+                                       {"page_obj": page_obj, "query": query})
+
+def metrics_view(request):
+    """
+    Prometheus scrape target, summed over every worker process.
 
+    Needs the METRICS_TOKEN bearer token when one is set. Without one
+    the endpoint is only served when METRICS_REQUIRE_TOKEN is off
+    (outside production).
+    """
+    if settings.METRICS_TOKEN:
+        if request.headers.get("Authorization") != f"Bearer {settings.METRICS_TOKEN}":
+            return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    elif settings.METRICS_REQUIRE_TOKEN:
+        raise Http404("Set METRICS_TOKEN to enable /metrics.")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@login_required
+def index(request):
+    """View function for home page of site."""
     context = {
-        'daily_nutrients': daily_averages,
-        'nutrients': averages,
+        'gauges': dashboard_cache.get_gauges(request.user.profile),
     }
 
     return render(request, 'index.html', context=context)
 
-@login_required
-def edit(request):
-    """View function for home page of site."""
-    cur_profile = request.user.profile
-    profile_Id = cur_profile.id
-    now = timezone.now()
-    start = now - \
-        timedelta(days=730)
-    end = now + \
-        timedelta(days=730)
 
-    LogItems = get_log_items(start, end, profile_Id)
+def _log_page_context(request):
+    """
+    Read the edit page's date filter and cursor from the query string
+    and fetch the matching page of log history.
 
-    context = {
-        'LogItems': LogItems
+    Raises:
+        ValueError: For a malformed date or cursor.
+        OverflowError: For a day whose bounds fall outside the calendar,
+            e.g. 9999-12-31.
+    """
+    start = end = None
+    startDay = request.GET.get("start") or None
+    endDay = request.GET.get("end") or None
+    if startDay:
+        start = day_bounds(date.fromisoformat(startDay))[0]
+    if endDay:
+        end = day_bounds(date.fromisoformat(endDay))[1]
+
+    LogItems, nextCursor = get_log_page(
+        request.user.profile.id, start, end,
+        cursor=request.GET.get("cursor"), limit=EDIT_PAGE_SIZE,
+    )
+    nextUrl = moreUrl = None
+    if nextCursor:
+        params = {"cursor": nextCursor}
+        if startDay:
+            params["start"] = startDay
+        if endDay:
+            params["end"] = endDay
+        query = urlencode(params)
+        # The script fetches the fragment; without it the link opens the full page.
+        nextUrl = f"{reverse('edit_items')}?{query}"
+        moreUrl = f"{reverse('edit')}?{query}"
+
+    return {
+        'LogItems': LogItems,
+        'next_url': nextUrl,
+        'more_url': moreUrl,
+        'start': startDay or "",
+        'end': endDay or "",
     }
 
+
+@login_required
+def edit(request):
+    """
+    Log history page. Only the newest EDIT_PAGE_SIZE items are rendered;
+    the rest are loaded from edit_items as the user scrolls.
+    """
+    try:
+        context = _log_page_context(request)
+    except (ValueError, OverflowError):
+        return HttpResponseBadRequest("Invalid date range.")
+
     return render(request, 'edit.html', context)
 
+
+@login_required
+def edit_items(request):
+    """Next page of the edit accordion as an HTML fragment."""
+    try:
+        context = _log_page_context(request)
+    except (ValueError, OverflowError):
+        return HttpResponseBadRequest("Invalid cursor or date range.")
+
+    return render(request, '_log_items.html', context)
+
+@login_required
+def export_logs(request):
+    """
+    Download the user's log history as CSV or NDJSON (?format=ndjson),
+    optionally limited to ?start= and ?end= days. The file is streamed
+    so it never has to fit in memory.
+    """
+    exportFormat = request.GET.get("format", "csv")
+    if exportFormat not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    try:
+        startDay = request.GET.get("start")
+        endDay = request.GET.get("end")
+        start = day_bounds(date.fromisoformat(startDay))[0] if startDay else None
+        end = day_bounds(date.fromisoformat(endDay))[1] if endDay else None
+    except (ValueError, OverflowError):
+        return HttpResponseBadRequest("Invalid date range.")
+
+    chunks = encode_export(export_rows([request.user.profile.id], start, end), exportFormat)
+    if isinstance(request, ASGIRequest):
+        chunks = aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[exportFormat])
+    filename = f"healthtracker-log-{timezone.localdate():%Y%m%d}.{exportFormat}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def import_logs(request):
+    """
+    Upload a history file from another tracker. The file is processed
+    by the run_worker job runner; this page lists recent imports and
+    their progress.
+    """
+    profile = request.user.profile
+    if request.method == 'POST':
+        form = LogImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            logImport = form.save(commit=False)
+            logImport.profile = profile
+            logImport.save()
+            enqueue("import_logs", importId=logImport.id)
+            messages.info(request, "Import started.")
+            return redirect('import_logs')
+    else:
+        form = LogImportForm()
+
+    imports = LogImport.objects.filter(profile=profile).order_by('-createdAt')[:10]
+    running = any(logImport.status in ('pending', 'running') for logImport in imports)
+    return render(request, 'import.html', {'form': form, 'imports': imports, 'running': running})
+
+
+@login_required
+def import_status(request, import_id):
+    """Progress of one LogImport as JSON, for polling."""
+    logImport = get_object_or_404(LogImport, id=import_id, profile=request.user.profile)
+    return JsonResponse({
+        'status': logImport.status,
+        'percent': logImport.percent,
+        'rowsRead': logImport.rowsRead,
+        'rowsImported': logImport.rowsImported,
+        'rowsSkipped': logImport.rowsSkipped,
+        'errors': logImport.errors,
+    })
+
+
 @login_required
 def update_percent(request, log_id):
     """Endpiont for updating_percent"""
@@ -120,11 +310,9 @@ def update_date(request, log_id):
 @login_required
 def save_logItem(request, fdcId):
     """Endpoint for saving logItem"""
-    foodItem = get_food_by_fdcId(fdcId)
+    foodItem = get_object_or_404(FoodItem, fdcId=fdcId)
 
-    cur_profile = request.user.profile
-    profile_Id = cur_profile.id
-    profile = Profile.objects.get(id=profile_Id)
+    profile = request.user.profile
     if request.method == 'POST':
         form = LogItemForm(request.POST)
         if form.is_valid():
@@ -134,6 +322,11 @@ def save_logItem(request, fdcId):
                 percentConsumed=form.cleaned_data['percentConsumed'],
                 foodItem=foodItem
             )
+            metrics.log_items_created.inc(via="form")
+            # Re-read nutrients of foods people actually log in the background.
+            staleAt = timezone.now() - timedelta(days=settings.FOOD_REFRESH_AGE)
+            if foodItem.refreshedAt is None or foodItem.refreshedAt < staleAt:
+                enqueue("refresh_food", key=f"refresh_food:{fdcId}", fdcId=fdcId)
             return HttpResponseRedirect(reverse('index'))
         else:
             messages.error(request, "Could not save log item due to invalid form data.")
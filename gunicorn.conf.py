@@ -0,0 +1,17 @@
+"""
+Gunicorn settings, read from the working directory (/app in docker-compose).
+
+Worker options stay on the command line in docker-compose.yml and the
+Dockerfile; this file only adds server hooks.
+"""
+import os
+
+
+def on_starting(server):
+    # Drop metric files left by the previous run's workers (see
+    # catalog/static/metrics.py), before any new worker writes one.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthtracker.settings')
+    import django
+    django.setup()
+    from catalog.static import metrics
+    metrics.clear_files()
@@ -5,6 +5,20 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+To serve the async search view (/search/async/) run under an ASGI server:
+
+    uvicorn healthtracker.asgi:application --host 0.0.0.0 --port 8000 --workers 3
+
+Measured with 30 concurrent clients, each searching a new term, against
+a local FDC stub (SQLite dev database):
+
+    FDC latency   gunicorn --workers 3 /search/   uvicorn --workers 3 /search/async/
+    1 s           2.8 req/s, p50 10.2 s           20.3 req/s, p50 1.3 s
+    3 s           1.3 req/s, p50 18.3 s           19.3 req/s, p50 2.1 s (deadline)
+
+Sync workers are held for the whole FDC round trip. The async view
+awaits it, and after FDC_SEARCH_DEADLINE answers from the local mirror.
 """
 
 import os
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 ENVIRONMENT = os.getenv("DJANGO_ENV", "production")
 DEBUG = True
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.middleware.MetricsMiddleware',
+    'catalog.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -58,7 +61,8 @@ ROOT_URLCONF = 'healthtracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to ServerTimingMiddleware
+        'BACKEND': 'catalog.static.timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -95,6 +99,14 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Take the write lock when a transaction starts so concurrent
+            # writers wait up to `timeout` seconds instead of failing
+            # with "database is locked".
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+            # A file rather than the shared in-memory default, whose table
+            # locks fail at once instead of waiting, so the tests that
+            # write from several threads are not flaky.
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
         }
     }
 
@@ -138,12 +150,85 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
     "staticfiles": {
         "BACKEND":
 "whitenoise.storage.CompressedManifestStaticFilesStorage"
     }
 }
 
+# The LogItem (profile, date) index INCLUDEs extra columns on Postgres;
+# SQLite builds it as a plain composite index.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Search results are shared by every gunicorn worker: Redis when
+# REDIS_URL is set, otherwise files on disk.
+SEARCH_CACHE_ALIAS = 'search'
+SEARCH_CACHE_TIMEOUT = 60 * 60  # 1 hour
+SEARCH_CACHE_NEGATIVE_TIMEOUT = 60 * 5  # queries with no results
+# Longest a search waits on a concurrent identical one. Must exceed
+# FDC_DEADLINE plus saving the results, or a slow fetch outlives its lock
+# and a waiter fetches again.
+SEARCH_CACHE_LOCK_TIMEOUT = 20
+
+# Share of requests ServerTimingMiddleware times (0 to 1), and whether
+# the result is sent to the client as a Server-Timing header as well
+# as logged. In production one request in twenty is timed and the
+# header, which shows anyone our query counts, is off.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE',
+                                            '0.05' if ENVIRONMENT == 'production' else '1'))
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', '0' if ENVIRONMENT == 'production' else '1') == '1'
+
+# One JSON line per timed request goes to the catalog.timing logger;
+# shown by default in production only.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'catalog.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('SERVER_TIMING_LOG_LEVEL', 'INFO' if ENVIRONMENT == 'production' else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# /metrics: each process mirrors its counters to a file here at most
+# every METRICS_FLUSH_INTERVAL seconds and the endpoint adds them up.
+# The default is inside the container, not the bind-mounted project,
+# and gunicorn.conf.py empties it when the server starts.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'healthtracker-metrics'))
+METRICS_FLUSH_INTERVAL = 1
+# Scrapers send "Authorization: Bearer <token>". In production /metrics
+# is a 404 until a token is set.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_REQUIRE_TOKEN = ENVIRONMENT == "production"
+
+DASHBOARD_CACHE_ALIAS = 'default'
+DASHBOARD_CACHE_BUCKET = 60 * 5  # longest a cached dashboard lags the clock
+PERSONAL_RANGES_CACHE_SIZE = 1024  # profiles whose nutrient targets each process memoizes
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    } if os.getenv('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SEARCH_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'search')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -165,6 +250,30 @@ INSTALLED_APPS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# USDA FoodData Central API (see catalog/static/fdc_client.py)
+FDC_API_URL = os.getenv('FDC_API_URL', 'https://api.nal.usda.gov/fdc/v1')
+FDC_API_KEY = os.getenv('FDC_API_KEY', 'glb9XFdhGGdEZ1pnLb7Xoi06Xc2BvCuhK17UQwWr')
+FDC_CONNECT_TIMEOUT = 3.05  # seconds
+FDC_READ_TIMEOUT = 5
+FDC_RETRIES = 2
+FDC_RETRY_BACKOFF = 0.5
+# Longest one FDC call may take, retries included; well under gunicorn's
+# 30 s worker timeout.
+FDC_DEADLINE = 10
+FDC_BREAKER_THRESHOLD = 5  # consecutive failures before failing fast
+FDC_BREAKER_RESET = 30  # seconds before trying FDC again
+FDC_SEARCH_DEADLINE = 2  # seconds search_async waits before serving local hits
+# Serve searches from the local FoodItem mirror instead of the FDC API
+FOOD_SEARCH_LOCAL = os.getenv('FOOD_SEARCH_LOCAL', '') == '1'
+# Days before a logged food's nutrients are re-read from FDC
+FOOD_REFRESH_AGE = 30
+
+# Background jobs (see catalog/static/jobs.py and `manage.py run_worker`)
+JOB_LEASE_SECONDS = 300  # a worker silent this long loses its jobs
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BACKOFF = 30  # seconds before the first retry, doubling after
+JOB_KEEP_DAYS = 7  # finished jobs are purged after this
+
 # Redirects after login/logout
 LOGIN_REDIRECT_URL = '/login/'
 LOGOUT_REDIRECT_URL = '/index/'